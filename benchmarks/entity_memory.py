@@ -0,0 +1,54 @@
+""" Per-entity memory footprint
+
+Builds a generative-style scene of `N` motifs (two anchors, two lines, a
+slider, a bumper, a distance and a control each) and reports the
+average traced allocation per entity.
+
+```
+    PYTHONPATH=. python benchmarks/entity_memory.py [N]
+```
+"""
+
+import sys
+import tracemalloc
+
+from najork.scene import Scene
+
+
+def motifs(n: int):
+    for i in range(n):
+        yield {"entity": "anchor", "id": "a%i" % i, "coords": [i, 0]}
+        yield {"entity": "anchor", "id": "b%i" % i, "coords": [i, 100]}
+        yield {"entity": "line", "id": "l%i" % i,
+               "parents": ["a%i" % i, "b%i" % i]}
+        yield {"entity": "line", "id": "x%i" % i,
+               "parents": ["b%i" % i, "a%i" % i]}
+        yield {"entity": "slider", "id": "s%i" % i, "parent": "l%i" % i,
+               "velocity": 0.25, "loop": True}
+        yield {"entity": "bumper", "id": "k%i" % i, "parent": "l%i" % i,
+               "progression": 0.5, "velocity": 0.5, "loop": True,
+               "collides": "x%i" % i, "path": "/note",
+               "data": ["60", "100"]}
+        yield {"entity": "distance", "id": "d%i" % i,
+               "parents": ["a%i" % i, "s%i" % i]}
+        yield {"entity": "control", "id": "c%i" % i, "coords": [i, 50],
+               "path": "/cc", "data": ["in_1 / 100"],
+               "connections": {"in_1": "d%i" % i}}
+
+
+def measure(n: int) -> float:
+    definitions = {"entities": list(motifs(n))}
+    s = Scene()
+    # load the lazy modules first so only entities are counted
+    s.load_from_dict({"entities": list(motifs(1))})
+    s = Scene()
+    tracemalloc.start()
+    s.load_from_dict(definitions)
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return size / len(definitions["entities"])
+
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    print("%i entities: %.0f bytes per entity" % (n * 8, measure(n)))
@@ -0,0 +1,59 @@
+""" Time to evaluate one frame, entity by entity, compiled and generated
+
+Uses the same motifs as `entity_memory.py` and reports the mean time per
+frame of `engine_sched.frame_events` against `CompiledScene.frame_events`
+and a generated tick function's `frame_events`, and (given `JOBS`) of
+`ParallelScene.frame_events` with that many worker processes.
+
+```
+    PYTHONPATH=. python benchmarks/frame_time.py [N] [FRAMES] [JOBS]
+```
+"""
+
+import sys
+import time
+
+from najork.compiled import CompiledScene
+from najork.engine_sched import frame_events, CV_FRAME_TIME
+from najork.parallel import ParallelScene
+from najork.scene import Scene
+
+from entity_memory import motifs
+
+
+def per_frame(events, frames: int) -> float:
+    started = time.perf_counter()
+    for n in range(frames):
+        t = n * CV_FRAME_TIME
+        for _ in events(t, t + CV_FRAME_TIME):
+            pass
+    return (time.perf_counter() - started) / frames
+
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    frames = int(sys.argv[2]) if len(sys.argv) > 2 else 24
+    jobs = int(sys.argv[3]) if len(sys.argv) > 3 else 0
+    s = Scene()
+    s.load_from_dict({"entities": list(motifs(n))})
+    started = time.perf_counter()
+    c = CompiledScene(s)
+    print("%i entities, compiled in %.3fs" % (n * 8,
+                                              time.perf_counter() - started))
+    print("entities: %.2fms per frame" % (
+        1000 * per_frame(lambda t, t_next: frame_events(s, t, t_next),
+                         frames)))
+    print("compiled: %.2fms per frame" % (
+        1000 * per_frame(c.frame_events, frames)))
+    started = time.perf_counter()
+    tick = s.compile_tick(cache_dir=None)
+    print("generated in %.3fs" % (time.perf_counter() - started))
+    print("generated: %.2fms per frame" % (
+        1000 * per_frame(tick.frame_events, frames)))
+    if jobs:
+        p = ParallelScene(s, jobs)
+        try:
+            print("parallel (%i jobs): %.2fms per frame" % (
+                jobs, 1000 * per_frame(p.frame_events, frames)))
+        finally:
+            p.close()
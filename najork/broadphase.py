@@ -0,0 +1,170 @@
+""" Broad phase collision culling
+
+The exact collision test (`Bumper.test_collision`) builds Shapely
+geometry for every bumper every frame, although in a dense score most
+bumpers are nowhere near their colliders most of the time. A bumper can
+only collide during `t` -> `t_next` if its swept bounding box (that of
+its trajectory, which is all the exact test looks at) overlaps its
+collider's bounding box at `t`, so anything else is culled before the
+exact test.
+
+Every bumper has exactly one collider, so the pairs are known up front
+and no sweep-and-prune (or grid) is needed to find them; each collider's
+bounds are just worked out once per frame however many bumpers hit it.
+
+A bumper colliding with a `Group` of shapes instead finds which of them
+it might have hit through the group's `GridIndex`.
+"""
+
+import math
+from collections import defaultdict
+
+
+def overlaps(a: tuple, b: tuple) -> bool:
+    """ Do boxes `(minx, miny, maxx, maxy)` `a` and `b` overlap (or
+    touch)?
+    """
+    return not (a[2] < b[0] or b[2] < a[0] or a[3] < b[1] or b[3] < a[1])
+
+
+def swept_bounds(start: tuple, end: tuple) -> tuple:
+    """ Bounds of a trajectory from `start` to `end` """
+    (x0, y0), (x1, y1) = start, end
+    return (min(x0, x1), min(y0, y1), max(x0, x1), max(y0, y1))
+
+
+class BroadPhase:
+    """ Culls bumpers which can't possibly collide, and counts how many
+    were culled in the latest frame
+    """
+
+    def __init__(self):
+        self._t = None
+        self._bounds = {}
+        """ bounds of each collider at `_t` """
+        self.tested = 0
+        """ pairs passed on to the exact test in the latest frame """
+        self.culled = 0
+        """ pairs culled in the latest frame """
+
+    def _collider_bounds(self, collider, t: float) -> tuple:
+        bounds = self._bounds.get(collider.uid)
+        if bounds is None:
+            (mx, my), (Mx, My) = collider.get_bounds(t)
+            bounds = self._bounds[collider.uid] = (mx, my, Mx, My)
+        return bounds
+
+    def start(self, t: float):
+        """ Start counting afresh, for the frame at `t` """
+        self._t = t
+        self._bounds = {}
+        self.tested = self.culled = 0
+
+    def test_collision(self, bumper, t: float, t_next: float) -> bool:
+        """ As `bumper.test_collision`, but culled first """
+        if t != self._t:
+            self.start(t)
+        bounds = self._collider_bounds(bumper._collision_parent, t)
+        start, end = bumper.get_coords(t), None
+        # (often, e.g. when resting on it, we needn't look any further)
+        if not overlaps((*start, *start), bounds):
+            end = bumper.get_coords(t_next)
+            if not overlaps(swept_bounds(start, end), bounds):
+                self.culled += 1
+                return False
+        self.tested += 1
+        return bumper.test_trajectory(t, t_next, start, end)
+
+
+class GridIndex:
+    """ Boxes `((minx, miny), (maxx, maxy))` bucketed into a uniform
+    grid, to quickly find which might overlap another box
+    """
+
+    def __init__(self, boxes: list):
+        self._boxes = [(mx, my, Mx, My) for (mx, my), (Mx, My) in boxes]
+        mx = min(b[0] for b in self._boxes)
+        my = min(b[1] for b in self._boxes)
+        Mx = max(b[2] for b in self._boxes)
+        My = max(b[3] for b in self._boxes)
+        self.bounds = ((mx, my), (Mx, My))
+        # cells around the size of the boxes, but no more than about
+        # sqrt(n) across so long thin boxes (e.g. strings) spread out
+        n = len(self._boxes)
+        self._origin = (mx, my)
+        self._cell = tuple(
+            max(sum(b[k + 2] - b[k] for b in self._boxes) / n,
+                (span or 1.0) / math.ceil(math.sqrt(n)),
+                1e-9)
+            for k, span in ((0, Mx - mx), (1, My - my))
+        )
+        self._cells = defaultdict(list)
+        for i, b in enumerate(self._boxes):
+            for cell in self._cells_of(b):
+                self._cells[cell].append(i)
+
+    def _cells_of(self, box: tuple):
+        (ox, oy), (cw, ch) = self._origin, self._cell
+        for cx in range(math.floor((box[0] - ox) / cw),
+                        math.floor((box[2] - ox) / cw) + 1):
+            for cy in range(math.floor((box[1] - oy) / ch),
+                            math.floor((box[3] - oy) / ch) + 1):
+                yield cx, cy
+
+    def query(self, box: tuple) -> list[int]:
+        """ Indices (ascending) of the boxes which overlap `box`
+        `(minx, miny, maxx, maxy)`
+        """
+        (mx, my), (Mx, My) = self.bounds
+        # (clipped, so far away boxes don't walk lots of empty cells)
+        box = (max(box[0], mx), max(box[1], my),
+               min(box[2], Mx), min(box[3], My))
+        if box[0] > box[2] or box[1] > box[3]:
+            return []
+        found = set()
+        for cell in self._cells_of(box):
+            found.update(self._cells.get(cell, ()))
+        return sorted(i for i in found if overlaps(self._boxes[i], box))
+
+
+class SegmentIndex:
+    """ The segments of a polyline through `coords`, indexed to find
+    those near a box without looking at all the rest
+    """
+
+    def __init__(self, coords: list):
+        self._coords = [tuple(c) for c in coords]
+        self._closed = self._coords[0] == self._coords[-1]
+        self._grid = GridIndex([
+            ((min(x0, x1), min(y0, y1)), (max(x0, x1), max(y0, y1)))
+            for (x0, y0), (x1, y1) in zip(self._coords, self._coords[1:])
+        ])
+
+    def runs(self, box: tuple) -> list[list]:
+        """ Runs of consecutive coords, covering every segment which
+        overlaps `box` `(minx, miny, maxx, maxy)`, that are the same as the
+        whole polyline within `box`
+
+        Each run carries on one segment past those overlapping `box`, so
+        its ends lie outside `box` (unless they're the polyline's own
+        ends) and, within `box`, its boundary is the polyline's too.
+        """
+        found = self._grid.query(box)
+        if not found:
+            return []
+        if self._closed:
+            # (a ring has no ends; any run would)
+            return [self._coords]
+        last = len(self._coords) - 1
+        spans = []
+        for i in found:
+            lo, hi = max(i - 1, 0), min(i + 2, last)
+            if spans and lo <= spans[-1][1]:
+                spans[-1][1] = hi
+            else:
+                spans.append([lo, hi])
+        return [self._coords[lo:hi + 1] for lo, hi in spans]
+
+    def __len__(self) -> int:
+        """ (the number of coords) """
+        return len(self._coords)
@@ -0,0 +1,93 @@
+""" The frame clock
+
+Time advances in whole frames: the engine counts frames (an int, which
+never drifts) and works out `t` from the count afresh each time, rather
+than adding up frame times as floats. So the same frame always has
+exactly the same `t`, however long we've been running or however we got
+there, and anything keyed on `t` (or better, on `frame_number(t)`)
+always finds it.
+
+Looping sliders at simple rational velocities (nearly all of them) have
+their phase worked out in integers from the frame number too, so it's
+as precise after weeks of running as in the first second.
+"""
+
+from fractions import Fraction
+from functools import lru_cache
+from math import floor
+
+FRAME_RATE = 24
+""" frames per second (PAL, for now) """
+
+FRAME_TIME = 1.0 / FRAME_RATE
+
+FRAME_TOLERANCE = 1e-6
+""" how near (in frames) a time must be to a frame to be on it """
+
+MAX_DENOMINATOR = 1000
+""" velocities are taken as the nearest fraction with at most this
+denominator, so long as that's (near enough) exact """
+
+
+def frame_time(n: int) -> float:
+    """ `t` of frame `n` """
+    return n / FRAME_RATE
+
+
+def frame_number(t: float) -> int:
+    """ Which frame is `t`? None if it's not on one (give or take
+    rounding, e.g. `n * FRAME_TIME` is frame `n`)
+    """
+    n = round(t * FRAME_RATE)
+    return n if abs(t * FRAME_RATE - n) < FRAME_TOLERANCE else None
+
+
+def nearest_frame(t: float) -> int:
+    """ The frame nearest `t` """
+    return round(t * FRAME_RATE)
+
+
+def after(t: float, frames: int = 1) -> float:
+    """ `t` plus `frames` frame times (exactly, if `t` is on a frame)
+    """
+    n = frame_number(t)
+    if n is None:
+        return t + frames * FRAME_TIME
+    return frame_time(n + frames)
+
+
+@lru_cache(maxsize=None)
+def as_fraction(v: float) -> Fraction:
+    """ `v` as a simple fraction, or None if it isn't one """
+    f = Fraction(v).limit_denominator(MAX_DENOMINATOR)
+    if abs(float(f) - v) > 1e-12 * max(abs(v), 1.0):
+        return None
+    return f
+
+
+@lru_cache(maxsize=None)
+def frame_step(velocity: float) -> tuple[int, int]:
+    """ How far something moving at `velocity` goes each frame, as
+    `(numerator, denominator)`, or None if it's not a simple fraction
+    """
+    f = as_fraction(velocity)
+    if f is None:
+        return None
+    f /= FRAME_RATE
+    return (f.numerator, f.denominator)
+
+
+def turns(position: float, velocity: float, t: float) -> tuple[int, float]:
+    """ `divmod(position + velocity * t, 1)`, i.e. how many whole turns
+    something starting at `position` and looping at `velocity` has made
+    by `t`, and how far it is through the current one; exactly (in
+    integers) if `t` is on a frame and `velocity` a simple fraction
+    """
+    n = frame_number(t)
+    step = frame_step(velocity) if n is not None else None
+    if step is None:
+        f = position + velocity * t
+        return (floor(f), f % 1.0)
+    whole, rest = divmod(step[0] * n, step[1])
+    whole_position, phase = divmod(position + rest / step[1], 1.0)
+    return (whole + int(whole_position), phase)
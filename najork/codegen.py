@@ -0,0 +1,453 @@
+""" Code-generated tick functions
+
+Rather than walking the entity graph, `compile_tick` writes out the
+Python source of a function specialised to one scene: every entity's
+evaluation inlined in rank order as straight-line arithmetic on local
+variables, with anchors baked in as constants and no attribute lookups,
+Shapely geometry or virtual dispatch. Calling it returns every point's
+coordinates, every measurement's value and every bumper's collision flag
+for a time slice.
+
+Sliders on lines, polylines and circles, line/line intersections,
+distances, angles (between lines) and bumpers colliding with lines are
+inlined; anything else calls back into its entity. Entities doing
+exactly the same as another (see `cse`) are evaluated just once.
+
+The generated source is kept on the result as `.source` (and registered
+with `linecache`, so tracebacks show it), and its compiled code is
+cached on disk like compiled scenes, keyed by the source. Since the
+source bakes the scene in, regenerate after editing the scene.
+
+```
+    tick = scene.compile_tick()
+    print(tick.source)
+    coords, values, collisions = tick(t, t + CV_FRAME_TIME)
+    coords[tick.points["s1"]]
+```
+"""
+
+from __future__ import annotations
+
+import hashlib
+import importlib.util
+import linecache
+import logging
+import marshal
+import math
+import os
+import tempfile
+
+from .clock import frame_number, frame_step, turns
+from .cse import shared
+from .engine_sched import bumper_events
+from .entities import (
+    Anchor, Line, PolyLine, Circle, Slider, Intersection, Distance, Angle,
+    CIRCLE_RES
+)
+
+CIRCLE_SEGMENTS = CIRCLE_RES * 4
+TAU = 2 * math.pi
+
+# vertices of the unit circle polygon, as Shapely's buffer builds it:
+# starting east and running clockwise (in y-up terms). (One spare, as
+# `x % 1.0` can round up to 1.0 for tiny negative x)
+_COS = tuple(math.cos(-TAU * k / CIRCLE_SEGMENTS)
+             for k in range(CIRCLE_SEGMENTS + 2))
+_SIN = tuple(math.sin(-TAU * k / CIRCLE_SEGMENTS)
+             for k in range(CIRCLE_SEGMENTS + 2))
+
+
+def _f(v: float) -> str:
+    return repr(float(v))
+
+
+def _tuple(items) -> str:
+    return "({})".format("".join(i + ", " for i in items))
+
+
+class _Writer:
+    """ Builds up the source of a tick function
+    """
+
+    def __init__(self, entities: list):
+        self.lines = []
+        self.entities = entities
+        """ entities evaluated by calling back into them, as `_e[n]` """
+        self._callbacks = {}
+
+    def emit(self, line: str, indent: int = 1):
+        self.lines.append("    " * indent + line)
+
+    def callback(self, e) -> str:
+        if e.uid not in self._callbacks:
+            self._callbacks[e.uid] = len(self.entities)
+            self.entities.append(e)
+        return "_e[{}]".format(self._callbacks[e.uid])
+
+
+class _Points:
+    """ Emits the point evaluations for one time variable, naming each
+    point's coordinates `{prefix}x{n}`, `{prefix}y{n}`
+    """
+
+    def __init__(self, w: _Writer, points: dict, prefix: str, t: str):
+        self.w = w
+        self.points = points
+        self.prefix = prefix
+        self.t = t
+        self.frame = "{}_frame".format(t)
+        """ `frame_number(t)`, emitted at the top """
+
+    def xy(self, e) -> tuple[str, str]:
+        n = self.points[e.uid]
+        return ("{}x{}".format(self.prefix, n), "{}y{}".format(self.prefix, n))
+
+    def emit(self, e):
+        w = self.w
+        x, y = self.xy(e)
+        w.emit("# {!r} ({})".format(e.uid, e.classname))
+        if type(e) is Anchor:
+            ax, ay = e.get_coords(0.0)
+            w.emit("{} = {}; {} = {}".format(x, _f(ax), y, _f(ay)))
+        elif isinstance(e, Slider) and self._slider(e, x, y):
+            pass
+        elif (type(e) is Intersection
+              and all(type(p) is Line for p in e._parents)):
+            self._intersection(e, x, y)
+        else:
+            w.emit("{}, {} = {}.get_coords({})".format(x, y, w.callback(e),
+                                                       self.t))
+
+    def _fraction(self, e: Slider):
+        """ emits `f`, how far along its parent the slider is """
+        if e.tempo is not None:
+            # tabulated by the slider's tempo
+            self.w.emit("f = {}.fraction({})".format(self.w.callback(e),
+                                                     self.t))
+            return
+        f = "{} + {} * {}".format(_f(e._position), _f(e.effective_velocity),
+                                  self.t)
+        step = frame_step(e.effective_velocity)
+        if e.loop and step is not None:
+            # in integers from the frame number, as `clock.turns`
+            num, den = step
+            self.w.emit("f = ({} + ({} * {}) % {} / {}) % 1.0 "
+                        "if {} is not None else ({}) % 1.0".format(
+                            _f(e._position), num, self.frame, den, den,
+                            self.frame, f))
+        elif e.loop:
+            self.w.emit("f = ({}) % 1.0".format(f))
+        else:
+            self.w.emit("f = min(max(0.0, {}), 1.0)".format(f))
+
+    def _slider(self, e: Slider, x: str, y: str) -> bool:
+        parent = e._parent
+        w = self.w
+        if type(parent) is Line:
+            self._fraction(e)
+            (ax, ay), (bx, by) = (self.xy(p) for p in parent._parents)
+            w.emit("{x} = {ax} + f * ({bx} - {ax}); "
+                   "{y} = {ay} + f * ({by} - {ay})".format(**locals()))
+        elif isinstance(parent, Circle):
+            self._fraction(e)
+            cx, cy = self.xy(parent._centre)
+            r = _f(parent._radius)
+            w.emit("u = ((f + {}) % 1.0) * {}".format(
+                _f(parent._orientation), CIRCLE_SEGMENTS))
+            w.emit("k = int(u); u -= k")
+            w.emit("{x} = {cx} + {r} * (_COS[k] + u * (_COS[k + 1] - _COS[k]))"
+                   .format(**locals()))
+            w.emit("{y} = {cy} + {r} * (_SIN[k] + u * (_SIN[k + 1] - _SIN[k]))"
+                   .format(**locals()))
+        elif type(parent) is PolyLine:
+            self._fraction(e)
+            self._polyline(parent)
+            (ax, ay), (bx, by) = (self.xy(p) for p in parent._parents)
+            w.emit("dx = {bx} - {ax}; dy = {by} - {ay}".format(**locals()))
+            w.emit("{x} = {ax} + sx * dx - sy * dy; "
+                   "{y} = {ay} + sx * dy + sy * dx".format(**locals()))
+        else:
+            return False
+        return True
+
+    def _polyline(self, parent: PolyLine):
+        """ emits `sx`, `sy`: `f` interpolated along the unit seed """
+        seed = list(parent._impl_seed.coords)
+        lengths = [math.dist(a, b) for a, b in zip(seed, seed[1:])]
+        total = sum(lengths)
+        key = 0.0
+        segments = []
+        for (ax, ay), (bx, by), length in zip(seed, seed[1:], lengths):
+            if length > 0:
+                end = key + length / total
+                # sx = ax + (f - key) * (bx - ax) / span, as a + f * b
+                span = end - key
+                sx = (_f(ax - key * (bx - ax) / span),
+                      _f((bx - ax) / span))
+                sy = (_f(ay - key * (by - ay) / span),
+                      _f((by - ay) / span))
+                segments.append((end, sx, sy))
+                key = end
+        for n, (end, sx, sy) in enumerate(segments):
+            body = "sx = {} + f * {}; sy = {} + f * {}".format(*sx, *sy)
+            if n == len(segments) - 1:
+                if n == 0:
+                    self.w.emit(body)
+                else:
+                    self.w.emit("else: " + body)
+            else:
+                self.w.emit("{} f < {}: {}".format("if" if n == 0 else "elif",
+                                                   _f(end), body))
+
+    def _intersection(self, e: Intersection, x: str, y: str):
+        """ the crossing point of two line segments, else the start of
+        the first, as `Intersection.get_coords` """
+        (ax, ay), (bx, by) = (self.xy(p) for p in e._parents[0]._parents)
+        (cx, cy), (dx, dy) = (self.xy(p) for p in e._parents[1]._parents)
+        w = self.w
+        w.emit("o1 = ({bx} - {ax}) * ({cy} - {ay}) - ({by} - {ay}) * ({cx} - {ax})"
+               .format(**locals()))
+        w.emit("o2 = ({bx} - {ax}) * ({dy} - {ay}) - ({by} - {ay}) * ({dx} - {ax})"
+               .format(**locals()))
+        w.emit("o3 = ({dx} - {cx}) * ({ay} - {cy}) - ({dy} - {cy}) * ({ax} - {cx})"
+               .format(**locals()))
+        w.emit("o4 = ({dx} - {cx}) * ({by} - {cy}) - ({dy} - {cy}) * ({bx} - {cx})"
+               .format(**locals()))
+        w.emit("if o1 * o2 < 0.0 and o3 * o4 < 0.0:")
+        w.emit("    s = o3 / (o3 - o4)")
+        w.emit("    {x} = {ax} + s * ({bx} - {ax}); "
+               "{y} = {ay} + s * ({by} - {ay})".format(**locals()))
+        w.emit("else:")
+        w.emit("    {x} = {ax}; {y} = {ay}".format(**locals()))
+
+
+def _needed(entities) -> set:
+    """ uids of `entities` and everything they depend on """
+    needed = set()
+    stack = list(entities)
+    while stack:
+        e = stack.pop()
+        if e.uid not in needed:
+            needed.add(e.uid)
+            stack.extend(e.get_dependencies())
+    return needed
+
+
+def generate_source(scene, name: str = "tick"):
+    """ Generate the source of a tick function for `scene`, returning
+    `(source, points, measurements, bumpers, entities)`, the latter
+    being the entities the function calls back into (as `_e`)
+    """
+    # only what sends something (see `Scene.sinks`) is ever evaluated,
+    # and only once however many entities do exactly the same (see `cse`)
+    live = scene.sinks()
+    everything = [e for e in scene.sort_by_rank() if e.uid in live]
+    rep = shared(everything)
+    ranked = [e for e in everything if rep[e.uid] == e.uid]
+    points, measurements, bumpers = {}, {}, {}
+    for e in ranked:
+        if isinstance(e, (Anchor, Slider, Intersection)):
+            points[e.uid] = len(points)
+        elif isinstance(e, (Distance, Angle)):
+            measurements[e.uid] = len(measurements)
+    for e in everything:
+        # (copies share their representative's slot)
+        for slots in (points, measurements):
+            if rep[e.uid] in slots:
+                slots[e.uid] = slots[rep[e.uid]]
+    for b in scene.list_by_class("bumper"):
+        bumpers[b.uid] = len(bumpers)
+
+    w = _Writer([])
+    w.emit("def {}(t, t_next):".format(name), 0)
+    w.emit("t_frame = _frame_number(t)")
+    w.emit("t_next_frame = _frame_number(t_next)")
+    now = _Points(w, points, "", "t")
+    for e in ranked:
+        if e.uid in points:
+            now.emit(e)
+
+    for e in ranked:
+        if e.uid in measurements:
+            _measurement(w, now, e, measurements[e.uid])
+
+    line_bumpers = [b for b in scene.list_by_class("bumper")
+                    if type(b._collision_parent) is Line]
+    if line_bumpers:
+        # only what the bumpers need is worked out a frame ahead
+        ahead = _Points(w, points, "n", "t_next")
+        needed = {rep[uid] for uid in _needed(line_bumpers)}
+        for e in ranked:
+            if e.uid in points and e.uid in needed:
+                ahead.emit(e)
+    first = {}
+    for b in scene.list_by_class("bumper"):
+        # a bumper moving just as another, into the same collider, only
+        # copies its flag
+        key = (rep[b.uid], rep[b._collision_parent.uid])
+        if key in first:
+            w.emit("c{} = c{}".format(bumpers[b.uid], first[key]))
+            continue
+        first[key] = bumpers[b.uid]
+        _collision(w, now, b, bumpers[b.uid])
+
+    w.emit("return (")
+    w.emit(_tuple("({}, {})".format(*now.xy(e))
+                  for e in ranked if e.uid in points) + ",", 2)
+    w.emit(_tuple("m{}".format(measurements[e.uid])
+                  for e in ranked if e.uid in measurements) + ",", 2)
+    w.emit(_tuple("c{}".format(n) for n in range(len(bumpers))) + ",", 2)
+    w.emit(")")
+    return ("\n".join(w.lines) + "\n", points, measurements, bumpers,
+            w.entities)
+
+
+def _measurement(w: _Writer, now: _Points, e, n: int):
+    m = "m{}".format(n)
+    w.emit("# {!r} ({})".format(e.uid, e.classname))
+    if type(e) is Distance:
+        (ax, ay), (bx, by) = (now.xy(p) for p in e._parents)
+        w.emit("{m} = _hypot({ax} - {bx}, {ay} - {by})".format(**locals()))
+    elif (type(e) is Angle
+          and all(type(p) in (Line, PolyLine) for p in e._parents)):
+        # both run from their first to their second parent
+        (ax, ay), (bx, by) = (now.xy(p) for p in e._parents[0]._parents)
+        (cx, cy), (dx, dy) = (now.xy(p) for p in e._parents[1]._parents)
+        w.emit("{m} = (_atan2({dy} - {cy}, {dx} - {cx}) / TAU"
+               " - _atan2({by} - {ay}, {bx} - {ax}) / TAU) % 1.0"
+               .format(**locals()))
+    else:
+        w.emit("{} = {}.get_value(t)".format(m, w.callback(e)))
+
+
+def _collision(w: _Writer, now: _Points, b, n: int):
+    c = "c{}".format(n)
+    # (uids are repr'd, so can't break out of the comment)
+    w.emit("# {!r} ({}) hits {!r}".format(b.uid, b.classname,
+                                          b._collision_parent.uid))
+    if type(b._collision_parent) is not Line:
+        w.emit("{} = {}.test_collision(t, t_next)".format(c, w.callback(b)))
+        return
+    px, py = now.xy(b)
+    qx, qy = "n" + px, "n" + py
+    (ax, ay), (bx, by) = (now.xy(p) for p in b._collision_parent._parents)
+    w.emit("o1 = ({bx} - {ax}) * ({py} - {ay}) - ({by} - {ay}) * ({px} - {ax})"
+           .format(**locals()))
+    w.emit("o2 = ({bx} - {ax}) * ({qy} - {ay}) - ({by} - {ay}) * ({qx} - {ax})"
+           .format(**locals()))
+    w.emit("o3 = ({qx} - {px}) * ({ay} - {py}) - ({qy} - {py}) * ({ax} - {px})"
+           .format(**locals()))
+    w.emit("o4 = ({qx} - {px}) * ({by} - {py}) - ({qy} - {py}) * ({bx} - {px})"
+           .format(**locals()))
+    # exactly on the line?
+    w.emit("{c} = o1 == 0.0 and 0.0 < ({px} - {ax}) * ({bx} - {ax}) + "
+           "({py} - {ay}) * ({by} - {ay}) < ({bx} - {ax}) ** 2 + "
+           "({by} - {ay}) ** 2".format(**locals()))
+    crosses = "o1 * o2 < 0.0 and o3 * o4 < 0.0"
+    if b.loop and b.tempo is not None:
+        cb = w.callback(b)
+        crosses = ("{cb}.turns(t)[0] == {cb}.turns(t_next)[0] and "
+                   .format(**locals()) + crosses)
+    elif b.loop:
+        # wrapping is teleporting, not crossing
+        p, v = _f(b._position), _f(b.effective_velocity)
+        crosses = ("_turns({p}, {v}, t)[0] == _turns({p}, {v}, t_next)[0]"
+                   " and ".format(**locals()) + crosses)
+    w.emit("{} = {} or ({})".format(c, c, crosses))
+
+
+class Tick:
+    """ A generated tick function, callable as `tick(t, t_next)` to get
+    `(coords, values, collisions)`, indexed as per `points`,
+    `measurements` and `bumpers`
+    """
+
+    def __init__(self, scene, source: str, code, points: dict,
+                 measurements: dict, bumpers: dict, entities: list):
+        self.source = source
+        self.points = points
+        self.measurements = measurements
+        self.bumpers = bumpers
+        self._scene = scene
+        namespace = {
+            "_e": tuple(entities), "_COS": _COS, "_SIN": _SIN, "TAU": TAU,
+            "_hypot": math.hypot, "_atan2": math.atan2,
+            "_turns": turns, "_frame_number": frame_number,
+        }
+        exec(code, namespace)
+        self._fn = namespace["tick"]
+
+    def __call__(self, t: float, t_next: float):
+        return self._fn(t, t_next)
+
+    def frame_events(self, t: float, t_next: float):
+        """ As `engine_sched.frame_events`, from the generated function
+        """
+        _, values, collisions = self._fn(t, t_next)
+
+        def inputs(source):
+            return {k: values[self.measurements[v.uid]]
+                    for k, v in source._inputs.items()}
+
+        for c in self._scene.list_by_class("control"):
+            yield c.uid, c.msg.get_path(t), c.msg.evaluate(inputs(c), t)
+        for b in self._scene.list_by_class("bumper"):
+            if collisions[self.bumpers[b.uid]]:
+                yield from bumper_events(b, t, t_next, inputs(b))
+
+
+def _cache_path(cache_dir: str, source: str) -> str:
+    h = hashlib.sha256()
+    # marshalled code is specific to the interpreter version
+    h.update(importlib.util.MAGIC_NUMBER)
+    h.update(source.encode())
+    return os.path.join(cache_dir, h.hexdigest() + ".tick")
+
+
+def _compile(source: str, filename: str, cache_dir: str):
+    if cache_dir is None:
+        return compile(source, filename, "exec")
+    path = _cache_path(cache_dir, source)
+    try:
+        with open(path, "rb") as inp:
+            return marshal.load(inp)
+    except FileNotFoundError:
+        pass
+    except Exception:
+        logging.warning("Ignoring unreadable tick cache %s", path)
+
+    code = compile(source, filename, "exec")
+    tmp = None
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=cache_dir)
+        with os.fdopen(fd, "wb") as out:
+            marshal.dump(code, out)
+        os.replace(tmp, path)
+    except Exception:
+        # caching is only ever an optimisation
+        logging.warning("Could not write tick cache %s", path)
+        if tmp is not None and os.path.exists(tmp):
+            os.unlink(tmp)
+    return code
+
+
+def compile_tick(scene, cache_dir: str = "") -> Tick:
+    """ Generate and compile the tick function for `scene`, caching the
+    code in `cache_dir` (default `loader.default_cache_dir()`, `None`
+    to disable caching)
+    """
+    from .loader import default_cache_dir
+
+    source, points, measurements, bumpers, entities = generate_source(scene)
+    filename = "<najork tick {}>".format(
+        hashlib.sha256(source.encode()).hexdigest()[:12]
+    )
+    # so tracebacks (and pdb) can show the generated lines
+    linecache.cache[filename] = (len(source), None,
+                                 source.splitlines(True), filename)
+    if cache_dir is not None:
+        cache_dir = cache_dir or default_cache_dir()
+    code = _compile(source, filename, cache_dir)
+    return Tick(scene, source, code, points, measurements, bumpers,
+                entities)
@@ -0,0 +1,98 @@
+""" Edge triggered bumpers
+
+`Bumper.test_collision` is true for every frame a bumper touches its
+collision parent, so one resting on (or sliding along) a line would
+fire on every frame. Instead a bumper's events pass through a
+`CollisionState`, in which each bumper is
+
+  - armed, until it collides, when it fires once and becomes
+  - in contact, for as long as it keeps colliding, then
+  - re-armed after `rearm_frames` frames without a collision
+
+i.e. a bumper fires at `t` iff it collides at `t` and didn't in any of
+the `rearm_frames` frames before. (A bumper colliding with a `Group` is
+armed separately for each member, i.e. by event uid.) That's still a
+function of `t` alone, so after a seek (or rewind, or scene swap) the
+state is rebuilt by evaluating those few frames, and playback, offline
+rendering and sharded rendering all agree.
+"""
+
+from .clock import after
+from .entities import Control
+
+DEFAULT_REARM_FRAMES = 1
+""" by default fire on every new contact, but only once per contact """
+
+
+def rearm_frames(settings: dict) -> int:
+    """ The re-arm hysteresis configured in `settings` """
+    return settings.get("collision", {}).get("rearm_frames",
+                                             DEFAULT_REARM_FRAMES)
+
+
+class CollisionState:
+    """ Which bumpers are armed, for frames `frame_time` apart. Events
+    for which `is_control(uid)`, which send every frame, are let through
+    """
+
+    def __init__(self, is_control: callable, rearm_frames: int,
+                 frame_time: float):
+        self._is_control = is_control
+        self.rearm_frames = rearm_frames
+        self._frame_time = frame_time
+        self._t = None
+        self._n = 0
+        self._last_hit: dict[str, int] = {}
+        """ frame number each bumper (event uid) last collided """
+
+    @classmethod
+    def for_scene(cls, scene, rearm_frames: int,
+                  frame_time: float) -> 'CollisionState':
+        """ For the events of `scene` (keeping up with any edits) """
+        def is_control(uid: str) -> bool:
+            try:
+                return type(scene.get_by_id(uid)) is Control
+            except KeyError:
+                # e.g. hits on a group's members
+                return False
+        return cls(is_control, rearm_frames, frame_time)
+
+    def reset(self):
+        """ Forget everything, e.g. after a seek """
+        self._t = None
+
+    def _follows(self, t: float) -> bool:
+        return (self._t is not None
+                and abs(t - self._t - self._frame_time)
+                < self._frame_time * 1e-3)
+
+    def _collided(self, events):
+        """ Note which bumpers collided in the next frame, and yield
+        only those events which should actually be sent
+        """
+        self._n += 1
+        n = self._n
+        for event in events:
+            uid = event[0]
+            if not self._is_control(uid):
+                last = self._last_hit.get(uid)
+                self._last_hit[uid] = n
+                if last is not None and n - last <= self.rearm_frames:
+                    continue
+            yield event
+
+    def filter(self, t: float, events, history: callable) -> list:
+        """ `events` for the frame at `t`, less those of bumpers which
+        aren't armed. If `t` doesn't follow the last frame filtered,
+        the state is first rebuilt from `history(t)`, which must return
+        the (unfiltered) events of the frame at `t`
+        """
+        if not self._follows(t):
+            self._n = 0
+            self._last_hit = {}
+            for k in range(self.rearm_frames, 0, -1):
+                # (exactly the frames before, as evaluated in order)
+                for _ in self._collided(history(after(t, -k))):
+                    pass
+        self._t = t
+        return list(self._collided(events))
@@ -0,0 +1,488 @@
+""" Compiled scenes: structure-of-arrays evaluation
+
+The entity graph is great for editing but slow to evaluate, every
+`get_coords` chasing pointers through its parents and building Shapely
+geometry as it goes. A `CompiledScene` flattens a `Scene` into NumPy
+arrays, grouped by topological rank and by entity kind, so that each
+frame is a handful of vectorised kernels per rank:
+
+  - anchors         a static block of coordinates
+  - sliders         (and bumpers) on lines, circles and polylines
+  - distances, angles
+  - bumper collisions with lines
+
+Everything else (intersections, sliders on other sliders' shapes we
+can't vectorise, bumpers colliding with curves) falls back to the
+entity's own evaluation, with its result slotted into the arrays so
+later ranks can carry on vectorised.
+
+Every entity is compiled, but each frame only falls back to evaluating
+those that are live just then (see `Scene.live`), so construction
+geometry nothing needs costs next to nothing, and moving the viewport
+needs no recompiling. A `Frame` doesn't have the coordinates of points
+that weren't evaluated. Entities doing exactly the same as another (see
+`cse`) share its slot rather than being evaluated again.
+
+A compiled scene is a snapshot of the scene's structure: recompile after
+editing it.
+
+```
+    from najork.compiled import CompiledScene
+
+    c = CompiledScene(scene)
+    frame = c.evaluate(1.5)
+    frame.coords("s1")
+    for uid, path, data in c.frame_events(t, t + CV_FRAME_TIME):
+        ...
+```
+"""
+
+from __future__ import annotations
+
+from collections import defaultdict
+
+import numpy as np
+
+from .broadphase import BroadPhase
+from .clock import frame_number, frame_step
+from .cse import shared
+from .engine_sched import bumper_events
+from .entities import (
+    Anchor, Line, PolyLine, Circle, Slider, Intersection,
+    Distance, Angle, CIRCLE_RES, XY
+)
+from .scene import Scene
+
+CIRCLE_SEGMENTS = CIRCLE_RES * 4
+""" Circles are modelled (as by Shapely's buffer) as regular polygons """
+
+TWO_PI = 2 * np.pi
+
+
+class Frame:
+    """ A compiled scene evaluated at `t`
+    """
+    __slots__ = ("t", "xy", "values", "collisions", "_compiled")
+
+    def __init__(self, compiled: 'CompiledScene', t: float, xy: np.ndarray,
+                 values: np.ndarray, collisions: np.ndarray = None):
+        self._compiled = compiled
+        self.t = t
+        self.xy = xy
+        """ (n, 2) coordinates of every point entity """
+        self.values = values
+        """ value of every measurement """
+        self.collisions = collisions
+        """ does each bumper collide during this frame, if known """
+
+    def __contains__(self, uid: str) -> bool:
+        """ Was point `uid` evaluated (i.e. is it live)? """
+        n = self._compiled.points.get(uid)
+        return n is not None and not np.isnan(self.xy[n, 0])
+
+    def coords(self, uid: str) -> XY:
+        x, y = self.xy[self._compiled.points[uid]]
+        return (float(x), float(y))
+
+    def value(self, uid: str) -> float:
+        return float(self.values[self._compiled.measurements[uid]])
+
+    def collides(self, uid: str) -> bool:
+        return bool(self.collisions[self._compiled.bumpers[uid]])
+
+
+class _Sliders:
+    """ Arrays for a group of sliders (in one rank, all on one kind of
+    shape) to be evaluated in one go
+    """
+
+    def __init__(self, sliders: list[Slider], points: dict):
+        self.out = np.array([points[s.uid] for s in sliders], dtype=np.intp)
+        self.position = np.array([s._position for s in sliders])
+        self.velocity = np.array([s.effective_velocity for s in sliders])
+        self.loop = np.array([bool(s.loop) for s in sliders])
+        # how far each moves per frame as a fraction, where it's simple
+        steps = [frame_step(s.effective_velocity) for s in sliders]
+        self.exact = np.array([st is not None for st in steps], dtype=bool)
+        self.step = np.array([st or (0, 1) for st in steps],
+                             dtype=np.int64).reshape(-1, 2)
+        # those following a tempo, which are tabulated by the slider
+        self.tempo = [(k, s) for k, s in enumerate(sliders)
+                      if s.tempo is not None]
+
+    def turns(self, t: float) -> tuple[np.ndarray, np.ndarray]:
+        """ Whole turns made, and how far through the current one, of
+        each slider (were it looping) at `t`, as `clock.turns`
+        """
+        f = self.position + self.velocity * t
+        whole, phase = np.floor(f), np.mod(f, 1.0)
+        n = frame_number(t)
+        if n is not None and self.exact.any():
+            num, den = self.step[:, 0], self.step[:, 1]
+            w, rest = np.divmod(num * n, den)
+            fw, fp = np.divmod(self.position + rest / den, 1.0)
+            whole = np.where(self.exact, w + fw, whole)
+            phase = np.where(self.exact, fp, phase)
+        for k, s in self.tempo:
+            whole[k], phase[k] = s.turns(t)
+        return whole, phase
+
+    def fractions(self, t: float) -> np.ndarray:
+        """ How far along its parent each slider is at `t`, as
+        `Slider.get_coords`
+        """
+        f = self.position + self.velocity * t
+        f = np.where(self.loop, self.turns(t)[1], np.clip(f, 0.0, 1.0))
+        for k, s in self.tempo:
+            f[k] = s.fraction(t)
+        return f
+
+
+class _LineSliders(_Sliders):
+
+    def __init__(self, sliders: list[Slider], points: dict):
+        super().__init__(sliders, points)
+        self.a = np.array([points[s._parent._parents[0].uid]
+                           for s in sliders], dtype=np.intp)
+        self.b = np.array([points[s._parent._parents[1].uid]
+                           for s in sliders], dtype=np.intp)
+
+    def evaluate(self, t: float, xy: np.ndarray):
+        f = self.fractions(t)[:, None]
+        a = xy[self.a]
+        xy[self.out] = a + f * (xy[self.b] - a)
+
+
+class _CircleSliders(_Sliders):
+
+    def __init__(self, sliders: list[Slider], points: dict):
+        super().__init__(sliders, points)
+        self.centre = np.array([points[s._parent._centre.uid]
+                                for s in sliders], dtype=np.intp)
+        self.radius = np.array([s._parent._radius for s in sliders])
+        self.orientation = np.array([s._parent._orientation
+                                     for s in sliders])
+
+    def evaluate(self, t: float, xy: np.ndarray):
+        # the polygon starts east and runs clockwise (in y-up terms),
+        # so interpolate between its vertices as Shapely would
+        f = np.mod(self.fractions(t) + self.orientation, 1.0)
+        s = f * CIRCLE_SEGMENTS
+        k = np.floor(s)
+        w = (s - k)[:, None]
+        a0 = -TWO_PI * k / CIRCLE_SEGMENTS
+        a1 = -TWO_PI * (k + 1) / CIRCLE_SEGMENTS
+        v0 = np.stack((np.cos(a0), np.sin(a0)), axis=1)
+        v1 = np.stack((np.cos(a1), np.sin(a1)), axis=1)
+        xy[self.out] = (xy[self.centre]
+                        + self.radius[:, None] * (v0 + w * (v1 - v0)))
+
+
+class _PolyLineSliders(_Sliders):
+    """ Interpolates along each polyline's unit 'seed', then maps the
+    result onto the line's endpoints (the seed's scale/rotate/translate
+    is a similarity, so length fractions are preserved)
+    """
+
+    def __init__(self, sliders: list[Slider], points: dict):
+        super().__init__(sliders, points)
+        self.a = np.array([points[s._parent._parents[0].uid]
+                           for s in sliders], dtype=np.intp)
+        self.b = np.array([points[s._parent._parents[1].uid]
+                           for s in sliders], dtype=np.intp)
+        # all seeds end to end, with each one's normalised cumulative
+        # length offset by 2 * its index so one search finds segments
+        vertices, keys, first, last = [], [], [], []
+        for n, s in enumerate(sliders):
+            seed = np.asarray(s._parent._impl_seed.coords)
+            lengths = np.hypot(*np.diff(seed, axis=0).T)
+            cumulative = np.concatenate(([0.0], np.cumsum(lengths)))
+            first.append(sum(len(v) for v in vertices))
+            last.append(first[-1] + len(seed) - 2)
+            vertices.append(seed)
+            keys.append(2 * n + cumulative / cumulative[-1])
+        self.vertices = np.concatenate(vertices)
+        self.keys = np.concatenate(keys)
+        self.first = np.array(first, dtype=np.intp)
+        self.last = np.array(last, dtype=np.intp)
+        self.offset = 2 * np.arange(len(sliders))
+
+    def evaluate(self, t: float, xy: np.ndarray):
+        target = self.offset + self.fractions(t)
+        i = np.searchsorted(self.keys, target, side="right") - 1
+        i = np.clip(i, self.first, self.last)
+        span = self.keys[i + 1] - self.keys[i]
+        w = np.divide(target - self.keys[i], span,
+                      out=np.zeros_like(span), where=span > 0)[:, None]
+        seed = self.vertices[i] + w * (self.vertices[i + 1] - self.vertices[i])
+        a = xy[self.a]
+        d = xy[self.b] - a
+        xy[self.out, 0] = a[:, 0] + seed[:, 0] * d[:, 0] - seed[:, 1] * d[:, 1]
+        xy[self.out, 1] = a[:, 1] + seed[:, 0] * d[:, 1] + seed[:, 1] * d[:, 0]
+
+
+SLIDER_KERNELS = (
+    (Line, _LineSliders),
+    (PolyLine, _PolyLineSliders),
+    (Circle, _CircleSliders),
+)
+""" The shapes sliders can be vectorised along, by exact type """
+
+
+def _needed(uids: tuple, live: set) -> bool:
+    """ Is any of `uids` (sharing one slot) live? """
+    return any(uid in live for uid in uids)
+
+
+class _Rank:
+    """ Everything of one rank which produces a point
+    """
+
+    def __init__(self, entities: list, points: dict, copies: dict):
+        by_kernel = defaultdict(list)
+        self.fallback = []
+        """ `(index, entity, uids sharing its slot)` evaluated one by
+        one, if live """
+        for e in entities:
+            kernel = None
+            if isinstance(e, Slider):
+                kernel = next((k for shape, k in SLIDER_KERNELS
+                               if type(e._parent) is shape), None)
+            if kernel is None:
+                self.fallback.append((points[e.uid], e, copies[e.uid]))
+            else:
+                by_kernel[kernel].append(e)
+        self.kernels = [k(group, points) for k, group in by_kernel.items()]
+
+    def evaluate(self, t: float, xy: np.ndarray, live: set):
+        for kernel in self.kernels:
+            kernel.evaluate(t, xy)
+        for i, e, uids in self.fallback:
+            xy[i] = e.get_coords(t) if _needed(uids, live) else np.nan
+
+
+def _orientation(a: np.ndarray, b: np.ndarray, p: np.ndarray) -> np.ndarray:
+    """ Sign of the turn a -> b -> p, for each row
+    """
+    return np.sign((b[:, 0] - a[:, 0]) * (p[:, 1] - a[:, 1])
+                   - (b[:, 1] - a[:, 1]) * (p[:, 0] - a[:, 0]))
+
+
+class CompiledScene:
+    """ `scene` flattened into arrays for fast evaluation
+    """
+
+    def __init__(self, scene: Scene):
+        self._scene = scene
+        self.points: dict[str, int] = {}
+        """ index into `Frame.xy` of each point entity, by uid """
+        self.measurements: dict[str, int] = {}
+        """ index into `Frame.values` of each measurement, by uid """
+        self.bumpers: dict[str, int] = {}
+        """ index into `Frame.collisions` of each bumper, by uid """
+        self.broad_phase = BroadPhase()
+        """ how many bumpers were culled in the latest frame """
+
+        ranked = defaultdict(list)
+        anchors = []
+        # only what's live (see `Scene.live`) is ever evaluated one by
+        # one, and only once however many entities do exactly the same
+        # (see `cse`)
+        everything = scene.sort_by_rank()
+        self.shared = shared(everything)
+        """ the uid of the entity evaluated in place of each """
+        copies = defaultdict(tuple)
+        for e in everything:
+            copies[self.shared[e.uid]] += (e.uid,)
+        self._copies = copies
+        """ the uids sharing each representative's slot """
+        rows = 0
+        for e in everything:
+            if isinstance(e, (Anchor, Slider, Intersection)):
+                if self.shared[e.uid] != e.uid:
+                    self.points[e.uid] = self.points[self.shared[e.uid]]
+                    continue
+                self.points[e.uid] = rows
+                rows += 1
+                if type(e) is Anchor:
+                    anchors.append(e)
+                else:
+                    ranked[e.rank].append(e)
+
+        self._anchors = np.zeros((rows, 2))
+        for a in anchors:
+            self._anchors[self.points[a.uid]] = a.get_coords(0.0)
+        self._ranks = [_Rank(ranked[r], self.points, copies)
+                       for r in sorted(ranked)]
+
+        self._compile_measurements(scene)
+        self._compile_bumpers(scene)
+        self._controls = scene.list_by_class("control")
+        self._cached: tuple = (None, None, None)
+        """ `(t, live, positions)` last evaluated, since collision tests
+        look a frame ahead and the next frame can then reuse them """
+
+    @property
+    def scene(self) -> Scene:
+        return self._scene
+
+    def _compile_measurements(self, scene: Scene):
+        distances, angles, self._measure_fallback = [], [], []
+        copies = []
+        for e in scene.sort_by_rank():
+            if self.shared[e.uid] != e.uid:
+                copies.append(e)
+            elif type(e) is Distance:
+                distances.append(e)
+            elif (type(e) is Angle
+                  and all(type(p) in (Line, PolyLine) for p in e._parents)):
+                angles.append(e)
+            elif isinstance(e, (Distance, Angle)):
+                self._measure_fallback.append(e)
+            else:
+                continue
+        for n, e in enumerate(distances + angles + self._measure_fallback):
+            self.measurements[e.uid] = n
+        for e in copies:
+            if isinstance(e, (Distance, Angle)):
+                self.measurements[e.uid] = self.measurements[
+                    self.shared[e.uid]]
+
+        self._distance = np.array(
+            [[self.points[p.uid] for p in e._parents] for e in distances],
+            dtype=np.intp
+        ).reshape(-1, 2)
+        # both Line and PolyLine run from their first to second parent
+        self._angle = np.array(
+            [[self.points[p._parents[i].uid]
+              for p in e._parents for i in (0, 1)] for e in angles],
+            dtype=np.intp
+        ).reshape(-1, 4)
+
+    def _compile_bumpers(self, scene: Scene):
+        bumpers = scene.list_by_class("bumper")
+        for b in bumpers:
+            self.bumpers[b.uid] = len(self.bumpers)
+        self._bumpers = bumpers
+        # a bumper moving just as another, into the same collider, only
+        # copies its flag
+        first, copies, tested = {}, [], []
+        for b in bumpers:
+            key = (self.shared[b.uid], self.shared[b._collision_parent.uid])
+            if key in first:
+                copies.append((self.bumpers[b.uid], first[key]))
+            else:
+                first[key] = self.bumpers[b.uid]
+                tested.append(b)
+        self._bumper_copies = np.array(copies, dtype=np.intp).reshape(-1, 2)
+        bumpers = tested
+        lines = [b for b in bumpers if type(b._collision_parent) is Line]
+        self._line_bumpers = np.array(
+            [self.bumpers[b.uid] for b in lines], dtype=np.intp
+        )
+        self._line_bumper_points = np.array(
+            [self.points[b.uid] for b in lines], dtype=np.intp
+        )
+        self._line_colliders = np.array(
+            [[self.points[p.uid] for p in b._collision_parent._parents]
+             for b in lines], dtype=np.intp
+        ).reshape(-1, 2)
+        self._line_wrap = _Sliders(lines, self.points)
+        self._bumper_fallback = [(self.bumpers[b.uid], b) for b in bumpers
+                                 if type(b._collision_parent) is not Line]
+
+    def positions(self, t: float) -> np.ndarray:
+        """ Coordinates of every point entity at `t` (don't modify!)
+        """
+        live = self._scene.live(t)
+        cached_t, cached_live, xy = self._cached
+        if cached_t == t and cached_live is live:
+            return xy
+        xy = self._anchors.copy()
+        for rank in self._ranks:
+            rank.evaluate(t, xy, live)
+        self._cached = (t, live, xy)
+        return xy
+
+    def _values(self, t: float, xy: np.ndarray) -> np.ndarray:
+        values = np.empty(len(self._distance) + len(self._angle)
+                          + len(self._measure_fallback))
+        n = len(self._distance)
+        d = xy[self._distance[:, 1]] - xy[self._distance[:, 0]]
+        values[:n] = np.hypot(d[:, 0], d[:, 1])
+
+        m = n + len(self._angle)
+        i = self._angle
+        d0 = xy[i[:, 1]] - xy[i[:, 0]]
+        d1 = xy[i[:, 3]] - xy[i[:, 2]]
+        values[n:m] = np.mod(np.arctan2(d1[:, 1], d1[:, 0]) / TWO_PI
+                             - np.arctan2(d0[:, 1], d0[:, 0]) / TWO_PI, 1.0)
+
+        live = self._scene.live(t)
+        for k, e in enumerate(self._measure_fallback, m):
+            values[k] = (e.get_value(t) if _needed(self._copies[e.uid], live)
+                         else np.nan)
+        return values
+
+    def evaluate(self, t: float) -> Frame:
+        """ Positions and measurements at `t`
+        """
+        xy = self.positions(t)
+        return Frame(self, t, xy, self._values(t, xy))
+
+    def _collisions(self, frame: Frame, t_next: float) -> np.ndarray:
+        """ As `Bumper.test_collision` for every bumper
+        """
+        collisions = np.zeros(len(self.bumpers), dtype=bool)
+        self.broad_phase.start(frame.t)
+        if len(self._line_bumpers):
+            xy_next = self.positions(t_next)
+            p = frame.xy[self._line_bumper_points]
+            q = xy_next[self._line_bumper_points]
+            a = frame.xy[self._line_colliders[:, 0]]
+            b = frame.xy[self._line_colliders[:, 1]]
+            # broad phase: only where the trajectory's bounds meet the line's
+            near = np.flatnonzero(np.all(
+                (np.minimum(p, q) <= np.maximum(a, b))
+                & (np.minimum(a, b) <= np.maximum(p, q)), axis=1
+            ))
+            self.broad_phase.tested += len(near)
+            self.broad_phase.culled += len(p) - len(near)
+            p, q, a, b = p[near], q[near], a[near], b[near]
+            wrap = self._line_wrap
+            o_p = _orientation(a, b, p)
+            # exactly on (the interior of) the line
+            along = np.einsum("ij,ij->i", p - a, b - a)
+            on = ((o_p == 0) & (along > 0)
+                  & (along < np.einsum("ij,ij->i", b - a, b - a)))
+            # wrapping is teleporting, not crossing
+            wraps = wrap.loop[near] & (
+                wrap.turns(frame.t)[0][near] != wrap.turns(t_next)[0][near]
+            )
+            # trajectory properly crosses the line
+            crosses = ((o_p * _orientation(a, b, q) < 0)
+                       & (_orientation(p, q, a) * _orientation(p, q, b) < 0))
+            collisions[self._line_bumpers[near]] = on | (~wraps & crosses)
+        for i, b in self._bumper_fallback:
+            collisions[i] = self.broad_phase.test_collision(b, frame.t,
+                                                            t_next)
+        copies = self._bumper_copies
+        collisions[copies[:, 0]] = collisions[copies[:, 1]]
+        return collisions
+
+    def frame_events(self, t: float, t_next: float):
+        """ As `engine_sched.frame_events`, evaluated from arrays
+        """
+        frame = self.evaluate(t)
+        frame.collisions = self._collisions(frame, t_next)
+        for c in self._controls:
+            yield c.uid, c.msg.get_path(t), c.msg.evaluate(
+                self._input_values(c, frame), t
+            )
+        for b, hit in zip(self._bumpers, frame.collisions):
+            if hit:
+                yield from bumper_events(b, t, t_next,
+                                         self._input_values(b, frame))
+
+    def _input_values(self, source, frame: Frame) -> dict:
+        return {k: frame.value(v.uid) for k, v in source._inputs.items()}
@@ -1,8 +1,25 @@
+import argparse
+
 DEFAULT_SETTINGS = {
     "osc": {
         "ip": "127.0.0.1",
         "port": 1337
+    },
+    "collision": {
+        # frames a bumper must go without a collision before it can
+        # fire again (0 fires on every frame in contact)
+        "rearm_frames": 1
     }
 }
 
 settings = DEFAULT_SETTINGS
+
+
+def positive_int(value: str) -> int:
+    """ An argparse type for counts (e.g. of processes) of at least one
+    """
+    n = int(value)
+    if n < 1:
+        raise argparse.ArgumentTypeError(
+            "must be a positive whole number, not {}".format(value))
+    return n
@@ -0,0 +1,66 @@
+""" Common subexpressions: entities sharing their evaluation
+
+Scores (especially generated ones, repeating their motifs) often build
+the same thing more than once: two circles of the same radius about the
+same centre, several sliders on one parent at the same position and
+velocity. Each would be evaluated separately every frame, although they
+can't help but agree.
+
+`shared` hash-conses a scene's entities: each is keyed on what it does
+(its kind and parameters) and on the representatives of its parents, so
+in one pass (in rank order) every entity is matched with the first
+structurally identical one. The compiled scene and the generated tick
+function then evaluate each representative once and give its copies the
+same slot.
+
+Keys compare parameters exactly, so only identical computations (whose
+results are identical) are ever shared. Anything not understood here
+(e.g. groups, controls) is its own representative.
+"""
+
+from .entities import (
+    Entity, Anchor, Line, PolyLine, Circle, Slider, Intersection,
+    Distance, Angle
+)
+
+
+def _key(e: Entity, rep: dict):
+    """ What `e` computes, given the representatives `rep` (by uid) of
+    its parents; None if it's not to be shared
+    """
+    kind = type(e)
+    if kind is Anchor:
+        return (kind, e.get_coords(0.0))
+    if kind is Line:
+        return (kind,) + tuple(rep[p.uid] for p in e._parents)
+    if kind is PolyLine:
+        return ((kind,) + tuple(rep[p.uid] for p in e._parents)
+                + (tuple(tuple(m) for m in e._midpoints),))
+    if kind is Circle:
+        return (kind, rep[e._centre.uid], e._radius, e._orientation,
+                e.default_child_velocity)
+    if isinstance(e, Slider):
+        # (a bumper is where a slider like it would be)
+        tempo = e.tempo
+        if tempo is not None:
+            tempo = tuple(sorted((k, repr(v))
+                                 for k, v in tempo.to_dict().items()))
+        return (Slider, rep[e._parent.uid], e._position,
+                e.effective_velocity, bool(e.loop), tempo)
+    if kind in (Intersection, Distance, Angle):
+        return (kind,) + tuple(rep[p.uid] for p in e._parents)
+    return None
+
+
+def shared(entities: list[Entity]) -> dict[str, str]:
+    """ The uid of each of `entities` (in rank order) mapped to that of
+    its representative: the first entity doing exactly what it does
+    """
+    rep, first = {}, {}
+    for e in entities:
+        key = _key(e, rep)
+        if key is None:
+            rep[e.uid] = e.uid
+        else:
+            rep[e.uid] = first.setdefault(key, e.uid)
+    return rep
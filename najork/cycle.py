@@ -0,0 +1,138 @@
+""" Replaying periodic scenes
+
+Scores are mostly looping sliders and bumpers moving at simple rational
+velocities, so the whole mechanism is often exactly periodic: a slider
+looping at velocity p/q is back where it started every q/p seconds, and
+so the scene is back where it started after the least common multiple
+of all those periods. Rather than work out the same geometry forever,
+a `CycleCache` records the events of each frame the first time round
+the cycle and replays them every time after, with no geometry at all.
+
+A scene is only treated as periodic if
+
+  - every moving slider loops
+  - every velocity is a simple fraction (see `clock.MAX_DENOMINATOR`)
+  - no message data uses `t` directly
+  - the cycle is no longer than `MAX_CYCLE_FRAMES`
+
+otherwise `cycle_frames` returns None and it's evaluated live as usual.
+"""
+
+import logging
+import math
+from fractions import Fraction
+
+from .broadphase import BroadPhase
+from .clock import FRAME_RATE, as_fraction, frame_number
+from .engine_sched import frame_events
+from .entities import Slider, MessageSource
+from .osc import TemplatedMessage
+from .scene import Scene
+
+MAX_CYCLE_FRAMES = 24 * 60 * 10
+""" longer cycles aren't worth the memory """
+
+MAX_CACHED_EVENTS = 1000000
+""" give up (and go back to live evaluation) after recording this many """
+
+FRAME = Fraction(1, FRAME_RATE)
+
+
+def period(scene: Scene) -> Fraction:
+    """ The least common period of the scene's motion in seconds (zero
+    if nothing moves), or None if it's not periodic
+    """
+    numerators, denominators = [], []
+    for e in scene.sort_by_rank():
+        if isinstance(e, MessageSource):
+            msg = e.msg
+            if isinstance(msg, TemplatedMessage) and "t" in msg.variables():
+                return None
+        if isinstance(e, Slider):
+            v = e.effective_velocity
+            if v == 0.0:
+                continue
+            if not e.loop or e.tempo is not None:
+                # (a tempo's period needn't fit the slider's)
+                return None
+            v = as_fraction(abs(v))
+            if v is None:
+                return None
+            # a loop takes 1/v = v.denominator / v.numerator seconds
+            numerators.append(v.denominator)
+            denominators.append(v.numerator)
+    if not numerators:
+        return Fraction(0)
+    # lcm of fractions a/b is lcm(a...) / gcd(b...)
+    return Fraction(math.lcm(*numerators), math.gcd(*denominators))
+
+
+def cycle_frames(scene: Scene) -> int:
+    """ How many frames before the scene's events repeat, or None if
+    they don't (soon enough)
+    """
+    p = period(scene)
+    if p is None:
+        return None
+    if p == 0:
+        return 1
+    # the first whole number of frames which is a whole number of periods
+    frames = (p / FRAME).numerator
+    if frames > MAX_CYCLE_FRAMES:
+        return None
+    return frames
+
+
+class CycleCache:
+    """ Frame events for a scene which repeats every `frames` frames,
+    evaluated live (by `program`, if given) first time round and
+    replayed from then on. Used wherever a compiled program is
+    """
+
+    def __init__(self, scene: Scene, frames: int, program=None):
+        self._scene = scene
+        self._program = program
+        self.frames = frames
+        self._cycle: list = [None] * frames
+        """ recorded events, by frame number modulo `frames` """
+        self._cached = 0
+        self.replayed = 0
+        """ frames served from the cache (rather than evaluated) """
+        self.broad_phase = getattr(program, "broad_phase", BroadPhase())
+
+    @property
+    def scene(self) -> Scene:
+        return self._scene
+
+    def evaluate(self, t: float):
+        return self._program.evaluate(t)
+
+    def _live(self, t: float, t_next: float):
+        if self._program is not None:
+            return self._program.frame_events(t, t_next)
+        return frame_events(self._scene, t, t_next, self.broad_phase)
+
+    def frame_events(self, t: float, t_next: float):
+        """ As `engine_sched.frame_events`, replayed if we can
+        """
+        n = frame_number(t)
+        if self._cycle is None or n is None:
+            # not caching (any more), or off the frame grid after a seek
+            return self._live(t, t_next)
+        slot = n % self.frames
+        events = self._cycle[slot]
+        if events is not None:
+            self.replayed += 1
+            return events
+        events = list(self._live(t, t_next))
+        self._cached += len(events)
+        if self._cached > MAX_CACHED_EVENTS:
+            logging.info("Too many events to cache, evaluating live")
+            self._cycle = None
+        else:
+            self._cycle[slot] = events
+        return events
+
+    def close(self):
+        if self._program is not None and hasattr(self._program, "close"):
+            self._program.close()
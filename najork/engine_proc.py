@@ -0,0 +1,432 @@
+""" Running the engine in its own process
+
+The GTK main loop and the engine thread share an interpreter, and so a
+GIL: heavy drawing delays OSC ticks and heavy ticks make the UI stutter.
+An `EngineProcess` is a stand-in for `Engine` which runs the real one in
+a child process, so realtime output never waits on the UI:
+
+  - transport commands (start, pause, rewind, seek) and new scenes go
+    to the child over a pipe
+  - the child publishes the playhead into a small block of shared
+    memory, and after every tick the position of every point (and every
+    bumper's collision flag) into a shared memory ring buffer, from its
+    own thread so the tick never waits on it
+  - the UI keeps its own copy of the scene for drawing, and reads
+    positions straight out of the ring (see `SharedFrame`) without
+    copying or waiting on the child
+
+All the shared memory is created (and freed) by the parent.
+"""
+
+import logging
+import multiprocessing
+import threading
+from multiprocessing import shared_memory
+
+from .broadphase import BroadPhase
+from .clock import after
+from .engine_sched import Engine
+from .entities import Anchor, Slider, Intersection, Group
+from .scene import Scene
+
+RING_SLOTS = 8
+""" Frames in the ring; a reader has this many frames' grace to finish
+drawing one before it's overwritten """
+
+# status block: playhead, running, generation of the scene playing
+STATUS_POS, STATUS_RUNNING, STATUS_GENERATION = range(3)
+
+
+def _layout(scene: Scene) -> tuple[list[str], list[str]]:
+    """ uids of the points and bumpers published for `scene` (every
+    point, since what's in the viewport changes as things move)
+    """
+    points = [e.uid for e in scene.sort_by_rank()
+              if isinstance(e, (Anchor, Slider, Intersection))]
+    bumpers = [b.uid for b in scene.list_by_class("bumper")]
+    return points, bumpers
+
+
+class FrameRing:
+    """ A ring of frames in shared memory, laid out (as doubles) as
+
+        [latest seq] + RING_SLOTS * [seq, t, x0, y0, x1, y1..., flags...]
+    """
+
+    def __init__(self, points: list[str], bumpers: list[str],
+                 name: str = None):
+        self.points = {uid: n for n, uid in enumerate(points)}
+        self.bumpers = {uid: n for n, uid in enumerate(bumpers)}
+        self.slot_size = 2 + 2 * len(points) + len(bumpers)
+        self._shm = shared_memory.SharedMemory(
+            name=name, create=name is None,
+            size=8 * (1 + RING_SLOTS * self.slot_size)
+        )
+        self._buf = self._shm.buf.cast("d")
+        if name is None:
+            self._buf[0] = -1
+
+    @property
+    def name(self) -> str:
+        return self._shm.name
+
+    def write(self, seq: int, t: float, coords: list, flags: list):
+        base = 1 + (seq % RING_SLOTS) * self.slot_size
+        buf = self._buf
+        buf[base] = -1  # being written
+        buf[base + 1] = t
+        n = base + 2
+        for x, y in coords:
+            buf[n] = x
+            buf[n + 1] = y
+            n += 2
+        for f in flags:
+            buf[n] = 1.0 if f else 0.0
+            n += 1
+        buf[base] = seq
+        buf[0] = seq
+
+    def latest(self) -> 'SharedFrame':
+        seq = int(self._buf[0])
+        if seq < 0:
+            return None
+        base = 1 + (seq % RING_SLOTS) * self.slot_size
+        return SharedFrame(self, self._buf[base:base + self.slot_size])
+
+    def close(self, unlink: bool = False):
+        self._buf.release()
+        try:
+            self._shm.close()
+        except BufferError:
+            # someone's still holding a SharedFrame, so the mapping
+            # goes when they (and so we) are collected
+            pass
+        if unlink:
+            self._shm.unlink()
+
+
+class SharedFrame:
+    """ A view onto one frame in a `FrameRing`, usable wherever a
+    `compiled.Frame` is (e.g. by `renderer.render`)
+    """
+    __slots__ = ("_ring", "_view", "collisions")
+
+    def __init__(self, ring: FrameRing, view: memoryview):
+        self._ring = ring
+        self._view = view
+        self.collisions = view[2 + 2 * len(ring.points):]
+
+    @property
+    def t(self) -> float:
+        return self._view[1]
+
+    def __contains__(self, uid: str) -> bool:
+        return uid in self._ring.points
+
+    def coords(self, uid: str):
+        n = 2 + 2 * self._ring.points[uid]
+        return (self._view[n], self._view[n + 1])
+
+    def collides(self, uid: str) -> bool:
+        return bool(self.collisions[self._ring.bumpers[uid]])
+
+    def __del__(self):
+        # let go of the mapping before the ring (and its shared memory)
+        # can be, or closing it fails
+        self.collisions.release()
+        self._view.release()
+
+
+class _Publisher:
+    """ Child side: writes frames for whichever scene the engine is
+    playing into that scene's ring. Ticks just hand over the frame, which
+    is published on the publisher's own thread (skipping to the latest
+    if it falls behind)
+    """
+
+    def __init__(self, conn, status: memoryview):
+        self._conn = conn
+        self._status = status
+        self._rings = {}
+        """ id(scene) -> (generation, ring, points, bumpers) """
+        self._seq = 0
+        self._generation = None
+        self._broad_phase = BroadPhase()
+        """ for collision flags the engine hasn't worked out """
+        self.lock = threading.Lock()
+        self._latest = None
+        """ `(engine, scene, t)` of the latest tick not yet published """
+        self._ticked = threading.Event()
+        self._alive = True
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def add(self, scene: Scene, generation: int, ring_name: str,
+            points: list[str], bumpers: list[str]):
+        ring = FrameRing(points, bumpers, name=ring_name)
+        with self.lock:
+            self._rings[id(scene)] = (
+                generation, ring,
+                [scene.get_by_id(uid) for uid in points],
+                [scene.get_by_id(uid) for uid in bumpers],
+            )
+
+    def on_tick(self, engine: Engine, scene: Scene, t: float):
+        self._latest = (engine, scene, t)
+        self._ticked.set()
+
+    def _run(self):
+        while True:
+            self._ticked.wait()
+            self._ticked.clear()
+            if not self._alive:
+                return
+            latest, self._latest = self._latest, None
+            if latest is None:
+                continue
+            try:
+                self.publish(*latest)
+            except Exception:
+                # drawing is only a nicety, never stop the engine for it
+                logging.exception("Failed to publish frame")
+
+    def _collides(self, b, t: float, contacts) -> bool:
+        if contacts is None:
+            # not a frame the engine's evaluated, e.g. after a seek
+            if type(b._collision_parent) is Group:
+                return b.test_collision(t, after(t))
+            return self._broad_phase.test_collision(b, t, after(t))
+        if type(b._collision_parent) is Group:
+            prefix = b.uid + "/"
+            return any(uid.startswith(prefix) for uid in contacts)
+        return b.uid in contacts
+
+    def publish(self, engine: Engine, scene: Scene, t: float):
+        with self.lock:
+            self._status[STATUS_POS] = t
+            self._status[STATUS_RUNNING] = 1.0 if engine.running else 0.0
+            if id(scene) not in self._rings:
+                return
+            generation, ring, points, bumpers = self._rings[id(scene)]
+            frame = engine.get_frame(t)
+            # (a compiled frame only has the live points)
+            coords = (frame.coords(e.uid)
+                      if frame is not None and e.uid in frame
+                      else e.get_coords(t) for e in points)
+            # the bumpers in contact are those the engine's just sent
+            # (or held back) events for
+            contacts = engine.contacts(t)
+            flags = (self._collides(b, t, contacts) for b in bumpers)
+            ring.write(self._seq, t, coords, flags)
+            self._seq += 1
+            if generation != self._generation:
+                # the parent can let go of anything older
+                self._generation = generation
+                self._status[STATUS_GENERATION] = generation
+                for key, (g, old, _, _) in list(self._rings.items()):
+                    if g < generation:
+                        old.close()
+                        del self._rings[key]
+                self._conn.send(("swapped", generation))
+
+    def close(self):
+        self._alive = False
+        self._ticked.set()
+        self._thread.join()
+        with self.lock:
+            for _, ring, _, _ in self._rings.values():
+                ring.close()
+            self._rings = {}
+
+
+def _serve(conn, status_name: str, settings: dict, end_time: float,
+           compiled: bool, jobs: int, generated: bool):
+    """ The child process: an engine driven by commands from `conn`
+    """
+    status_shm = shared_memory.SharedMemory(name=status_name)
+    status = status_shm.buf.cast("d")
+    publisher = _Publisher(conn, status)
+    engine = None
+    try:
+        engine = Engine(Scene(), settings, end_time=end_time,
+                        compiled=compiled, jobs=jobs, generated=generated,
+                        on_tick=lambda s, t: publisher.on_tick(engine, s, t))
+        while True:
+            command, *args = conn.recv()
+            if command == "shutdown":
+                break
+            elif command == "scene":
+                generation, scene_def, ring_name, points, bumpers = args
+                try:
+                    scene = Scene()
+                    scene.load_from_dict(scene_def)
+                    scene.warm(engine.pos)
+                    publisher.add(scene, generation, ring_name,
+                                  points, bumpers)
+                    engine.swap_scene(scene)
+                except Exception as ex:
+                    logging.exception("Failed to load scene, keeping current")
+                    with publisher.lock:
+                        conn.send(("failed", generation, str(ex)))
+                    continue
+            elif command == "start":
+                engine.start()
+            elif command == "pause":
+                engine.pause()
+            elif command == "rewind":
+                engine.rewind()
+            elif command == "seek":
+                engine.pos = args[0]
+            if not engine.running:
+                # nothing's ticking, so publish where we are now
+                publisher.publish(engine, engine.get_scene(), engine.pos)
+    finally:
+        if engine is not None:
+            engine.shutdown()
+        publisher.close()
+        status.release()
+        status_shm.close()
+        conn.close()
+
+
+class EngineProcess:
+    """ Drop-in for `Engine` (as used by the UI) which runs the engine
+    in a child process
+    """
+
+    def __init__(self, scene: Scene, settings: dict, end_time: float = 0.0,
+                 compiled: bool = False, jobs: int = 1,
+                 generated: bool = False):
+        self._status_shm = shared_memory.SharedMemory(create=True,
+                                                      size=8 * 3)
+        self._status = self._status_shm.buf.cast("d")
+        self._status[STATUS_GENERATION] = -1
+        self._scene = scene
+        self._ring: FrameRing = None
+        self._pending = {}
+        """ generation -> (scene, ring) sent but not yet playing """
+        self._generation = 0
+        self._lock = threading.Lock()
+
+        context = multiprocessing.get_context("spawn")
+        self._conn, child = context.Pipe()
+        self._process = context.Process(
+            target=_serve, daemon=True,
+            args=(child, self._status_shm.name, settings, end_time,
+                  compiled, jobs, generated)
+        )
+        self._process.start()
+        child.close()
+        self.swap_scene(scene)
+
+    def _send(self, *message):
+        with self._lock:
+            self._conn.send(message)
+
+    def _poll(self):
+        """ Deal with anything the child has told us """
+        with self._lock:
+            while self._conn.poll():
+                message, generation, *rest = self._conn.recv()
+                scene, ring = self._pending.pop(generation, (None, None))
+                if message == "swapped":
+                    old, self._ring = self._ring, ring
+                    self._scene = scene
+                    if old is not None:
+                        old.close(unlink=True)
+                    # anything older was superseded before it played
+                    for g in [g for g in self._pending if g < generation]:
+                        self._pending.pop(g)[1].close(unlink=True)
+                elif ring is not None:
+                    logging.error("Engine process failed to load scene: %s",
+                                  rest[0] if rest else "")
+                    ring.close(unlink=True)
+
+    @property
+    def pos(self) -> float:
+        return self._status[STATUS_POS]
+
+    @pos.setter
+    def pos(self, new_val: float):
+        self._send("seek", new_val)
+
+    @property
+    def running(self) -> bool:
+        return bool(self._status[STATUS_RUNNING])
+
+    def start(self):
+        self._send("start")
+
+    def pause(self):
+        self._send("pause")
+
+    def rewind(self):
+        self._send("rewind")
+
+    def get_scene(self) -> Scene:
+        """ The (UI's copy of the) scene the engine is playing """
+        self._poll()
+        return self._scene
+
+    def get_frame(self, t: float = None) -> SharedFrame:
+        """ The latest frame published by the engine (whatever `t`) """
+        self._poll()
+        if self._ring is None:
+            return None
+        return self._ring.latest()
+
+    def swap_scene(self, scene: Scene):
+        """ Send the engine a new scene, which `get_scene` returns
+        once the engine is actually playing it
+        """
+        # (sent, since the child's copy may not list them in our order)
+        points, bumpers = _layout(scene)
+        ring = FrameRing(points, bumpers)
+        with self._lock:
+            self._generation += 1
+            self._pending[self._generation] = (scene, ring)
+            self._conn.send(("scene", self._generation,
+                             scene.save_to_dict(), ring.name,
+                             points, bumpers))
+
+    def load_scene_async(self, build: callable, on_ready: callable = None):
+        """ As `Engine.load_scene_async` """
+        def worker():
+            try:
+                scene = build()
+                scene.warm(self.pos)
+                self.swap_scene(scene)
+            except Exception:
+                logging.exception("Failed to load scene, keeping current")
+                return
+            if on_ready is not None:
+                on_ready(scene)
+
+        loader = threading.Thread(target=worker, daemon=True)
+        loader.start()
+        return loader
+
+    def shutdown(self):
+        if self._process is None:
+            return
+        try:
+            self._send("shutdown")
+        except OSError:
+            pass
+        self._process.join(timeout=2.0)
+        if self._process.is_alive():
+            self._process.terminate()
+        self._process = None
+        self._conn.close()
+        for _, ring in self._pending.values():
+            ring.close(unlink=True)
+        self._pending = {}
+        if self._ring is not None:
+            self._ring.close(unlink=True)
+            self._ring = None
+        self._status.release()
+        self._status_shm.close()
+        self._status_shm.unlink()
+
+    def __del__(self):
+        self.shutdown()
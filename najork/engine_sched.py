@@ -15,23 +15,82 @@ import threading
 import time
 import logging
 
+from . import trace
 from .scene import Scene
+from .entities import Bumper, Group
+from .lazy import lazy_import
+from .broadphase import BroadPhase
+from .clock import FRAME_TIME, after, frame_time, nearest_frame
+from .collision import CollisionState, rearm_frames
 
 from oscpy.client import OSCClient
 
-CV_FRAME_TIME = 1.0 / 24.0  # let's do PAL for now
+# only needed (along with numpy) by engines running compiled scenes
+compiled = lazy_import("najork.compiled")
+parallel = lazy_import("najork.parallel")
+cycle = lazy_import("najork.cycle")
+
+CV_FRAME_TIME = FRAME_TIME  # let's do PAL for now
+
+
+def frame_events(scene: Scene, t: float, t_next: float,
+                 broad_phase: BroadPhase = None):
+    """ Yield `(uid, path, data)` for every message the scene wants
+    sent during the time slice `t` -> `t_next`
+
+    Shared by the realtime engine and the offline renderer so both
+    always agree on what a frame contains. Bumpers are culled by
+    `broad_phase` (which keeps count) if given.
+    """
+    if broad_phase is None:
+        broad_phase = BroadPhase()
+    # every measurement this frame shares its points' coords
+    points = {}
+    for c in scene.list_by_class("control"):
+        yield (c.uid, c.msg.get_path(t),
+               c.msg.evaluate(c._bindings(t, points), t))
+    for b in scene.list_by_class("bumper"):
+        # (a group's index does its own culling)
+        if (type(b._collision_parent) is Group
+                or broad_phase.test_collision(b, t, t_next)):
+            yield from bumper_events(b, t, t_next, b._bindings(t, points))
+
+
+def bumper_events(b: Bumper, t: float, t_next: float, values: dict):
+    """ Yield `(uid, path, data)` for bumper `b` having collided during
+    `t` -> `t_next`, given the `values` of its inputs: one event, or for
+    a bumper colliding with a `Group` one for each member hit, with uid
+    "<bumper>/<member>". The shape hit is bound to `hit` and `hit_index`
+    (see `Bumper.hit_bindings`).
+    """
+    path = b.msg.get_path(t)
+    if type(b._collision_parent) is not Group:
+        yield b.uid, path, b.msg.evaluate(dict(values, **b.hit_bindings()),
+                                          t)
+        return
+    members = b._collision_parent.members
+    for i in b.hits(t, t_next):
+        yield ("{}/{}".format(b.uid, members[i].uid), path,
+               b.msg.evaluate(dict(values, **b.hit_bindings(i)), t))
+
 
 class Engine:
 
     @property
     def pos(self):
-        return self._pos
+        return frame_time(self._frame)
+
+    @property
+    def frame(self) -> int:
+        """ The number of the current frame (see `clock`) """
+        return self._frame
 
     @pos.setter
     def pos(self, new_val: float):
+        # (snapped to the nearest frame)
         if not self._running:
             with self.state_lock:
-                self._pos = new_val
+                self._frame = nearest_frame(new_val)
         else:
             # just ignore - should we error?
             pass
@@ -40,11 +99,37 @@ class Engine:
     def running(self):
         return self._running
 
-    def __init__(self, scene: Scene, settings: dict):
+    def __init__(self, scene: Scene, settings: dict, end_time: float = 0.0,
+                 compiled: bool = False, jobs: int = 1,
+                 on_tick: callable = None, cache_cycle: bool = False,
+                 generated: bool = False):
+        self._on_tick = on_tick
+        """ called as `on_tick(scene, t)` after each frame is sent """
+        self._compiled = compiled
+        """ evaluate frames from a `CompiledScene` rather than entities """
+        self._generated = generated
+        """ unless compiled, evaluate frames with a tick function
+        generated for the scene (see `codegen`) """
+        self._jobs = jobs
+        """ if > 1, evaluate independent mechanisms in this many
+        processes (see `ParallelScene`) """
+        self._cache_cycle = cache_cycle
+        """ record the events of periodic scenes for one cycle and
+        replay them from then on (see `CycleCache`) """
+        self._rearm_frames = rearm_frames(settings)
+        """ frames without contact before a bumper can fire again """
+        self.broad_phase = BroadPhase()
+        """ culls bumpers evaluated entity by entity, and counts them """
         self._scene = scene
-        self._pos = 0.0
+        self._program = self._compile(scene)
+        self._collisions = self._collision_state(scene)
+        self._next_scene = None
+        self._contacts = (None, frozenset())
+        """ `(t, uids)` of the events in the latest frame evaluated """
+        self._frame = 0
+        """ frames since t = 0; `pos` is worked out from this """
         self._running = False
-        self._end_time = 0.0  # secs - 0 is run forever
+        self._end_time = end_time  # secs - 0 is run forever
 
         self.state_lock = threading.Lock()
 
@@ -57,6 +142,90 @@ class Engine:
     def get_scene(self) -> Scene:
         return self._scene
 
+    def get_frame(self, t: float):
+        """ The compiled scene evaluated at `t`, if running compiled
+        """
+        program = self._program
+        if not self._compiled or program is None:
+            return None
+        return program.evaluate(t)
+
+    def contacts(self, t: float):
+        """ uids of the events (so of the bumpers in contact, hits on a
+        group's members as "<bumper>/<member>") in the frame at `t`, if
+        it's the latest evaluated, else None
+        """
+        contacts_t, uids = self._contacts
+        return uids if contacts_t == t else None
+
+    def _compile(self, scene: Scene):
+        program = None
+        if self._compiled:
+            program = compiled.CompiledScene(scene)
+        elif self._generated:
+            program = scene.compile_tick()
+        elif self._jobs > 1:
+            program = parallel.ParallelScene(scene, self._jobs)
+        if self._cache_cycle:
+            frames = cycle.cycle_frames(scene)
+            if frames is not None:
+                logging.info("Scene repeats every %d frames, caching", frames)
+                return cycle.CycleCache(scene, frames, program)
+        return program
+
+    def _collision_state(self, scene: Scene) -> CollisionState:
+        return CollisionState.for_scene(scene, self._rearm_frames,
+                                        CV_FRAME_TIME)
+
+    @staticmethod
+    def _release(program):
+        if program is not None and hasattr(program, "close"):
+            program.close()
+
+    def swap_scene(self, scene: Scene):
+        """ Replace the scene without stopping. If running, the swap
+        happens at the next frame boundary, and either way the playhead
+        and OSC client are kept.
+
+        A compiled (or generated) scene is a snapshot of the scene as it
+        was handed over: after editing the scene, hand it over again to
+        rebuild it. Moving the viewport needs no rebuild.
+        """
+        program = self._compile(scene)
+        with self.state_lock:
+            if self._running:
+                if self._next_scene is not None:
+                    # superseded before it was ever swapped in
+                    self._release(self._next_scene[1])
+                self._next_scene = (scene, program)
+                return
+            old = self._program
+            self._scene, self._program = scene, program
+            self._collisions = self._collision_state(scene)
+            self._contacts = (None, frozenset())
+        self._release(old)
+
+    def load_scene_async(self, build: callable, on_ready: callable = None):
+        """ Build a scene with `build()` on a background thread, warm
+        it up at the current playhead and then hot-swap it in, calling
+        `on_ready(scene)` once it's been handed over. If anything goes
+        wrong building it, the current scene just keeps playing
+        """
+        def worker():
+            try:
+                scene = build()
+                scene.warm(self.pos)
+                self.swap_scene(scene)
+            except Exception:
+                logging.exception("Failed to load scene, keeping current")
+                return
+            if on_ready is not None:
+                on_ready(scene)
+
+        loader = threading.Thread(target=worker, daemon=True)
+        loader.start()
+        return loader
+
     def setup_osc(self, settings):
         if (
                 "osc" in settings
@@ -86,13 +255,18 @@ class Engine:
         self.pause()
         self._alive = False
         self._t.join()
+        with self.state_lock:
+            self._release(self._program)
+            self._program = None
+            if self._next_scene is not None:
+                self._release(self._next_scene[1])
+                self._next_scene = None
 
     def send_osc_msg(self, path, data):
         """ Construct and dispatch and OSC message
         to pre-configured endpoint
         """
         if self._osc_client is not None:
-            logging.debug("Sending OSC message {}={}".format(path, data))
             self._osc_client.send_message(path, data)
 
     def _run(self):
@@ -153,23 +327,36 @@ class Engine:
         if self._running:
             self.pause()
             with self.state_lock:
-                self._pos = 0.0
+                self._frame = 0
             self.start()
         else:
             with self.state_lock:
-                self._pos = 0.0
+                self._frame = 0
 
     def tick(self):
-        logging.debug("Engine::Tick")
         with self.state_lock:
+            if self._next_scene is not None:
+                # hot-swap at the frame boundary
+                old = self._program
+                self._scene, self._program = self._next_scene
+                self._next_scene = None
+                self._collisions = self._collision_state(self._scene)
+                if old is not None:
+                    # (stopping workers can take a while, not on our time)
+                    threading.Thread(target=self._release, args=(old,),
+                                     daemon=True).start()
             # do_engine_stuff()
             # event though our events are scheduled for frame
             # time increments, we can't rely on them arriving in
             # time, and so to ensure output is deterministic
-            # we must keep out own idealised engine clock (pos)
-            self._pos += CV_FRAME_TIME
-
-        if self._end_time > 0.0 and self._pos > self._end_time:
+            # we must keep out own idealised engine clock (pos), counted
+            # in frames so it never drifts
+            self._frame += 1
+        t = self.pos
+        if trace.enabled:
+            trace.record(trace.TICK, self._frame)
+
+        if self._end_time > 0.0 and t > self._end_time:
             # end time == 0.0 means run forever
             self.pause()
 
@@ -179,18 +366,45 @@ class Engine:
             self._s.enterabs(self._next_time(), 1, self.tick)
 
         if self._running:
-            self._triggers(self._pos)
+            self._triggers(t)
+        if self._on_tick is not None:
+            self._on_tick(self._scene, t)
+
 
-        logging.debug(" -> Frame time: %f", self._pos)
+    def _events(self, t: float):
+        """ Every event in the frame at `t`, before edge triggering. If
+        the scene's program fails (e.g. a parallel worker dies), it's
+        dropped and the scene evaluated in process from then on, rather
+        than playback stopping
+        """
+        program = self._program
+        if program is not None:
+            try:
+                return list(program.frame_events(t, after(t)))
+            except Exception:
+                logging.exception("Evaluating the scene failed, carrying "
+                                  "on evaluating it in process")
+                with self.state_lock:
+                    if self._program is program:
+                        self._program = None
+                threading.Thread(target=self._release, args=(program,),
+                                 daemon=True).start()
+        return frame_events(self._scene, t, after(t),
+                            self.broad_phase)
 
     def _triggers(self, t: float):
         """ Iterate through all the message sending entities
         and see if they need to do anything
         """
-        controls = self._scene.list_by_class("control")
-        for c in controls:
-            self.send_osc_msg(c.msg.get_path(t), c.msg.get_data(t))
-        bumpers = self._scene.list_by_class("bumper")
-        for b in bumpers:
-            if b.test_collision(t, t+CV_FRAME_TIME):
-                self.send_osc_msg(b.msg.get_path(t), b.msg.get_data(t))
+        frame = list(self._events(t))
+        self._contacts = (t, frozenset(uid for uid, _, _ in frame))
+        events = self._collisions.filter(t, frame, self._events)
+        for uid, path, data in events:
+            if trace.enabled:
+                trace.record(trace.SEND, trace.subject(uid))
+            self.send_osc_msg(path, data)
+        if trace.enabled:
+            broad_phase = getattr(self._program, "broad_phase",
+                                  self.broad_phase)
+            trace.record(trace.CULLED, broad_phase.culled)
+            trace.record(trace.TESTED, broad_phase.tested)
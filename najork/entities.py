@@ -22,15 +22,21 @@ makes this nightmare to unpick, merely for the sake of a little terseness.
 TODO probably Numpy all of this.
 """
 
+from __future__ import annotations
+
 from abc import ABC, abstractmethod
-from shapely import geometry as geos
-from shapely import ops as geops
-from shapely import affinity
 
+from . import kernels, trace
+from .broadphase import GridIndex, SegmentIndex, swept_bounds
+from .clock import turns
+from .lazy import lazy_import
 from .osc import TemplatedMessage
-from math import atan2, degrees, pi as PI, sqrt
+from .tempo import Tempo
+from math import atan2, cos, degrees, floor, pi as PI, sqrt
 
-import logging
+# Shapely (and GEOS) is only loaded once a geometry is first built
+geos = lazy_import("shapely.geometry")
+affinity = lazy_import("shapely.affinity")
 
 XY = tuple[float, float]
 
@@ -42,6 +48,10 @@ BOUND_TOLERANCE = 5
 # chamfering edges
 CIRCLE_RES = 32
 
+CIRCLE_SAG = 1.0 - cos(PI / (CIRCLE_RES * 4))
+""" how far (as a fraction of the radius) a circle's polygon's edges
+come inside the true circle, at most """
+
 
 def clamp(v: float, m=0.0, M=1.0) -> float:
     """ CLAMP
@@ -82,9 +92,13 @@ def XY_add(a: XY, b: XY) -> XY:
 
 class Entity(ABC):
     """ Base for anything that can appear on the canvas
+
+    Scenes can hold 100k+ entities, so every class in the hierarchy
+    declares `__slots__` (mixins declare empty ones and leave the
+    storage to their concrete subclasses) and nothing has an
+    instance `__dict__`.
     """
-    _uid: str = ""
-    _rank: int = 0
+    __slots__ = ("_uid", "_rank")
 
     @classmethod
     @property
@@ -136,6 +150,8 @@ class Entity(ABC):
         return self._uid
 
 class ShapelyProxy(ABC):
+    __slots__ = ()
+
     @abstractmethod
     def get_impl(self, t: float) -> geos.base.BaseGeometry:
         """ Get a shapely version of whatever this is
@@ -150,9 +166,9 @@ class ShapelyProxy(ABC):
 
 class ShapelyConcrete(ShapelyProxy):
     """ An invariant entity which can
-    bake in its representation
+    bake in its representation (in `_impl`, a slot of the subclass)
     """
-    _impl: geos.base.BaseGeometry = None
+    __slots__ = ()
 
     def get_impl(self, t: float) -> geos.base.BaseGeometry:
         """ Returns actual internal repr. `t` is discarded since we
@@ -164,6 +180,7 @@ class ShapelyConcrete(ShapelyProxy):
 class Point(Entity):
     """Base class for any 1D item
     """
+    __slots__ = ()
 
     @abstractmethod
     def get_coords(self, t: float) -> XY:
@@ -183,10 +200,12 @@ class Point(Entity):
         return self.get_coords(t)
 
 
-class Anchor(Point, ShapelyConcrete):
+class Anchor(Point, ShapelyProxy):
     """Static point dependent on nothing else
     """
-    # _impl: geos.Point = None
+    # just the coords; they're asked for far more often than the Shapely
+    # point, which is costly to read back from
+    __slots__ = ("_coords",)
 
     def __init__(self, uid: str, rank: int, initial_position: XY):
         self.set_coords(initial_position)
@@ -195,11 +214,15 @@ class Anchor(Point, ShapelyConcrete):
     def set_coords(self, coords: XY):
         """ Set's initial (t=0) position
         """
-        self._impl = geos.Point(coords)
+        x, y = coords
+        self._coords = (float(x), float(y))
 
     def get_coords(self, t: float) -> XY:
         """Anchors are invariant"""
-        return (self._impl.x, self._impl.y)
+        return self._coords
+
+    def get_impl(self, t: float) -> geos.base.BaseGeometry:
+        return geos.Point(self._coords)
 
 
 # Mixin must come first as it implements an abstract method Entity::get_bounds
@@ -207,6 +230,7 @@ class Anchor(Point, ShapelyConcrete):
 class Shape(ShapelyProxy, Entity):
     """ A 2D thing
     """
+    __slots__ = ("_default_child_velocity",)
 
     def __init__(self, uid: str, rank: int,
                  default_child_velocity: float = 0.0):
@@ -226,6 +250,13 @@ class Shape(ShapelyProxy, Entity):
         """
         return self.calc_position_xy(1.0, 0.0)
 
+    def collider(self, t: float, box: tuple):
+        """ Geometry which is the same as `get_impl(t)` within `box`
+        `(minx, miny, maxx, maxy)`, or None if there's nothing of this
+        shape there, i.e. all a collision test in `box` needs to look at
+        """
+        return self.get_impl(t)
+
     @property
     def default_child_velocity(self):
         return self._default_child_velocity
@@ -239,7 +270,8 @@ class Intersection(Point, ShapelyProxy):
     """ A point where two shapes cross
 
     Some shapes will have more than one intersection - we just
-    keep it simple and take the first in an /undefined/ (TODO) order
+    keep it simple and take the first along the first shape (see
+    `kernels`, which work out lines and circles without Shapely)
 
     If two shapes are wholly or partially congruent, shapely may produce
     a substring as one of the intersections. Let's consider this a
@@ -247,6 +279,7 @@ class Intersection(Point, ShapelyProxy):
 
     Where there is no intersection, return the first coord of first shape.
     """
+    __slots__ = ("_parents",)
     def __init__(self, uid: str, rank: int, parents: list[Shape]):
         if len(parents) != 2:
             raise ImpossibleGeometry(
@@ -261,14 +294,49 @@ class Intersection(Point, ShapelyProxy):
     def get_dependencies(self) -> list[Entity]:
         return self._parents
 
+    def crossings(self, t: float) -> list[XY]:
+        """ Every point where our shapes cross, in order along the first
+
+        Lines and circles are crossed exactly, but a circle's sliders
+        (and bumpers colliding with it) follow its polygon, which can be
+        up to `CIRCLE_SAG` of its radius inside. So a crossing can be
+        that far (or, crossing at a shallow angle, rather further) from
+        where a slider would cross, and one which just grazes the circle
+        may miss the polygon altogether.
+        """
+        a, b = self._parents
+        if type(a) is Line and type(b) is Line:
+            return kernels.segment_segment(*a.get_endpoints(t),
+                                           *b.get_endpoints(t))
+        if type(a) is Line and type(b) is Circle:
+            return kernels.segment_circle(*a.get_endpoints(t),
+                                          b._centre.get_coords(t), b._radius)
+        if type(a) is Circle and type(b) is Line:
+            return kernels.circle_segment(a._centre.get_coords(t), a._radius,
+                                          a._orientation,
+                                          *b.get_endpoints(t))
+        if type(a) is Circle and type(b) is Circle:
+            return kernels.circle_circle(a._centre.get_coords(t), a._radius,
+                                         a._orientation,
+                                         b._centre.get_coords(t), b._radius)
+        # anything else (e.g. polylines) is left to Shapely
+        impl_a, impl_b = a.get_impl(t), b.get_impl(t)
+        if not impl_a.crosses(impl_b):
+            return []
+        imp = impl_a.intersection(impl_b)
+        points = [p for p in getattr(imp, "geoms", [imp])
+                  if p.geom_type == "Point"]
+        points.sort(key=impl_a.project)
+        return [(p.x, p.y) for p in points]
+
     def get_coords(self, t: float) -> XY:
-        if self._parents[0].get_impl(t).crosses(self._parents[1].get_impl(t)):
-            imp = self._parents[0].get_impl(t).intersection(
-                self._parents[1].get_impl(t)
-            )
-            return (imp.x, imp.y)
-        else:
-            return self._parents[0].start.get_coords(t)
+        crossings = self.crossings(t)
+        if crossings:
+            return crossings[0]
+        first = self._parents[0]
+        if isinstance(first, Segmented):
+            return first.start.get_coords(t)
+        return first.calc_position_xy(t, 0.0)
 
     def get_impl(self, t: float) -> geos.base.BaseGeometry:
         return geos.Point(self.get_coords(t))
@@ -282,11 +350,12 @@ class Slider(Point, ShapelyProxy):
     Optionally, the slider can loop along the parent, wrapping off the
     end back to the beginning (or vice versa if vel is -ve).
     """
-
+    __slots__ = ("_parent", "_position", "_velocity", "inherit_velocity",
+                 "_loop", "_tempo")
 
     def __init__(self, uid: str, rank: int, parent: Shape, position: float,
                  velocity: float, loop: bool,
-                 inherit_velocity: bool):
+                 inherit_velocity: bool, tempo: Tempo = None):
         self._parent: Shape = parent
         """ what are we sliding along? """
         self.set_position(position)
@@ -296,6 +365,8 @@ class Slider(Point, ShapelyProxy):
         self.inherit_velocity: float = inherit_velocity
         """ use own velocity or vel defined by parent """
         self.set_loop(loop)
+        self.set_tempo(tempo)
+        """ how the velocity varies over time (if it does) """
         Point.__init__(self, uid, rank)
         ShapelyProxy.__init__(self)
 
@@ -329,28 +400,42 @@ class Slider(Point, ShapelyProxy):
     def set_loop(self, loop: bool):
         self._loop = loop
 
-    def get_coords(self, t: float) -> XY:
-        """ Calculate coordinates of current position at time t
-        using initial position and velocity. (Wraps)
+    @property
+    def tempo(self):
+        return self._tempo
+
+    def set_tempo(self, tempo: Tempo):
+        self._tempo = tempo
+
+    def turns(self, t: float) -> tuple[int, float]:
+        """ How many whole turns of the parent we've made by `t` (as if
+        looping), and how far through the current one we are
         """
-        # TODO accuracy implication from wrapping?
         v = self.effective_velocity
+        if self._tempo is None:
+            return turns(self._position, v, t)
+        f = self._position + v * self._tempo.integral(t)
+        return (floor(f), f % 1.0)
+
+    def fraction(self, t: float) -> float:
+        """ How far along our parent we are at `t` """
         if self._loop:
-            return self._parent.calc_position_xy(
-                t,
-                (self._position + v * t) % 1.0
-            )
-        else:
-            return self._parent.calc_position_xy(
-                t,
-                clamp(self._position + v * t)
-            )
+            return self.turns(t)[1]
+        if self._tempo is None:
+            return clamp(self._position + self.effective_velocity * t)
+        return clamp(self._position
+                     + self.effective_velocity * self._tempo.integral(t))
+
+    def get_coords(self, t: float) -> XY:
+        """ Calculate coordinates of current position at time t
+        using initial position and velocity. (Wraps, keeping precision
+        however long we've been going, see `clock.turns`)
+        """
+        return self._parent.calc_position_xy(t, self.fraction(t))
 
     def check_wraps(self, t: float, t_next: float):
-        v = self.effective_velocity
         if self._loop:
-            if not ((self._position + v * t) // 1
-                    == (self._position + v * t_next) // 1):
+            if not self.turns(t)[0] == self.turns(t_next)[0]:
                 return True
         return False
 
@@ -367,26 +452,61 @@ class Slider(Point, ShapelyProxy):
     def get_impl(self, t: float) -> geos.base.BaseGeometry:
         return geos.Point(self.get_coords(t))
 
-class Line(Shape):
-    """ A line *segment*
-    """
+class Segmented(Shape):
+    """ A shape made of straight segments between two end points
 
-    #_parents: tuple[Point, Point] = None
-    #_impl: geos.LineString = None
+    Most (e.g. the long hand-drawn staves of a graphical score) run
+    between anchors, so never change; their geometry is then built just
+    once (again if an anchor is moved), along with an index of their
+    segments so collisions only look at the few near a bumper.
+    """
+    __slots__ = ("_parents", "_static")
 
-    def __init__(self, uid:str, rank:int, endpoints: tuple[Point, Point],
+    def __init__(self, uid: str, rank: int, endpoints: tuple[Point, Point],
                  **kwargs):
         if endpoints[0] == endpoints[1]:
             raise ImpossibleGeometry("Line endpoints are the same point")
-        self._parents = endpoints
+        self._parents = tuple(endpoints)
+        self._static = (None, None, None)
+        """ `(endpoint coords, impl, SegmentIndex)` while static """
         super().__init__(uid, rank, **kwargs)
 
-    def get_impl(self, t: float):
-        """ Make a shapely Line
-            TODO - cache this!
+    @abstractmethod
+    def build_impl(self, t: float):
+        """ Make the shapely line at `t` """
+
+    def _get_static(self):
+        """ `(impl, SegmentIndex)` if we run between anchors, else None
         """
-        return geos.LineString((self._parents[0].get_coords(t),
-                                self._parents[1].get_coords(t)))
+        p0, p1 = self._parents
+        if type(p0) is not Anchor or type(p1) is not Anchor:
+            return None
+        key = (p0._coords, p1._coords)
+        if self._static[0] != key:
+            impl = self.build_impl(0.0)
+            self._static = (key, impl, SegmentIndex(impl.coords))
+        return self._static[1:]
+
+    def get_impl(self, t: float):
+        static = self._get_static()
+        if static is None:
+            return self.build_impl(t)
+        return static[0]
+
+    def collider(self, t: float, box: tuple):
+        static = self._get_static()
+        if static is None:
+            return self.get_impl(t)
+        impl, segments = static
+        runs = segments.runs(box)
+        if not runs:
+            return None
+        if len(runs) > 1:
+            return geos.MultiLineString(runs)
+        if len(runs[0]) == len(segments):
+            # (i.e. all of it, so no need to build it again)
+            return impl
+        return geos.LineString(runs[0])
 
     @property
     def start(self):
@@ -396,13 +516,35 @@ class Line(Shape):
     def get_dependencies(self) -> list['Entity']:
         return self._parents
 
+
+class Line(Segmented):
+    """ A line *segment*
+    """
+    __slots__ = ()
+
+    def get_endpoints(self, t: float) -> tuple[XY, XY]:
+        return (self._parents[0].get_coords(t),
+                self._parents[1].get_coords(t))
+
+    def build_impl(self, t: float):
+        """ Make a shapely Line
+        """
+        return geos.LineString((self._parents[0].get_coords(t),
+                                self._parents[1].get_coords(t)))
+
+    def get_bounds(self, t: float) -> tuple[XY, XY]:
+        """ (without building the Shapely line)
+        """
+        (x0, y0), (x1, y1) = (p.get_coords(t) for p in self._parents)
+        return ((min(x0, x1), min(y0, y1)), (max(x0, x1), max(y0, y1)))
+
     def get_repr(self, t: float):
         """ Returns a shape to be rendered by view
         """
         return self._parents[0].get_coords(t) + self._parents[1].get_coords(t)
 
 
-class PolyLine(Shape):
+class PolyLine(Segmented):
     """_parents: tuple[Point, Point]
     _impl: geos.LineString
 
@@ -421,15 +563,13 @@ class PolyLine(Shape):
     and with normalised endpoints (0 and 1 x) and then apply 
     a matrix for each impl request
     """
+    __slots__ = ("_midpoints", "_impl_seed")
 
     def __init__(self, uid: str, rank: int,
                  endpoints: tuple[Point, Point],
                  midpoints: list[XY],
                  **kwargs):
 
-        if endpoints[0] == endpoints[1]:
-            raise ImpossibleGeometry("Line endpoints are the same point")
-        self._parents = endpoints
         self._midpoints = midpoints
         self._impl_seed = geos.LineString(
             [[0.0, 0.0], ] +
@@ -439,15 +579,7 @@ class PolyLine(Shape):
         """ a 'seed' polystring that can be scaled, rotated and translated
         in order to give true polystring
         """
-        super().__init__(uid, rank, **kwargs)
-
-    @property
-    def start(self):
-        # optimised for lines
-        return self._parents[0]
-
-    def get_dependencies(self) -> list['Entity']:
-        return self._parents
+        super().__init__(uid, rank, endpoints, **kwargs)
 
     def get_repr(self, t: float):
         """ Returns a shape to be rendered by view
@@ -455,16 +587,17 @@ class PolyLine(Shape):
         # return self._parents[0].get_coords(t) + self._parents[1].get_coords(t)
         return self.get_impl(t).coords
 
-    def get_impl(self, t: float):
+    def build_impl(self, t: float):
         """ Return a shapely linestring by transforming the seed
-            Probably bit heavy to do a lot
-            TODO - cache this!
+            Probably bit heavy to do a lot (hence only done once for
+            static polylines)
         """
 
         p0 = self._parents[0].get_coords(t)
         p1 = self._parents[1].get_coords(t)
         a: float = XY_angle(p0, p1)
-        logging.debug(a)
+        if trace.enabled:
+            trace.record(trace.POLYLINE, trace.subject(self.uid))
         l: float = sqrt((p1[1]-p0[1]) ** 2 + (p1[0]-p0[0]) ** 2)
         # order is important!
         impl: geos.base.BaseGeometry = affinity.scale(self._impl_seed,
@@ -481,6 +614,8 @@ class Circle(Shape):
     The 'zero' point on a circle is 0 angle on a traditional graph, hence the
     east or rightmost point.
     """
+    __slots__ = ("_centre", "_radius", "_orientation")
+
     def __init__(self, uid: str, rank: int, centre: Point, radius: float,
                  orientation: float,
                  **kwargs):
@@ -515,6 +650,14 @@ class Circle(Shape):
         """
         return [self._centre, ]
 
+    def get_bounds(self, t: float) -> tuple[XY, XY]:
+        """ (without building the Shapely circle, whose segments all lie
+        within the true circle's bounds)
+        """
+        x, y = self._centre.get_coords(t)
+        r = self._radius
+        return ((x - r, y - r), (x + r, y + r))
+
     def get_repr(self, t: float):
         """ Returns a shape to be rendered by view
         """
@@ -525,6 +668,7 @@ class Roller(Circle):
     """ I can't remember how this works
     Always write your ideas down immediately and fully
     """
+    __slots__ = ()
     #_rolling_surface: Shape = None
     #_rolling_ang_vel: float = 0.0
 
@@ -534,16 +678,77 @@ class Roller(Circle):
         return self._parents[0].get_coords(t) + (self._radius, )
 
 
+class Group(Entity):
+    """ A named set of shapes which a bumper collides with as one, e.g.
+    all the strings of a harp, rather than needing a bumper per shape
+    """
+    __slots__ = ("_members", "_index")
+
+    def __init__(self, uid: str, rank: int, members: list[Shape]):
+        if not members:
+            raise ImpossibleGeometry("Groups must have members")
+        if not all(isinstance(m, Shape) for m in members):
+            raise ImpossibleGeometry("Groups can only have shapes as members")
+        self._members = tuple(members)
+        self._index = (None, None)
+        """ `(t, GridIndex)` of the members' bounds at `t` """
+        super().__init__(uid, rank)
+
+    @property
+    def members(self) -> tuple[Shape, ...]:
+        return self._members
+
+    def index(self, t: float) -> GridIndex:
+        """ Spatial index of the members at `t` (cached for one `t`)
+        """
+        index_t, index = self._index
+        if index_t != t:
+            index = GridIndex([m.get_bounds(t) for m in self._members])
+            self._index = (t, index)
+        return index
+
+    def get_dependencies(self) -> list[Entity]:
+        return self._members
+
+    def get_bounds(self, t: float) -> tuple[XY, XY]:
+        return self.index(t).bounds
+
+    def get_repr(self, t: float):
+        """ (the members are drawn themselves)
+        """
+        return [m.uid for m in self._members]
+
+
 class Measurement(Entity):
     """ A value computed from some property of other entites
     """
+    __slots__ = ()
+
     @abstractmethod
-    def get_value(self, t: float) -> float:
+    def get_value(self, t: float, points: dict = None) -> float:
         """ What is this measurement's concrete value at time t?
+
+        `points` (if given) holds the coords at `t` of points already
+        evaluated, by uid, and is added to, so measurements evaluated
+        together (e.g. in one frame) only evaluate each point once
         """
 
 
+def point_coords(p: Point, t: float, points: dict = None) -> XY:
+    """ `p.get_coords(t)`, memoised in `points` (see
+    `Measurement.get_value`)
+    """
+    if points is None:
+        return p.get_coords(t)
+    xy = points.get(p.uid)
+    if xy is None:
+        xy = points[p.uid] = p.get_coords(t)
+    return xy
+
+
 class Angle(Measurement):
+    __slots__ = ("_parents",)
+
     def __init__(self, guid: str, rank: int, parents: tuple[Line, Line]):
         if len(parents) != 2:
             raise ImpossibleGeometry("Angles can only be measured between"
@@ -556,19 +761,22 @@ class Angle(Measurement):
         """
         return self._parents
 
-    def get_value(self, t: float):
-        """ Shapely doesn't have an angle measuring method!
+    def get_value(self, t: float, points: dict = None):
+        """ Shapely doesn't have an angle measuring method! (Nor need
+        it: a line's angle is just that between its end points.)
         """
-        return (najorkle(self._parents[1].get_impl(t))
-                - najorkle(self._parents[0].get_impl(t))) % 1.0
+        a, b = self._parents
+        if not (isinstance(a, Segmented) and isinstance(b, Segmented)):
+            return (najorkle(b.get_impl(t)) - najorkle(a.get_impl(t))) % 1.0
+        return kernels.angle(*(point_coords(p, t, points)
+                               for p in (*a._parents, *b._parents)))
 
     def get_bounds(self, t: float) -> tuple[XY, XY]:
         """ A bounding box contains both lines
         """
-        ml = geos.MultiLineString([self._parents[0].get_impl(),
-                                   self._parents[1].get_impl()])
-        mx, my, Mx, My = ml.bounds
-        return ((mx, my), (Mx, My))
+        (mx0, my0), (Mx0, My0) = self._parents[0].get_bounds(t)
+        (mx1, my1), (Mx1, My1) = self._parents[1].get_bounds(t)
+        return ((min(mx0, mx1), min(my0, my1)), (max(Mx0, Mx1), max(My0, My1)))
 
     def get_repr(self, t: float):
         """ Returns a shape to be rendered by view
@@ -580,6 +788,7 @@ class Angle(Measurement):
 class Distance(Measurement):
     """_parents: tuple[Point, Point]
     """
+    __slots__ = ("_parents",)
 
     def __init__(self, guid: str, rank: int, parents: tuple[Point, Point]):
         if len(parents) != 2:
@@ -597,9 +806,9 @@ class Distance(Measurement):
         """
         return self._parents
 
-    def get_value(self, t: float):
-        return self._parents[0].get_impl(t).distance(
-            self._parents[1].get_impl(t))
+    def get_value(self, t: float, points: dict = None):
+        return kernels.distance(point_coords(self._parents[0], t, points),
+                                point_coords(self._parents[1], t, points))
 
     def get_bounds(self, t: float) -> tuple[XY, XY]:
         """ A bounding box contains both lines
@@ -622,16 +831,26 @@ class Distance(Measurement):
         #return self._parents[0].get_coords(t) + self._parents[1].get_coords(t)
 
 
-class Control(Entity):
+class MessageSource(Entity):
+    """ Anything which sends (templated) OSC messages, with values bound
+    from its input Measurements, i.e. Controls and Bumpers.
 
-    def __init__(self, uid: str, rank: int, x: float, y: float,
-                 path: str):
+    Holds no storage itself so that Bumper can also be a Slider;
+    subclasses provide `_x`, `_y`, `_msg` and `_inputs` slots.
+    """
+    __slots__ = ()
+
+    def _init_message(self, x: float, y: float, path: bytes):
         # x and y are purely presentational
         self._x = x
         self._y = y
         self._msg = TemplatedMessage(path, [], self._bindings)
         self._inputs = {}
-        super().__init__(uid, rank)
+
+    def set_coords(self, coords: XY):
+        """ Move the (purely presentational) position
+        """
+        self._x, self._y = coords
 
     def add_input(self, uid, measurement: Measurement):
         """ Register another Measurement entity as a value source
@@ -647,14 +866,26 @@ class Control(Entity):
         """
         del self._inputs[uid]
 
-    def _bindings(self, t: float):
+    def _bindings(self, t: float, points: dict = None):
         """ yields all inputs resolved @ `t` for use
-        by OSC message template
+        by OSC message template (sharing `points`, see
+        `Measurement.get_value`)
         """
         return {
-            k: v.get_value(t) for (k, v) in self._inputs.items()
+            k: v.get_value(t, points) for (k, v) in self._inputs.items()
         }
 
+
+class Control(MessageSource):
+    """ Sends its message every frame
+    """
+    __slots__ = ("_x", "_y", "_msg", "_inputs")
+
+    def __init__(self, uid: str, rank: int, x: float, y: float,
+                 path: str):
+        self._init_message(x, y, path)
+        super().__init__(uid, rank)
+
     def get_repr(self, t: float):
         """ Returns a shape to be rendered by view
         """
@@ -665,24 +896,27 @@ class Control(Entity):
                 (self._x+BOUND_TOLERANCE, self._y+BOUND_TOLERANCE))
 
 
-class Bumper(Slider, Control):
+class Bumper(Slider, MessageSource):
     """An OSC 'event' emitting slider
     """
+    __slots__ = ("_x", "_y", "_msg", "_inputs", "_collision_parent")
 
     def __init__(self, uid: str, rank: int, parent: Shape, position: float,
-                 velocity: float, collides_with: Shape, path: str,
-                 loop: bool, inherit_velocity: bool):
-        if parent == collides_with:
+                 velocity: float, collides_with: Shape | Group, path: str,
+                 loop: bool, inherit_velocity: bool, tempo: Tempo = None):
+        if parent == collides_with or parent in getattr(collides_with,
+                                                        "members", ()):
             raise ImpossibleGeometry("Bumper cannot collide with its own "
                                      "parent")
         self._collision_parent = collides_with
+        self._init_message(0.0, 0.0, path)
         Slider.__init__(self, uid, rank, parent, position, velocity, loop,
-                        inherit_velocity)
-        Control.__init__(self, uid, rank, 0.0, 0.0, path)
+                        inherit_velocity, tempo)
 
     def test_collision(self, t: float, t_next: float) -> bool:
-        """ Does this bumper collide with its collision parent
-        during the next time slice `t` -> `t_next`?
+        """ Does this bumper collide with its collision parent (or any
+        member of its collision `Group`) during the next time slice
+        `t` -> `t_next`?
 
         A collision is defined as passing from one side of a line to the other
         or moving from within a form to without
@@ -700,8 +934,25 @@ class Bumper(Slider, Control):
         see algo in docs/modelling/
 
         """
+        return self.test_trajectory(t, t_next, self.get_coords(t))
+
+    def test_trajectory(self, t: float, t_next: float, start: XY,
+                        end: XY = None) -> bool:
+        """ As `test_collision`, given where we are at `t` (and `t_next`,
+        if it's already been worked out, e.g. by a broad phase)
+        """
+        if type(self._collision_parent) is Group:
+            return bool(self.hits(t, t_next, start, end))
+        if end is None:
+            end = self.get_coords(t_next)
+        collider = self._collision_parent.collider(t, swept_bounds(start, end))
+        return (collider is not None
+                and self._collides(collider, t, t_next, start, end))
+
+    def _collides(self, collider, t: float, t_next: float, start: XY,
+                  end: XY = None) -> bool:
         # is point exactly on line?
-        if self._collision_parent.get_impl(t).contains(self.get_impl(t)):
+        if collider.contains(geos.Point(start)):
             return True
         if self.check_wraps(t, t_next):
             # wrapping is basically teleporting
@@ -709,12 +960,45 @@ class Bumper(Slider, Control):
             return False
         # does it cross next frame?
         # first calc trajectory of point
-        traj: geos.LineString = geos.LineString((self.get_coords(t),
-                                                 self.get_coords(t_next)))
-        if traj.crosses(self._collision_parent.get_impl(t)):
+        if end is None:
+            end = self.get_coords(t_next)
+        traj: geos.LineString = geos.LineString((start, end))
+        if traj.crosses(collider):
             return True
         return False
 
+    def hits(self, t: float, t_next: float, start: XY = None,
+             end: XY = None) -> list[int]:
+        """ Indices of the members of our collision group which we
+        collide with during `t` -> `t_next`
+        """
+        if start is None:
+            start = self.get_coords(t)
+        if end is None:
+            end = self.get_coords(t_next)
+        members = self._collision_parent.members
+        box = swept_bounds(start, end)
+        hits = []
+        for i in self._collision_parent.index(t).query(box):
+            collider = members[i].collider(t, box)
+            if (collider is not None
+                    and self._collides(collider, t, t_next, start, end)):
+                hits.append(i)
+        return hits
+
+    def hit_bindings(self, hit: int = 0) -> dict:
+        """ Message bindings for a collision with member `hit` of our
+        collision group (or with our collision parent): its id (as
+        `hit`) and index (as `hit_index`)
+        """
+        collider = self._collision_parent
+        if type(collider) is Group:
+            collider = collider.members[hit]
+        return {"hit": collider.uid.encode(), "hit_index": hit}
+
+    def _bindings(self, t: float, points: dict = None):
+        return dict(super()._bindings(t, points), **self.hit_bindings())
+
     def get_dependencies(self) -> list['Entity']:
         """ Returns list of other entities this one depends on
         """
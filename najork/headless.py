@@ -0,0 +1,123 @@
+""" Headless playback: load a scene and run the engine, nothing else.
+
+For playback nodes with no display. This module (and everything it
+imports) must never pull in GTK or Cairo, and leaves Shapely and
+py_expression_eval to be loaded lazily by the entities that need them,
+so that boot-to-first-event stays short when recovering a show.
+
+Usage:
+
+```
+    najork-headless scene.yml --start 30 --end 120
+```
+"""
+
+import time
+
+# as early as possible, so the startup measurement covers our imports
+_BOOT = time.monotonic()
+
+import argparse
+import copy
+import logging
+import signal
+import sys
+
+from . import trace
+from .loader import load_scene_file
+from .engine_sched import Engine, CV_FRAME_TIME
+from .config import DEFAULT_SETTINGS, positive_int
+
+STARTUP_BUDGET = 0.5  # secs, from import to engine running
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="najork-headless",
+        description="Play a scene out over OSC without a UI"
+    )
+    parser.add_argument("scene", help="Scene YAML (or JSON-lines) file")
+    parser.add_argument("--start", type=float, default=0.0,
+                        help="Start playing from this time in seconds")
+    parser.add_argument("--end", type=float, default=0.0,
+                        help="Stop at this time in seconds"
+                             " (default: run forever)")
+    parser.add_argument("--ip", default=DEFAULT_SETTINGS["osc"]["ip"],
+                        help="OSC destination address")
+    parser.add_argument("--port", type=int,
+                        default=DEFAULT_SETTINGS["osc"]["port"],
+                        help="OSC destination port")
+    parser.add_argument("-c", "--compiled", action="store_true",
+                        help="Run the scene compiled to arrays"
+                             " (needs numpy)")
+    parser.add_argument("-g", "--generated", action="store_true",
+                        help="Run the scene as a tick function generated"
+                             " for it")
+    parser.add_argument("-j", "--jobs", type=positive_int, default=1,
+                        help="Evaluate independent mechanisms across this"
+                             " many processes (default 1)")
+    parser.add_argument("--cache-cycle", action="store_true",
+                        help="If the scene is periodic, evaluate one cycle"
+                             " and replay it from then on")
+    parser.add_argument("--rearm-frames", type=int,
+                        default=DEFAULT_SETTINGS["collision"]["rearm_frames"],
+                        help="Frames a bumper must be clear of its collider"
+                             " before it can fire again (0: fire on every"
+                             " frame in contact)")
+    parser.add_argument("--trace", metavar="FILE",
+                        help="Trace the engine, dumping the latest events"
+                             " to FILE on SIGUSR1 and on exit")
+    parser.add_argument("-d", "--debug", action="store_true",
+                        help="Verbose output")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.DEBUG if args.debug else logging.INFO)
+
+    settings = copy.deepcopy(DEFAULT_SETTINGS)
+    settings["osc"]["ip"] = args.ip
+    settings["osc"]["port"] = args.port
+    settings["collision"]["rearm_frames"] = args.rearm_frames
+
+    if args.trace:
+        _trace_to(args.trace)
+
+    scene = load_scene_file(args.scene)
+    engine = Engine(scene, settings, end_time=args.end,
+                    compiled=args.compiled, jobs=args.jobs,
+                    cache_cycle=args.cache_cycle, generated=args.generated)
+    engine.pos = args.start
+    engine.start()
+
+    startup = time.monotonic() - _BOOT
+    logging.info("Engine running %.3fs after boot", startup)
+    if startup > STARTUP_BUDGET:
+        logging.warning("Startup took longer than budget of %.3fs",
+                        STARTUP_BUDGET)
+
+    try:
+        while engine.running:
+            time.sleep(CV_FRAME_TIME)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        engine.shutdown()
+        if args.trace:
+            trace.disable()
+            _dump_trace(args.trace)
+    return 0
+
+
+def _dump_trace(path: str):
+    with open(path, "w") as out:
+        trace.dump(out)
+
+
+def _trace_to(path: str):
+    """ Start tracing, dumping to `path` whenever we're sent SIGUSR1 """
+    trace.enable()
+    if hasattr(signal, "SIGUSR1"):
+        signal.signal(signal.SIGUSR1, lambda *_: _dump_trace(path))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,266 @@
+""" Incremental, journaled scene saving
+
+Re-serialising a whole (large) scene on every edit would stall the UI,
+so instead a `Journal` keeps two files:
+
+  - `scene.jsonl` a full snapshot, in the JSON-lines scene format, whose
+                  first line records the last edit it includes
+  - `scene.jsonl.journal` every edit since, one JSON object per line
+
+Each edit (create, move, set velocity, delete) is applied to the scene
+and appended to the journal, which costs O(edit) rather than O(scene).
+Every so often the snapshot is rewritten (compacted) in the background:
+the journal is set aside (as `scene.jsonl.journal.old`) for a fresh
+one, and the new snapshot built from the old one plus the journal set
+aside, never touching the scene being edited. Recovering after a crash
+is loading the snapshot and replaying both journals on top.
+
+```
+    from najork.journal import Journal
+
+    j = Journal(scene, "scene.jsonl")
+    j.save_snapshot()
+    j.move("p0", (100, 200))
+    ...
+    # and after a crash
+    j = Journal.recover("scene.jsonl")
+```
+"""
+
+import json
+import logging
+import os
+import tempfile
+import threading
+
+from .loader import iter_jsonl_definitions
+from .scene import Scene, InputError
+
+SNAPSHOT_VERSION = 1
+
+COMPACT_EVERY = 1000
+""" Edits in the journal that trigger a background compaction """
+
+def apply_op(scene: Scene, op: dict):
+    """ Apply one journalled edit to `scene`. The same code path is used
+    live and when replaying, so recovery can't drift from what happened
+    """
+    kind = op["op"]
+    if kind == "create":
+        scene.load_stream([(None, op["definition"])])
+    elif kind == "move":
+        entity = scene.get_by_id(op["id"])
+        if entity.classname not in ("anchor", "control"):
+            raise InputError("Can't move a {}".format(entity.classname))
+        entity.set_coords(tuple(op["coords"]))
+        scene.edited()
+    elif kind == "set_velocity":
+        entity = scene.get_by_id(op["id"])
+        if not hasattr(entity, "set_velocity"):
+            raise InputError("A {} has no velocity".format(entity.classname))
+        entity.set_velocity(op["velocity"])
+        scene.edited()
+    elif kind == "delete":
+        scene.remove(op["id"])
+    else:
+        raise InputError("Unknown journal op {}".format(kind))
+
+
+def _read_journal(path: str):
+    """ Yield the ops in a journal file, stopping at a torn (partially
+    written) last line
+    """
+    try:
+        with open(path) as inp:
+            for line in inp:
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    logging.warning("Ignoring torn journal entry in %s", path)
+                    return
+    except FileNotFoundError:
+        return
+
+
+def _replay(path: str, journals: list[str]) -> tuple[Scene, int]:
+    """ The scene in snapshot `path` with the edits in `journals` (in
+    order) it doesn't already have replayed on top, and the sequence
+    number of the last edit. No snapshot counts as an empty scene
+    """
+    seq = 0
+    scene = Scene()
+    try:
+        with open(path) as inp:
+            first = inp.readline()
+            if first.strip():
+                seq = json.loads(first).get("najork", {}).get("seq", 0)
+            # (the header line is skipped as metadata)
+            inp.seek(0)
+            scene.load_stream(iter_jsonl_definitions(inp))
+    except FileNotFoundError:
+        pass
+
+    for journal in journals:
+        for op in _read_journal(journal):
+            if op["seq"] <= seq:
+                continue
+            apply_op(scene, op)
+            seq = op["seq"]
+    return scene, seq
+
+
+class Journal:
+    """ Journaled saving of `scene` to `path` (plus `path` + `.journal`).
+    All edits to the scene must go through the journal, and a new
+    journal should begin with `save_snapshot` (if there's no snapshot at
+    `path` yet, one of the scene as it is is written straight away, so
+    compaction always has one to build on)
+    """
+
+    def __init__(self, scene: Scene, path: str, seq: int = 0,
+                 compact_every: int = COMPACT_EVERY, durable: bool = False):
+        self._scene = scene
+        self._path = path
+        self._journal_path = path + ".journal"
+        self._old_path = self._journal_path + ".old"
+        """ the journal set aside while compacting """
+        self._seq = seq
+        """ sequence number of the last edit """
+        self._pending = 0
+        """ edits in the journal since the last compaction began """
+        self.compact_every = compact_every
+        self.durable = durable
+        """ fsync after every edit, not just flush """
+        self._lock = threading.Lock()
+        self._compactor: threading.Thread = None
+        if not os.path.exists(path):
+            self._write_snapshot(seq, scene.iter_definitions())
+        self._out = open(self._journal_path, "a")
+
+    @property
+    def scene(self) -> Scene:
+        return self._scene
+
+    def close(self):
+        self.wait()
+        with self._lock:
+            self._out.close()
+
+    def wait(self):
+        """ Wait for any background compaction to finish
+        """
+        if self._compactor is not None:
+            self._compactor.join()
+
+    def _record(self, op: dict):
+        with self._lock:
+            apply_op(self._scene, op)
+            self._seq += 1
+            op["seq"] = self._seq
+            self._out.write(json.dumps(op) + "\n")
+            self._out.flush()
+            if self.durable:
+                os.fsync(self._out.fileno())
+            self._pending += 1
+        if self._pending >= self.compact_every:
+            self.compact()
+
+    def create(self, definition: dict):
+        """ Create an entity from a definition as in a scene file
+        """
+        self._record({"op": "create", "definition": definition})
+        return self._scene.get_by_id(definition["id"])
+
+    def move(self, uid: str, coords: tuple[float, float]):
+        self._record({"op": "move", "id": uid, "coords": list(coords)})
+
+    def set_velocity(self, uid: str, velocity: float):
+        self._record({"op": "set_velocity", "id": uid, "velocity": velocity})
+
+    def delete(self, uid: str):
+        self._record({"op": "delete", "id": uid})
+
+    def save_snapshot(self):
+        """ Write a full snapshot now (O(scene)), emptying the journal
+        """
+        self.wait()
+        with self._lock:
+            seq = self._seq
+            defs = list(self._scene.iter_definitions())
+            self._write_snapshot(seq, defs)
+            self._out.close()
+            self._out = open(self._journal_path, "w")
+            if os.path.exists(self._old_path):
+                os.unlink(self._old_path)
+            self._pending = 0
+
+    def compact(self):
+        """ Rewrite the snapshot on a background thread. Edits carry on
+        being journalled meanwhile; the journal is only trimmed of
+        what the new snapshot includes once it's safely written
+        """
+        if self._compactor is not None and self._compactor.is_alive():
+            return
+        self._pending = 0
+        self._compactor = threading.Thread(target=self._compact,
+                                           daemon=True)
+        self._compactor.start()
+
+    def _compact(self):
+        with self._lock:
+            # edits wait just for the journal to be swapped for a new one
+            seq = self._seq
+            self._out.close()
+            self._set_aside()
+            self._out = open(self._journal_path, "w")
+        # the old snapshot plus what was set aside is the scene as of
+        # `seq`, rebuilt (and written) without holding up any edits
+        scene, _ = _replay(self._path, [self._old_path])
+        self._write_snapshot(seq, scene.iter_definitions())
+        # a crash before here just means replaying some edits the
+        # snapshot already has, which recovery skips by `seq`
+        os.unlink(self._old_path)
+
+    def _set_aside(self):
+        """ Move the journal to `_old_path` (after anything left there
+        by a compaction which didn't finish)
+        """
+        if not os.path.exists(self._old_path):
+            os.replace(self._journal_path, self._old_path)
+            return
+        with open(self._old_path, "a") as out:
+            for op in _read_journal(self._journal_path):
+                out.write(json.dumps(op) + "\n")
+            out.flush()
+            os.fsync(out.fileno())
+
+    def _write_snapshot(self, seq: int, defs):
+        header = {"najork": {"snapshot": SNAPSHOT_VERSION, "seq": seq}}
+        self._write_atomic(
+            self._path,
+            [json.dumps(header)] + [json.dumps(d) for d in defs]
+        )
+
+    @staticmethod
+    def _write_atomic(path: str, lines):
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path) or ".")
+        try:
+            with os.fdopen(fd, "w") as out:
+                for line in lines:
+                    out.write(line + "\n")
+                out.flush()
+                os.fsync(out.fileno())
+            os.replace(tmp, path)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+
+    @classmethod
+    def recover(cls, path: str, **kwargs) -> 'Journal':
+        """ Load the snapshot at `path` and replay its journal, returning
+        a `Journal` ready to carry on editing the recovered scene
+        """
+        journal = path + ".journal"
+        scene, seq = _replay(path, [journal + ".old", journal])
+        return cls(scene, path, seq=seq, **kwargs)
+
@@ -0,0 +1,107 @@
+""" Closed-form geometry of the common shapes
+
+`Intersection` used to build Shapely geometry for both its parents, and
+more again to find where they cross, on every evaluation. Lines and
+circles needn't be approximated at all, so these work straight off
+their coordinates (and radii).
+
+(Sliders on circles still follow Shapely's polygon, though, which these
+can differ from slightly: see `Intersection.crossings`.)
+
+The intersections return the points where two shapes properly cross
+(merely touching doesn't count, as for Shapely's `crosses`), ordered
+along the first: from its start for a segment, or clockwise from its
+'zero' for a circle, like a slider's position.
+
+Likewise the measurements (`distance` and `angle`) only need their
+parents' coordinates, not Shapely points and lines built from them.
+"""
+
+from math import atan2, hypot, sqrt, pi as PI
+
+XY = tuple[float, float]
+
+TWO_PI = 2 * PI
+
+
+def side(a: XY, b: XY, c: XY) -> float:
+    """ Which side of `a` -> `b` is `c` on? (positive for anticlockwise)
+    """
+    return (b[0] - a[0]) * (c[1] - a[1]) - (b[1] - a[1]) * (c[0] - a[0])
+
+
+def circle_position(centre: XY, orientation: float, p: XY) -> float:
+    """ The position (0-1) of `p` on a circle about `centre`, as for a
+    slider on it: clockwise (as Shapely's rings go) from east, offset by
+    the circle's `orientation`
+    """
+    angle = atan2(p[1] - centre[1], p[0] - centre[0])
+    return (-angle / TWO_PI - orientation) % 1.0
+
+
+def segment_segment(a: XY, b: XY, c: XY, d: XY) -> list[XY]:
+    """ Where segment `a` -> `b` crosses `c` -> `d` (if it does) """
+    o1, o2 = side(a, b, c), side(a, b, d)
+    o3, o4 = side(c, d, a), side(c, d, b)
+    if o1 * o2 < 0.0 and o3 * o4 < 0.0:
+        s = o3 / (o3 - o4)
+        return [(a[0] + s * (b[0] - a[0]), a[1] + s * (b[1] - a[1]))]
+    return []
+
+
+def segment_circle(a: XY, b: XY, centre: XY, radius: float) -> list[XY]:
+    """ Where segment `a` -> `b` crosses the circle of `radius` about
+    `centre`, ordered from `a`
+    """
+    dx, dy = b[0] - a[0], b[1] - a[1]
+    fx, fy = a[0] - centre[0], a[1] - centre[1]
+    # |a + u (b - a) - centre| = radius
+    qa = dx * dx + dy * dy
+    qb = dx * fx + dy * fy
+    qc = fx * fx + fy * fy - radius * radius
+    disc = qb * qb - qa * qc
+    if qa == 0.0 or disc <= 0.0:
+        # (a tangent only touches)
+        return []
+    root = sqrt(disc)
+    return [(a[0] + u * dx, a[1] + u * dy)
+            for u in ((-qb - root) / qa, (-qb + root) / qa)
+            if 0.0 < u < 1.0]
+
+
+def circle_segment(centre: XY, radius: float, orientation: float,
+                   a: XY, b: XY) -> list[XY]:
+    """ As `segment_circle`, but ordered around the circle """
+    return sorted(segment_circle(a, b, centre, radius),
+                  key=lambda p: circle_position(centre, orientation, p))
+
+
+def circle_circle(c1: XY, r1: float, orientation: float,
+                  c2: XY, r2: float) -> list[XY]:
+    """ Where the circle of radius `r1` about `c1` crosses that of `r2`
+    about `c2`, ordered around the first
+    """
+    dx, dy = c2[0] - c1[0], c2[1] - c1[1]
+    d = sqrt(dx * dx + dy * dy)
+    if not abs(r1 - r2) < d < r1 + r2:
+        # apart, inside one another, concentric, or just touching
+        return []
+    along = (d * d + r1 * r1 - r2 * r2) / (2 * d)
+    across = sqrt(max(r1 * r1 - along * along, 0.0))
+    mx, my = c1[0] + along * dx / d, c1[1] + along * dy / d
+    ox, oy = -dy * across / d, dx * across / d
+    return sorted([(mx + ox, my + oy), (mx - ox, my - oy)],
+                  key=lambda p: circle_position(c1, orientation, p))
+
+
+def distance(a: XY, b: XY) -> float:
+    """ How far apart `a` and `b` are """
+    return hypot(b[0] - a[0], b[1] - a[1])
+
+
+def angle(a0: XY, a1: XY, b0: XY, b1: XY) -> float:
+    """ The angle (in revolutions, 0-1) from line `a0` -> `a1` round to
+    `b0` -> `b1`
+    """
+    return (atan2(b1[1] - b0[1], b1[0] - b0[0]) / TWO_PI
+            - atan2(a1[1] - a0[1], a1[0] - a0[0]) / TWO_PI) % 1.0
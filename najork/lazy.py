@@ -0,0 +1,44 @@
+""" Deferred imports for heavy dependencies
+
+Shapely (and through it GEOS), py_expression_eval and friends take a
+noticeable chunk of a Raspberry Pi's boot time, and not every entry
+point needs them straight away. Modules imported with `lazy_import` are
+only actually executed the first time one of their attributes is used.
+"""
+
+import importlib.util
+import sys
+
+
+def lazy_import(name: str):
+    """ Return module `name`, executing it on first attribute access
+
+    (Parent packages of dotted names are imported eagerly, which is
+    harmless for our dependencies since their `__init__`s are tiny.)
+    """
+    if name in sys.modules:
+        return sys.modules[name]
+    spec = importlib.util.find_spec(name)
+    if spec is None:
+        raise ModuleNotFoundError("No module named {}".format(name),
+                                  name=name)
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    loader.exec_module(module)
+    # as a regular import would, so `import pkg.mod; pkg.mod.x` works
+    parent, _, child = name.rpartition(".")
+    if parent:
+        setattr(sys.modules[parent], child, module)
+    return module
+
+
+def is_loaded(name: str) -> bool:
+    """ Has module `name` actually been executed (rather than just
+    registered by `lazy_import`)?
+    """
+    module = sys.modules.get(name)
+    if module is None:
+        return False
+    return not isinstance(module, importlib.util._LazyModule)
@@ -0,0 +1,297 @@
+""" Reading scene files
+
+YAML is parsed with libyaml's `CSafeLoader` when PyYAML was built with
+it (falling back to the pure python `SafeLoader`), and the resulting
+scene's validated definitions are written, in rank order, to an on-disk
+cache of JSON-lines files keyed by a hash of the file content (and of
+the source of the modules which read and write definitions, so
+upgrading najork orphans old entries). Reopening an unchanged score
+then skips the YAML entirely, each entity being built straight from its
+cached definition. Only plain data is ever read back from the cache,
+never code.
+
+```
+    from najork.loader import load_scene_file
+
+    s = load_scene_file("scene.yml")
+```
+
+Very large (generated) scenes can instead be streamed with
+`stream_scene_file`, which walks the YAML event stream and instantiates
+entities as it goes without ever holding the whole document. The same
+goes for the JSON-lines scene format, one entity definition per line
+(with an optional `rank`):
+
+```
+    {"entity": "anchor", "id": "p0", "coords": [100, 100]}
+    {"entity": "circle", "id": "c1", "centre": "p0", "radius": 50, "orientation": 0}
+```
+"""
+
+import functools
+import hashlib
+import json
+import logging
+import os
+import tempfile
+
+import yaml
+
+from .scene import Scene, InputError
+
+try:
+    from yaml import CSafeLoader as SafeLoader
+except ImportError:
+    from yaml import SafeLoader
+
+CACHED_MODULES = ("entities", "scene", "osc", "tempo", "loader")
+""" the modules defining how the definitions in the cache are read and
+written """
+
+
+def default_cache_dir() -> str:
+    """ `$NAJORK_CACHE_DIR`, else `$XDG_CACHE_HOME/najork`
+    """
+    if "NAJORK_CACHE_DIR" in os.environ:
+        return os.environ["NAJORK_CACHE_DIR"]
+    base = os.environ.get("XDG_CACHE_HOME",
+                          os.path.join(os.path.expanduser("~"), ".cache"))
+    return os.path.join(base, "najork")
+
+
+def parse_yaml(content) -> dict:
+    """ Parse a scene definition (str or bytes) into a dict
+    """
+    return yaml.load(content, Loader=SafeLoader)
+
+
+@functools.lru_cache(maxsize=None)
+def _source_hash() -> bytes:
+    """ Hash of the source of `CACHED_MODULES` """
+    h = hashlib.sha256()
+    here = os.path.dirname(os.path.abspath(__file__))
+    for name in CACHED_MODULES:
+        with open(os.path.join(here, name + ".py"), "rb") as inp:
+            h.update(inp.read())
+    return h.digest()
+
+
+def cache_key(content: bytes) -> str:
+    h = hashlib.sha256()
+    h.update(b"najork-scene\0")
+    h.update(_source_hash())
+    h.update(content)
+    return h.hexdigest()
+
+
+def _read_cache(path: str):
+    try:
+        with open(path, "rb") as inp:
+            scene = Scene()
+            scene.load_stream(iter_jsonl_definitions(inp))
+            return scene
+    except FileNotFoundError:
+        return None
+    except Exception:
+        # stale or corrupt, we'll just overwrite it
+        logging.warning("Ignoring unreadable scene cache %s", path)
+        return None
+
+
+def _write_cache(path: str, scene: Scene):
+    tmp = None
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # write then rename so a reader never sees half a file
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path))
+        with os.fdopen(fd, "w") as out:
+            for d in scene.iter_definitions():
+                out.write(json.dumps(d) + "\n")
+        os.replace(tmp, path)
+    except Exception:
+        # caching is only ever an optimisation
+        logging.warning("Could not write scene cache %s", path)
+        if tmp is not None and os.path.exists(tmp):
+            os.unlink(tmp)
+
+
+def load_scene(content, cache_dir: str = "") -> Scene:
+    """ Build a `Scene` from YAML `content` (str or bytes), via the
+    compiled scene cache in `cache_dir` (default `default_cache_dir()`,
+    `None` to disable caching)
+    """
+    if cache_dir is None:
+        scene = Scene()
+        scene.load_from_dict(parse_yaml(content))
+        return scene
+
+    if isinstance(content, str):
+        content = content.encode()
+    path = os.path.join(cache_dir or default_cache_dir(),
+                        cache_key(content) + ".jsonl")
+
+    scene = _read_cache(path)
+    if scene is not None:
+        logging.debug("Loaded scene from cache %s", path)
+        return scene
+
+    scene = Scene()
+    scene.load_from_dict(parse_yaml(content))
+    _write_cache(path, scene)
+    return scene
+
+
+def load_scene_file(filename: str, cache_dir: str = "") -> Scene:
+    """ As `load_scene`, reading from `filename`. JSON-lines scenes
+    are always streamed (see `stream_scene_file`), uncached
+    """
+    if filename.endswith(".jsonl"):
+        return stream_scene_file(filename)
+    with open(filename, "rb") as inp:
+        return load_scene(inp.read(), cache_dir)
+
+
+def read_scene_def(filename: str) -> dict:
+    """ Parse a YAML or JSON-lines scene file into a scene dict, as
+    taken by `Scene.load_from_dict`
+    """
+    with open(filename, "rb") as inp:
+        if filename.endswith(".jsonl"):
+            return {"entities": [e for _, e in iter_jsonl_definitions(inp)]}
+        return parse_yaml(inp.read())
+
+
+def _compose(loader, anchors: dict) -> yaml.Node:
+    """ Compose the node starting at the loader's next event, consuming
+    only the events of that node
+    """
+    ev = loader.get_event()
+    if isinstance(ev, yaml.AliasEvent):
+        return anchors[ev.anchor]
+    if isinstance(ev, yaml.ScalarEvent):
+        tag = ev.tag
+        if tag is None or tag == "!":
+            tag = loader.resolve(yaml.ScalarNode, ev.value, ev.implicit)
+        node = yaml.ScalarNode(tag, ev.value, ev.start_mark, ev.end_mark,
+                               style=ev.style)
+    elif isinstance(ev, yaml.SequenceStartEvent):
+        tag = ev.tag
+        if tag is None or tag == "!":
+            tag = loader.resolve(yaml.SequenceNode, None, ev.implicit)
+        node = yaml.SequenceNode(tag, [], ev.start_mark, None,
+                                 flow_style=ev.flow_style)
+        while not loader.check_event(yaml.SequenceEndEvent):
+            node.value.append(_compose(loader, anchors))
+        node.end_mark = loader.get_event().end_mark
+    elif isinstance(ev, yaml.MappingStartEvent):
+        tag = ev.tag
+        if tag is None or tag == "!":
+            tag = loader.resolve(yaml.MappingNode, None, ev.implicit)
+        node = yaml.MappingNode(tag, [], ev.start_mark, None,
+                                flow_style=ev.flow_style)
+        while not loader.check_event(yaml.MappingEndEvent):
+            key = _compose(loader, anchors)
+            node.value.append((key, _compose(loader, anchors)))
+        node.end_mark = loader.get_event().end_mark
+    else:
+        raise InputError("Unexpected YAML {}".format(type(ev).__name__))
+    if ev.anchor is not None:
+        anchors[ev.anchor] = node
+    return node
+
+
+def _value(loader, anchors: dict):
+    return loader.construct_document(_compose(loader, anchors))
+
+
+def _expect(loader, event_class):
+    if not loader.check_event(event_class):
+        raise InputError("Malformed scene, expected YAML {}".format(
+            event_class.__name__
+        ))
+    return loader.get_event()
+
+
+def _iter_children(loader, anchors: dict, rank):
+    _expect(loader, yaml.SequenceStartEvent)
+    while not loader.check_event(yaml.SequenceEndEvent):
+        yield rank, _value(loader, anchors)
+    loader.get_event()
+
+
+def _iter_layers(loader, anchors: dict):
+    _expect(loader, yaml.SequenceStartEvent)
+    while not loader.check_event(yaml.SequenceEndEvent):
+        _expect(loader, yaml.MappingStartEvent)
+        rank = None
+        early = []
+        """ children listed before their layer's rank """
+        while not loader.check_event(yaml.MappingEndEvent):
+            key = _value(loader, anchors)
+            if key == "rank":
+                rank = _value(loader, anchors)
+            elif key == "children" and rank is None:
+                early.extend(e for _, e in
+                             _iter_children(loader, anchors, None))
+            elif key == "children":
+                yield from _iter_children(loader, anchors, rank)
+            else:
+                _compose(loader, anchors)
+        loader.get_event()
+        for e in early:
+            yield rank, e
+    loader.get_event()
+
+
+def iter_yaml_definitions(stream):
+    """ Yield `(rank, definition)` for each entity in a YAML scene by
+    walking its event stream, so only one entity's worth of the
+    document is ever in memory
+    """
+    loader = SafeLoader(stream)
+    anchors = {}
+    try:
+        _expect(loader, yaml.StreamStartEvent)
+        if loader.check_event(yaml.StreamEndEvent):
+            return
+        _expect(loader, yaml.DocumentStartEvent)
+        _expect(loader, yaml.MappingStartEvent)
+        while not loader.check_event(yaml.MappingEndEvent):
+            key = _value(loader, anchors)
+            if key == "layers":
+                yield from _iter_layers(loader, anchors)
+            elif key == "entities":
+                yield from _iter_children(loader, anchors, None)
+            else:
+                _compose(loader, anchors)
+    finally:
+        loader.dispose()
+
+
+def iter_jsonl_definitions(lines):
+    """ Yield `(None, definition)` for each entity in a JSON-lines
+    scene (a definition's own `rank`, if any, takes precedence).
+    Metadata lines, objects with a `najork` key, are skipped
+    """
+    for n, line in enumerate(lines, 1):
+        if not line.strip():
+            continue
+        try:
+            e = json.loads(line)
+        except ValueError as ex:
+            raise InputError("Line {}: {}".format(n, ex))
+        if "najork" not in e:
+            yield None, e
+
+
+def stream_scene_file(filename: str) -> Scene:
+    """ Build a `Scene` from a YAML (or, if it ends `.jsonl`, JSON-lines)
+    scene file, streaming it rather than parsing it whole first
+    """
+    scene = Scene()
+    with open(filename, "rb") as inp:
+        if filename.endswith(".jsonl"):
+            scene.load_stream(iter_jsonl_definitions(inp))
+        else:
+            scene.load_stream(iter_yaml_definitions(inp))
+    return scene
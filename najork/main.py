@@ -23,11 +23,11 @@ import gi
 gi.require_version('Gtk', '4.0')
 from gi.repository import Gtk, Gio, GLib
 
-import yaml
-
 from .window import NajorkWindow
 from .scene import Scene
 from .engine_sched import Engine
+from .engine_proc import EngineProcess
+from .loader import load_scene
 
 from najork.config import DEFAULT_SETTINGS
 
@@ -42,7 +42,11 @@ class Application(Gtk.Application):
         self.connect("shutdown", self.on_quit)
         self.connect("open", self.app_open)
         self.scene = Scene()
-        self.engine = Engine(self.scene, DEFAULT_SETTINGS)
+        engine = (EngineProcess if has_option("-p", "--process")
+                  else Engine)
+        self.engine = engine(self.scene, DEFAULT_SETTINGS,
+                             compiled=has_option("-c", "--compiled"),
+                             generated=has_option("-g", "--generated"))
         self.window = None
         self.add_main_option(
             "debug",
@@ -60,6 +64,30 @@ class Application(Gtk.Application):
             "Start engine immediately",
             None,
         )
+        self.add_main_option(
+            "compiled",
+            ord("c"),
+            GLib.OptionFlags.NONE,
+            GLib.OptionArg.NONE,
+            "Run the scene compiled to arrays (needs numpy)",
+            None,
+        )
+        self.add_main_option(
+            "generated",
+            ord("g"),
+            GLib.OptionFlags.NONE,
+            GLib.OptionArg.NONE,
+            "Run the scene as a tick function generated for it",
+            None,
+        )
+        self.add_main_option(
+            "process",
+            ord("p"),
+            GLib.OptionFlags.NONE,
+            GLib.OptionArg.NONE,
+            "Run the engine in its own process, apart from the UI",
+            None,
+        )
 
 
         # self.add_main_option("lint", "l", str, "Lint input file, then exit", None)
@@ -100,16 +128,24 @@ class Application(Gtk.Application):
         self.start_session(content)
 
     def start_session(self, content: str):
-        self.engine.pause()
-        self.engine.shutdown()
-        scene_def: dict = yaml.load(content, Loader=yaml.Loader)
-        self.scene = Scene()
-        self.scene.load_from_dict(scene_def)
-        self.engine = Engine(self.scene, DEFAULT_SETTINGS)
-        self.window.engine = self.engine
-        if has_option("-s", "--start"):
-            logging.debug("starting")
-            self.engine.start()
+        """ Build the new scene in the background and hot-swap it into
+        the running engine, so (re)loading never interrupts playback
+        """
+        def build():
+            return load_scene(content)
+
+        def adopt(scene):
+            self.scene = scene
+            if has_option("-s", "--start"):
+                logging.debug("starting")
+                self.engine.start()
+            return GLib.SOURCE_REMOVE
+
+        def ready(scene):
+            # (called on the loader thread, so hand over to the main loop)
+            GLib.idle_add(adopt, scene)
+
+        self.engine.load_scene_async(build, ready)
 
 def has_option(*options):
     return any(o in sys.argv for o in options)
@@ -0,0 +1,325 @@
+""" Offline (headless) rendering of a scene to a file.
+
+Since the whole model is closed form in `t` we don't need to wait for
+the wall clock - we can just step through frames as fast as the CPU
+allows and write every event out with its timestamp.
+
+Supported outputs:
+
+  - `jsonl` one JSON object per event
+  - `osc`   a stream of size-prefixed OSC bundles (one per frame) as
+            per the OSC 1.0 stream framing
+  - `midi`  a standard MIDI file, one track per OSC path
+
+Usage:
+
+```
+    python -m najork.offline scene.yml -o out.jsonl --start 0 --end 60
+```
+
+Long scores can be spread across `N` cores with `--jobs N`.
+"""
+
+import argparse
+import json
+import logging
+import struct
+import sys
+import time
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+from .scene import Scene
+from .loader import read_scene_def
+from .clock import after
+from .engine_sched import frame_events, CV_FRAME_TIME
+from .collision import CollisionState, DEFAULT_REARM_FRAMES
+from .config import positive_int
+
+Event = namedtuple("Event", ("t", "uid", "path", "data"))
+
+FORMATS = ("jsonl", "osc", "midi")
+
+# MIDI export defaults
+MIDI_TICKS_PER_BEAT = 480
+MIDI_TEMPO = 500000  # us per beat, i.e. 120bpm
+MIDI_DEFAULT_VELOCITY = 100
+
+# frames per unit of work when evaluating in parallel
+SHARD_FRAMES = 24 * 60
+
+
+def frame_count(start: float, end: float) -> int:
+    """ How many frames `n` satisfy `start` < start + n * frame <= `end`?
+    """
+    n = max(int((end - start) / CV_FRAME_TIME), 0)
+    while n > 0 and after(start, n) > end:
+        n -= 1
+    while after(start, n + 1) <= end:
+        n += 1
+    return n
+
+
+def evaluate_frames(scene: Scene, start: float, first: int, last: int,
+                    rearm_frames: int = DEFAULT_REARM_FRAMES):
+    """ Yield every `Event` for frames `first` to `last` inclusive,
+    where frame `n` is at `start` + n * frame time (see `clock.after`)
+    """
+    def events(t):
+        return frame_events(scene, t, after(t))
+
+    collisions = CollisionState.for_scene(scene, rearm_frames,
+                                          CV_FRAME_TIME)
+    for n in range(first, last + 1):
+        t = after(start, n)
+        for uid, path, data in collisions.filter(t, events(t), events):
+            yield Event(t, uid, path, data)
+
+
+def evaluate(scene: Scene, start: float, end: float,
+             rearm_frames: int = DEFAULT_REARM_FRAMES):
+    """ Yield every `Event` the scene emits for frames in
+    `start` < t <= `end`, exactly as the realtime engine would
+    had it been started at `start`
+    """
+    return evaluate_frames(scene, start, 1, frame_count(start, end),
+                           rearm_frames)
+
+
+_worker_scene: Scene = None
+
+
+def _init_worker(scene_def: dict):
+    """ Each worker process builds its own copy of the scene, once
+    """
+    global _worker_scene
+    _worker_scene = Scene()
+    _worker_scene.load_from_dict(scene_def)
+
+
+def _evaluate_shard(shard: tuple[float, int, int, int]) -> list[Event]:
+    start, first, last, rearm_frames = shard
+    return list(evaluate_frames(_worker_scene, start, first, last,
+                                rearm_frames))
+
+
+def evaluate_parallel(scene_def: dict, start: float, end: float,
+                      jobs: int = None, shard_frames: int = SHARD_FRAMES,
+                      rearm_frames: int = DEFAULT_REARM_FRAMES):
+    """ As `evaluate`, but split into shards of `shard_frames` frames and
+    spread across `jobs` worker processes (default: one per core).
+
+    Every frame is closed form in `t` (collision windows only look
+    ahead to `t_next`, which is computed, not remembered, and each
+    shard rebuilds its bumpers' `CollisionState` from the frames just
+    before it) so the output is identical to `evaluate`. Shards
+    are contiguous and returned in order, so concatenating them is
+    already a merge in timestamp order.
+    """
+    n = frame_count(start, end)
+    shards = [(start, first, min(first + shard_frames - 1, n), rearm_frames)
+              for first in range(1, n + 1, shard_frames)]
+    with ProcessPoolExecutor(max_workers=jobs,
+                             initializer=_init_worker,
+                             initargs=(scene_def,)) as pool:
+        for events in pool.map(_evaluate_shard, shards):
+            yield from events
+
+
+def _text(v):
+    if isinstance(v, bytes):
+        return v.decode()
+    return v
+
+
+def write_jsonl(events, out):
+    """ One JSON object per line, e.g.
+    `{"t": 0.5, "id": "b1", "path": "/bump", "data": [1]}`
+    """
+    count = 0
+    for ev in events:
+        out.write(json.dumps({
+            "t": ev.t,
+            "id": ev.uid,
+            "path": _text(ev.path),
+            "data": [_text(d) for d in ev.data],
+        }))
+        out.write("\n")
+        count += 1
+    return count
+
+
+def _frames(events):
+    """ Group a time ordered event stream into `(t, [events])`
+    """
+    current = None
+    batch = []
+    for ev in events:
+        if batch and ev.t != current:
+            yield current, batch
+            batch = []
+        current = ev.t
+        batch.append(ev)
+    if batch:
+        yield current, batch
+
+
+def write_osc(events, out):
+    """ Each frame becomes an OSC bundle, timetagged with the scene
+    time `t` (seconds from the scene's zero, so the NTP date is
+    meaningless), and prefixed by its int32 size
+    """
+    # imported here since only this writer needs oscpy's internals
+    from oscpy.parser import format_bundle
+
+    count = 0
+    for t, batch in _frames(events):
+        packet, _ = format_bundle(
+            [(ev.path, [d.encode() if isinstance(d, str) else d
+                        for d in ev.data])
+             for ev in batch],
+            timetag=t
+        )
+        out.write(struct.pack(">i", len(packet)))
+        out.write(packet)
+        count += len(batch)
+    return count
+
+
+def _midi_byte(v, default):
+    try:
+        return min(max(int(v), 0), 127)
+    except (TypeError, ValueError):
+        return default
+
+
+def write_midi(events, out):
+    """ A type 1 standard MIDI file with one track per OSC path.
+
+    Each event becomes a note one frame long, with the first data
+    value as pitch and the second (if any) as velocity. Events
+    with non-numeric pitch are dropped.
+    """
+    import mido
+
+    tracks = {}
+    for ev in events:
+        if not ev.data:
+            continue
+        note = _midi_byte(ev.data[0], None)
+        if note is None:
+            continue
+        vel = MIDI_DEFAULT_VELOCITY
+        if len(ev.data) > 1:
+            vel = _midi_byte(ev.data[1], MIDI_DEFAULT_VELOCITY)
+        tracks.setdefault(ev.path, []).extend((
+            (ev.t, mido.Message("note_on", note=note, velocity=vel)),
+            (ev.t + CV_FRAME_TIME,
+             mido.Message("note_off", note=note, velocity=0)),
+        ))
+
+    mid = mido.MidiFile(type=1, ticks_per_beat=MIDI_TICKS_PER_BEAT)
+    count = 0
+    for path, msgs in tracks.items():
+        track = mido.MidiTrack()
+        track.append(mido.MetaMessage("track_name", name=_text(path)))
+        ticks = [(int(round(mido.second2tick(t, MIDI_TICKS_PER_BEAT,
+                                              MIDI_TEMPO))), msg)
+                 for t, msg in msgs]
+        last = 0
+        # stable sort keeps a note_off ahead of a note_on on the same tick
+        for tick, msg in sorted(ticks, key=lambda m: m[0]):
+            track.append(msg.copy(time=tick - last))
+            last = tick
+        mid.tracks.append(track)
+        count += len(msgs) // 2
+    mid.save(file=out)
+    return count
+
+
+WRITERS = {
+    "jsonl": (write_jsonl, "w"),
+    "osc": (write_osc, "wb"),
+    "midi": (write_midi, "wb"),
+}
+
+
+def guess_format(filename: str) -> str:
+    """ Pick an output format from a file extension
+    """
+    if filename.endswith((".mid", ".midi")):
+        return "midi"
+    if filename.endswith(".osc"):
+        return "osc"
+    return "jsonl"
+
+
+def write(events, filename: str, fmt: str = None) -> int:
+    """ Write `events` to `filename`, returning the number written
+    """
+    fmt = fmt or guess_format(filename)
+    if fmt not in WRITERS:
+        raise ValueError("Unknown output format {}".format(fmt))
+    writer, mode = WRITERS[fmt]
+    with open(filename, mode) as out:
+        return writer(events, out)
+
+
+def bounce(scene: Scene, start: float, end: float, filename: str,
+           fmt: str = None,
+           rearm_frames: int = DEFAULT_REARM_FRAMES) -> int:
+    """ Render `start` -> `end` of `scene` to `filename`, returning
+    the number of events written
+    """
+    return write(evaluate(scene, start, end, rearm_frames), filename, fmt)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="najork-bounce",
+        description="Render a time range of a scene's events to a file"
+    )
+    parser.add_argument("scene", help="Scene YAML (or JSON-lines) file")
+    parser.add_argument("-o", "--output", required=True,
+                        help="Output file")
+    parser.add_argument("-f", "--format", choices=FORMATS, default=None,
+                        help="Output format (default: guess from extension)")
+    parser.add_argument("--start", type=float, default=0.0,
+                        help="Start time in seconds")
+    parser.add_argument("--end", type=float, required=True,
+                        help="End time in seconds")
+    parser.add_argument("-j", "--jobs", type=positive_int, default=1,
+                        help="Worker processes (default: 1)")
+    parser.add_argument("--rearm-frames", type=int,
+                        default=DEFAULT_REARM_FRAMES,
+                        help="Frames a bumper must be clear of its collider"
+                             " before it can fire again (0: fire on every"
+                             " frame in contact)")
+    parser.add_argument("-d", "--debug", action="store_true",
+                        help="Verbose output")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.DEBUG if args.debug else logging.INFO)
+
+    scene_def: dict = read_scene_def(args.scene)
+
+    started = time.monotonic()
+    if args.jobs == 1:
+        scene = Scene()
+        scene.load_from_dict(scene_def)
+        count = bounce(scene, args.start, args.end, args.output,
+                       args.format, args.rearm_frames)
+    else:
+        count = write(evaluate_parallel(scene_def, args.start, args.end,
+                                        args.jobs,
+                                        rearm_frames=args.rearm_frames),
+                      args.output, args.format)
+    elapsed = time.monotonic() - started
+    logging.info("Wrote %i events for %.1fs of score in %.2fs (%.0fx realtime)",
+                 count, args.end - args.start, elapsed,
+                 (args.end - args.start) / max(elapsed, 1e-9))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
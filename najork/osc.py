@@ -1,12 +1,49 @@
-from jinja2 import Template
+from __future__ import annotations
+
 from abc import ABC, abstractmethod
+from functools import lru_cache
 import math
-from py_expression_eval import Parser, Expression
+import threading
+from .lazy import lazy_import
 from .message_utils import *
 
+# only loaded once the first message template is parsed
+py_expression_eval = lazy_import("py_expression_eval")
+
+# Big scenes have many thousands of messages, mostly sharing a handful
+# of paths and data expressions, so these are shared rather than held
+# per message. (Parsed expressions are never mutated by evaluation.)
+CACHED_EXPRESSIONS = 4096
+""" distinct data expressions kept parsed """
+
+CACHED_PATHS = 4096
+""" distinct OSC addresses kept interned """
+
+_parsers = threading.local()
+""" a parser per thread, since parsing keeps its state on the parser """
+
+
+@lru_cache(maxsize=CACHED_EXPRESSIONS)
+def parse_expression(exp: str) -> py_expression_eval.Expression:
+    """ Parse a data expression, once per distinct expression
+    """
+    parser = getattr(_parsers, "parser", None)
+    if parser is None:
+        parser = _parsers.parser = py_expression_eval.Parser()
+    return parser.parse(exp)
+
+
+@lru_cache(maxsize=CACHED_PATHS)
+def intern_path(path):
+    """ The one shared copy of OSC address `path` (str or bytes)
+    """
+    return path
+
+
 class Message(ABC):
     """ Something sendable
     """
+    __slots__ = ()
 
     @abstractmethod
     def get_path(self, t: float):
@@ -17,9 +54,10 @@ class Message(ABC):
         pass
 
 class ConcreteMessage(Message):
+    __slots__ = ("_path", "_data")
 
     def __init__(self, path, data):
-        self._path = path
+        self._path = intern_path(path)
         self._data = data
 
     def get_path(self, t: float):
@@ -29,7 +67,7 @@ class ConcreteMessage(Message):
         return self._data
 
     def set_path(self, new: str):
-        self._path = new
+        self._path = intern_path(new)
 
     def set_data(self, new_data: list):
         self._data = new_data
@@ -39,22 +77,17 @@ class TemplatedMessage(ConcreteMessage):
     """ An OSC message with bindable params
     and ability to compute values
     """
+    __slots__ = ("_bindings", "_data_parsed")
 
     def __init__(self, path, data, bindings: callable):
         self._bindings = bindings
-        self._expr_parser = Parser()
         super().__init__(path, data)
 
         self._parse()
 
-    def _get_bindings(self, t: float):
-        extra = self._bindings(t)
-        extra["t"] = t
-        return extra
-
     def _parse(self):
         self._data_parsed = {
-            exp: self._expr_parser.parse(exp)
+            exp: parse_expression(exp)
             for exp in self._data
         }
 
@@ -62,21 +95,30 @@ class TemplatedMessage(ConcreteMessage):
         self._data = new_data
         self._parse()
 
+    @property
+    def expressions(self) -> list:
+        """ The (unevaluated) data expressions
+        """
+        return self._data
+
+    def variables(self) -> set:
+        """ Names of all the variables the data expressions use
+        """
+        return {v for d in self._data
+                for v in self._data_parsed[d].variables()}
+
     def get_data(self, t: float):
         """ Get data expressions evaluated using curret @'t' input
         values, in the order the expressions were registered
         """
+        return self.evaluate(self._bindings(t), t)
+
+    def evaluate(self, values: dict, t: float):
+        """ As `get_data`, but with the input `values` supplied rather
+        than fetched through the bindings (e.g. from a compiled frame)
+        """
+        values = dict(values, t=t)
         return [
-            self._eval(self._data_parsed[d], t)
+            self._data_parsed[d].evaluate(values)
             for d in self._data
         ]
-
-    def _eval(self, expr: Expression, t: float):
-        return expr.evaluate(self._get_bindings(t))
-
-
-
-
-
-
-
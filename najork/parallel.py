@@ -0,0 +1,189 @@
+""" Evaluating independent mechanisms in parallel
+
+Installation scores are often many separate mechanisms, i.e. separate
+connected components of the scene graph (see `Scene.components`), which
+need nothing from each other to be evaluated. A `ParallelScene` deals
+the components out to a pool of worker processes, each of which builds
+its own copy of just its share, and every frame:
+
+  1. sends each worker the time slice over its pipe
+  2. each worker evaluates its measurements and bumper collisions and
+     writes them into a block of shared memory, then acks
+  3. the messages are assembled from the shared values, in the same
+     order as `engine_sched.frame_events`
+
+so the geometry is spread across cores instead of being capped by the
+engine thread's GIL. Components with no measurements or bumpers can't
+send anything and aren't evaluated at all.
+"""
+
+import logging
+import multiprocessing
+from multiprocessing import shared_memory
+
+from .broadphase import BroadPhase
+from .engine_sched import bumper_events
+from .entities import Measurement, Bumper
+from .scene import Scene
+
+SLOT_SIZE = 8  # one double per measurement value or collision flag
+
+
+def _worker(conn, shm_name: str, scene_def: dict,
+            measurements: list[tuple[str, int]],
+            bumpers: list[tuple[str, int]]):
+    """ Evaluate a share of the scene each time we're sent `(t, t_next)`,
+    until we're sent `None`
+    """
+    shm = shared_memory.SharedMemory(name=shm_name)
+    slots = shm.buf.cast("d")
+    try:
+        scene = Scene()
+        scene.load_from_dict(scene_def)
+        measurements = [(scene.get_by_id(uid), n) for uid, n in measurements]
+        bumpers = [(scene.get_by_id(uid), n) for uid, n in bumpers]
+        broad_phase = BroadPhase()
+        conn.send(True)
+        while True:
+            window = conn.recv()
+            if window is None:
+                break
+            t, t_next = window
+            for e, n in measurements:
+                slots[n] = e.get_value(t)
+            for b, n in bumpers:
+                slots[n] = (1.0 if broad_phase.test_collision(b, t, t_next)
+                            else 0.0)
+            conn.send(True)
+    except Exception:
+        logging.exception("Parallel evaluation worker failed")
+        conn.send(False)
+    finally:
+        slots.release()
+        shm.close()
+        conn.close()
+
+
+def deal(components: list[list], jobs: int) -> list[list]:
+    """ Share `components` out into (at most) `jobs` groups of roughly
+    equal size, biggest first
+    """
+    groups = [[] for _ in range(min(jobs, len(components)))]
+    sizes = [0] * len(groups)
+    for c in sorted(components, key=len, reverse=True):
+        n = sizes.index(min(sizes))
+        groups[n].extend(c)
+        sizes[n] += len(c)
+    return groups
+
+
+class ParallelScene:
+    """ `scene` evaluated across `jobs` worker processes. Call `close`
+    when done with it
+    """
+
+    def __init__(self, scene: Scene, jobs: int):
+        self._scene = scene
+        self._controls = scene.list_by_class("control")
+        self._bumpers = scene.list_by_class("bumper")
+        self.slots: dict[str, int] = {}
+        """ index of each measurement's value or bumper's flag """
+
+        # (only the part of each that sends something, see `Scene.sinks`)
+        live = scene.sinks()
+        active = [[e for e in c if e.uid in live]
+                  for c in scene.components()]
+        active = [c for c in active
+                  if any(isinstance(e, (Measurement, Bumper)) for e in c)]
+        for component in active:
+            for e in component:
+                if isinstance(e, (Measurement, Bumper)):
+                    self.slots[e.uid] = len(self.slots)
+
+        self._shm = shared_memory.SharedMemory(
+            create=True, size=max(len(self.slots), 1) * SLOT_SIZE
+        )
+        self._values = self._shm.buf.cast("d")
+        self._workers = []
+        # not fork, since the engine that owns us has threads running
+        context = multiprocessing.get_context("spawn")
+        try:
+            for group in deal(active, jobs):
+                conn, child = context.Pipe()
+                measurements = [(e.uid, self.slots[e.uid]) for e in group
+                                if isinstance(e, Measurement)]
+                bumpers = [(e.uid, self.slots[e.uid]) for e in group
+                           if isinstance(e, Bumper)]
+                process = context.Process(
+                    target=_worker, daemon=True,
+                    args=(child, self._shm.name,
+                          scene.component_definition(group),
+                          measurements, bumpers)
+                )
+                process.start()
+                child.close()
+                self._workers.append((process, conn))
+            if not all(conn.recv() for _, conn in self._workers):
+                raise RuntimeError("Parallel evaluation worker failed")
+        except BaseException:
+            self.close()
+            raise
+
+    @property
+    def scene(self) -> Scene:
+        return self._scene
+
+    @property
+    def jobs(self) -> int:
+        """ How many worker processes are actually running """
+        return len(self._workers)
+
+    def evaluate(self, t: float, t_next: float):
+        """ Have every worker evaluate `t` -> `t_next` into the slots,
+        raising `RuntimeError` if any fails (or has died)
+        """
+        try:
+            for _, conn in self._workers:
+                conn.send((t, t_next))
+            ok = all(conn.recv() for _, conn in self._workers)
+        except (EOFError, OSError) as ex:
+            raise RuntimeError("Parallel evaluation worker died") from ex
+        if not ok:
+            raise RuntimeError("Parallel evaluation worker failed")
+
+    def frame_events(self, t: float, t_next: float):
+        """ As `engine_sched.frame_events`, evaluated in parallel
+        """
+        self.evaluate(t, t_next)
+        values = self._values
+
+        def inputs(source):
+            return {k: values[self.slots[v.uid]]
+                    for k, v in source._inputs.items()}
+
+        for c in self._controls:
+            yield c.uid, c.msg.get_path(t), c.msg.evaluate(inputs(c), t)
+        for b in self._bumpers:
+            if values[self.slots[b.uid]]:
+                # (which members of a group were hit is worked out here)
+                yield from bumper_events(b, t, t_next, inputs(b))
+
+    def close(self):
+        """ Stop the workers and free the shared memory
+        """
+        for process, conn in self._workers:
+            try:
+                conn.send(None)
+            except OSError:
+                pass
+        for process, conn in self._workers:
+            process.join(timeout=1.0)
+            if process.is_alive():
+                process.terminate()
+            conn.close()
+        self._workers = []
+        if self._shm is not None:
+            self._values.release()
+            self._shm.close()
+            self._shm.unlink()
+            self._shm = None
@@ -25,18 +25,33 @@ THEME = {
     Bumper: (17/255, 162/255, 1.0),
 }
 
-def render(scn: Scene, t: float, ctx):
+def render(scn: Scene, t: float, ctx, frame=None):
+    """ Draw `scn` at `t`, taking positions from `frame` (as evaluated
+    by a `CompiledScene`) where given
+    """
     ctx.scale(1.0, 1.0)
     ctx.set_source_rgb(0.0, 0.0, 0.0)
 
+    # just what's in the viewport, if there is one
+    visible = scn.visible(t)
     for e in scn.sort_by_rank():
-        render_entity(e, t, ctx)
+        if visible is None or e.uid in visible:
+            render_entity(e, t, ctx, frame)
 
 def label(ctx, e, x, y):
     ctx.move_to(x, y)
     ctx.show_text(e.uid)
 
-def render_entity(e, t: float, ctx):
+def coords(e, t: float, frame=None):
+    """ Where point `e` is, from the compiled `frame` if we have one
+    (and it has `e`, i.e. `e` is live)
+    """
+    if frame is not None and e.uid in frame:
+        return frame.coords(e.uid)
+    return e.get_coords(t)
+
+
+def render_entity(e, t: float, ctx, frame=None):
     """ Build a scene from dict `scene_def` parsed from YAML
     (order something else, we don't care)
     angle
@@ -55,7 +70,7 @@ def render_entity(e, t: float, ctx):
     if type(e) is Anchor:
         ctx.set_source_rgb(*THEME[type(e)])
         ctx.set_line_width(0.0)
-        x, y = e.get_repr(t)
+        x, y = coords(e, t, frame)
         ctx.move_to(x, y)
         ctx.arc(x, y, POINT_SIZE, 0, 2 * math.pi)
         ctx.close_path()
@@ -65,7 +80,7 @@ def render_entity(e, t: float, ctx):
     elif type(e) is Slider:
         ctx.set_source_rgb(*THEME[type(e)])
         ctx.set_line_width(0.0)
-        x, y = e.get_repr(t)
+        x, y = coords(e, t, frame)
         ctx.move_to(x, y)
         ctx.arc(x, y, POINT_SIZE, 0, 2 * math.pi)
         ctx.close_path()
@@ -75,7 +90,7 @@ def render_entity(e, t: float, ctx):
     elif type(e) is Intersection:
         ctx.set_source_rgb(*THEME[type(e)])
         ctx.set_line_width(4.0)
-        x, y = e.get_repr(t)
+        x, y = coords(e, t, frame)
         ctx.move_to(x-POINT_SIZE, y-POINT_SIZE)
         ctx.line_to(x+POINT_SIZE, y+POINT_SIZE)
         ctx.stroke()
@@ -120,7 +135,11 @@ def render_entity(e, t: float, ctx):
         for stop in stops[1:]:
             ctx.line_to(stop[0], stop[1])
         ctx.close_path()
-        if e.test_collision(t, t+CV_FRAME_TIME):
+        if frame is not None and frame.collisions is not None:
+            hit = frame.collides(e.uid)
+        else:
+            hit = e.test_collision(t, t+CV_FRAME_TIME)
+        if hit:
             ctx.fill()
         else:
             ctx.stroke()
@@ -149,7 +168,11 @@ def render_entity(e, t: float, ctx):
     elif type(e) is Line:
         ctx.set_source_rgb(*THEME[type(e)])
         ctx.set_line_width(2.0)
-        x1, y1, x2, y2 = e.get_repr(t)
+        if frame is not None:
+            (x1, y1), (x2, y2) = (coords(p, t, frame)
+                                  for p in e.get_dependencies())
+        else:
+            x1, y1, x2, y2 = e.get_repr(t)
         ctx.move_to(x1, y1)
         ctx.line_to(x2, y2)
         ctx.stroke()
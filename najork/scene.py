@@ -12,22 +12,114 @@ at a time, though this doesn't really need to be enforced.
 A Scene is stateless once set-up (i.e. w.r.t. to `t`), and there aren't really
 any re-entrancy concerns.
 
+Only the 'live' part of a scene (see `Scene.live`) needs evaluating as it
+plays: the sinks sending messages, whatever's in the viewport, and
+everything they need. Scores carry plenty of purely decorative
+construction geometry, which then costs nothing.
+
 """
 
 # TODO ensure caching is similarly thread safe
 
 from .entities import (
     Entity, Anchor, Line, Slider, Circle, Intersection,
-    Distance, Angle, Control, Bumper, PolyLine
+    Distance, Angle, Control, Bumper, PolyLine, Group, ImpossibleGeometry
 )
+from .broadphase import overlaps
+from .clock import frame_number
+from .tempo import Tempo
 
 from collections import defaultdict
+from typing import NamedTuple, Optional
 import functools
 
 
 class InputError(Exception):
-    """ Something wrong with input scene def
+    """ Something wrong with input scene def. May carry a list
+    of every problem found, as `errors`
+    """
+    def __init__(self, errors):
+        if isinstance(errors, str):
+            errors = [errors]
+        self.errors = errors
+        super().__init__("\n".join(errors))
+
+
+LOADERS = {
+    "anchor": "_load_anchor",
+    "line": "_load_line",
+    "polyline": "_load_polyline",
+    "circle": "_load_circle",
+    "slider": "_load_slider",
+    "intersection": "_load_intersection",
+    "group": "_load_group",
+    "distance": "_load_distance",
+    "angle": "_load_angle",
+    "control": "_load_control",
+    "bumper": "_load_bumper",
+}
+""" `Scene` method building each kind of entity from its definition """
+
+SAVERS = {classname: "_save" + method[len("_load"):]
+          for classname, method in LOADERS.items()}
+""" `Scene` method giving the class specific part of each definition """
+
+SINK_CLASSES = ("control", "bumper")
+""" what sends messages, and so is always live (see `Scene.live`) """
+
+VIEWS_CACHED = 4
+""" frames' visible and live entities kept (see `Scene.live`) """
+
+PARENT_FIELDS = {
+    "line": ("parents",),
+    "polyline": ("parents",),
+    "circle": ("centre",),
+    "slider": ("parent",),
+    "intersection": ("parents",),
+    "group": ("members",),
+    "distance": ("parents",),
+    "angle": ("parents",),
+    "bumper": ("parent", "collides"),
+}
+""" Definition fields referring to the entities' geometric parents """
+
+
+class EntityDef(NamedTuple):
+    """ Lightweight record of an entity definition, before it's built
+    """
+    uid: str
+    classname: str
+    rank: Optional[int]
+    definition: dict
+    parents: tuple[str, ...]
+    """ ids of geometric parents, which must be ranked lower """
+    refs: tuple[str, ...]
+    """ ids of everything that must be built first (parents + inputs) """
+
+
+def iter_definitions(scene_def: dict):
+    """ Yield `(rank, definition)` for every entity in a scene dict,
+    from its ranked `layers` and then its unranked `entities`
     """
+    for layer in scene_def.get("layers", ()):
+        for child in layer.get("children") or ():
+            yield layer.get("rank"), child
+    for child in scene_def.get("entities", ()):
+        yield None, child
+
+
+def entity_refs(classname: str, e: dict):
+    """ `(parents, refs)` ids referenced by entity definition `e`
+    """
+    parents = []
+    for field in PARENT_FIELDS.get(classname, ()):
+        v = e.get(field)
+        if isinstance(v, (list, tuple)):
+            parents.extend(v)
+        elif v is not None:
+            parents.append(v)
+    inputs = list((e.get("connections") or {}).values())
+    return tuple(parents), tuple(parents + inputs)
 
 
 class Scene():
@@ -46,19 +138,38 @@ class Scene():
 
     ```
         from najork.scene import Scene
-        import yaml
+        from najork.loader import parse_yaml
 
         s = Scene()
         with open("scene.yml") as inp:
-            y1 = yaml.load(inp.read(), Loader=yaml.Loader)
-            s.load_from_dict(y1)
+            s.load_from_dict(parse_yaml(inp.read()))
     ```
 
+    (`najork.loader.load_scene_file` does the same via a cache.)
+
     """
 
     def __init__(self):
         self._registry = {}
-        self._sequences = defaultdict(lambda: 1)
+        self._by_class = defaultdict(list)
+        self._by_rank = None
+        self._sequences = defaultdict(int)
+        self._viewport = None
+        """ `(minx, miny, maxx, maxy)` of what's drawn, if anything """
+        self._sink_closure = None
+        """ uids of the sinks and everything they need, once worked out """
+        self._fixed = (None, set(), {})
+        """ `(edits, uids, bounds)`: as of `_edits`, the entities which
+        never move, and the bounds of those asked for so far """
+        self._static_view = (None, set(), [])
+        """ `(key, uids, moving)`: whatever never moving is in the
+        viewport (and what it needs), and the entities which move, keyed
+        on the viewport and `_edits` """
+        self._views = {}
+        """ the latest few `(visible, live)` uids, keyed on the viewport,
+        frame and `_edits` they were worked out for """
+        self._edits = 0
+        """ edits to the scene so far (see `edited`) """
 
     def get_next_id(self, classname: str) -> str:
         """ Get a unique sequence ID with which to register
@@ -66,8 +177,8 @@ class Scene():
 
         e.g. `get_next_id("anchor")` -> `"000001"`
         """
-        uid = self._sequences[classname]
         self._sequences[classname] += 1
+        uid = self._sequences[classname]
         # 999999 is a reasonable ceiling, but this won't break if
         # it overflows, the list just won't be as simple to sort
         return "%0.6i" % uid
@@ -75,7 +186,60 @@ class Scene():
     def add(self, entity: Entity):
         """ Register an entity
         """
+        replaced = entity.uid in self._registry
+        if replaced:
+            self._by_class[entity.classname].remove(
+                self._registry[entity.uid]
+            )
         self._registry[entity.uid] = entity
+        self._by_class[entity.classname].append(entity)
+        self._by_rank = None
+        self.edited()
+        if replaced:
+            # whatever used the old one now uses this
+            self._sink_closure = None
+            return
+        # nothing can need a new entity yet, so just add its own closure
+        if (self._sink_closure is not None
+                and entity.classname in SINK_CLASSES):
+            self._close_over(entity, self._sink_closure)
+
+    def remove(self, uid: str):
+        """ Deregister entity `uid`, which nothing else may depend on
+        """
+        entity = self._registry[uid]
+        users = sorted(e.uid for e in self._registry.values()
+                       if entity in e.get_dependencies()
+                       or entity in getattr(e, "_inputs", {}).values())
+        if users:
+            raise InputError("Can't remove '{}', it's used by {}".format(
+                uid, ", ".join("'{}'".format(u) for u in users)
+            ))
+        del self._registry[uid]
+        self._by_class[entity.classname].remove(entity)
+        self._by_rank = None
+        self.edited()
+        # (only what it needed might have gone with it)
+        if uid in (self._sink_closure or ()):
+            self._sink_closure = None
+
+    def add_input(self, uid: str, connection: str, input_uid: str):
+        """ Wire measurement `input_uid` into control or bumper `uid` as
+        `connection`
+        """
+        entity, measurement = self._registry[uid], self._registry[input_uid]
+        entity.add_input(connection, measurement)
+        self.edited()
+        if self._sink_closure is not None and uid in self._sink_closure:
+            self._close_over(measurement, self._sink_closure)
+
+    def edited(self):
+        """ Note that the scene has changed, so anything worked out from
+        where its entities are (e.g. what's visible) is worked out again.
+        Call after changing an entity in place (moving an anchor, say);
+        `add`, `remove` and `add_input` call it themselves.
+        """
+        self._edits += 1
 
     def get_by_id(self, uid: str) -> Entity:
         """ Fetch registered entity identified by `uid`
@@ -88,8 +252,7 @@ class Scene():
     def list_by_class(self, classname: str):
         """ List all entities registered for a given entity class
         """
-        # TODO pregroup
-        return [x for x in self._registry.values() if x.classname == classname]
+        return list(self._by_class.get(classname, ()))
 
     def list_by_rank(self, rank: int):
         """ List all entities registered for a given rank
@@ -99,126 +262,552 @@ class Scene():
     def sort_by_rank(self):
         """ List all entities registered, ordered by ascending rank
         """
-        # TODO presort
-        return sorted(self._registry.values(),
-                      key=lambda x: x.rank)
+        if self._by_rank is None:
+            self._by_rank = sorted(self._registry.values(),
+                                   key=lambda x: x.rank)
+        return list(self._by_rank)
+
+    @staticmethod
+    def _links(e: Entity):
+        """ Every other entity `e` needs to evaluate or send messages
+        """
+        yield from e.get_dependencies()
+        yield from getattr(e, "_inputs", {}).values()
+        collider = getattr(e, "_collision_parent", None)
+        if collider is not None:
+            yield collider
+
+    @classmethod
+    def _close_over(cls, entity: Entity, closure: set):
+        """ Add `entity` and everything it needs to `closure` (uids) """
+        stack = [entity]
+        while stack:
+            e = stack.pop()
+            if e.uid not in closure:
+                closure.add(e.uid)
+                stack.extend(cls._links(e))
+
+    @property
+    def viewport(self):
+        """ `(minx, miny, maxx, maxy)` of what's drawn, or None """
+        return self._viewport
+
+    def set_viewport(self, box: tuple):
+        """ Draw just what's within `box` (`(minx, miny, maxx, maxy)`,
+        or None to draw nothing, e.g. when headless); a point moving
+        along a shape is drawn wherever on it it may be
+        """
+        self._viewport = tuple(box) if box is not None else None
+
+    def _fixed_bounds(self) -> tuple[set, dict]:
+        """ uids of the entities which never move (those built from
+        anchors alone, through anything but sliders), and a cache of
+        their bounds, both as of the latest edit
+        """
+        edits, fixed, bounds = self._fixed
+        if edits != self._edits:
+            fixed, bounds = set(), {}
+            for e in self.sort_by_rank():
+                if (not isinstance(e, Slider)
+                        and all(d.uid in fixed
+                                for d in e.get_dependencies())):
+                    fixed.add(e.uid)
+            self._fixed = (self._edits, fixed, bounds)
+        return fixed, bounds
+
+    @staticmethod
+    def _placed_by(e: Entity) -> Entity:
+        """ Whose bounds `e` is drawn within: a point moving along a
+        shape may be anywhere on it """
+        if isinstance(e, (Slider, Intersection)):
+            return e.get_dependencies()[0]
+        return e
+
+    def _in_viewport(self, e: Entity, t: float) -> bool:
+        e = self._placed_by(e)
+        fixed, bounds = self._fixed_bounds()
+        box = bounds.get(e.uid) if e.uid in fixed else None
+        if box is None:
+            (mx, my), (Mx, My) = e.get_bounds(t)
+            box = (mx, my, Mx, My)
+            if e.uid in fixed:
+                bounds[e.uid] = box
+        return overlaps(self._viewport, box)
+
+    def _static_visible(self) -> tuple[set, list]:
+        """ What never moves in the viewport (and everything it needs),
+        and what moves, so may or may not be
+        """
+        key = (self._viewport, self._edits)
+        if self._static_view[0] != key:
+            fixed, _ = self._fixed_bounds()
+            closure, moving = set(), []
+            for e in self._registry.values():
+                if self._placed_by(e).uid not in fixed:
+                    moving.append(e)
+                elif e.uid not in closure and self._in_viewport(e, 0.0):
+                    self._close_over(e, closure)
+            self._static_view = (key, closure, moving)
+        return self._static_view[1:]
+
+    def _view(self, t: float) -> tuple[set, set]:
+        """ `(visible, live)` at `t` """
+        frame = frame_number(t)
+        key = (self._viewport, t if frame is None else frame, self._edits)
+        view = self._views.get(key)
+        if view is not None:
+            return view
+        visible = None
+        live = self.sinks()
+        if self._viewport is not None:
+            # only what moves need be looked at again each frame
+            visible, moving = self._static_visible()
+            in_view = [e for e in moving if e.uid not in visible
+                       and self._in_viewport(e, t)]
+            if in_view:
+                visible = set(visible)
+                for e in in_view:
+                    self._close_over(e, visible)
+            live = live | visible
+        views = dict(self._views) if len(self._views) < VIEWS_CACHED else {}
+        views[key] = view = (visible, live)
+        # (swapped in whole: the engine and the UI both ask)
+        self._views = views
+        return view
+
+    def visible(self, t: float = 0.0) -> set[str]:
+        """ uids of everything drawn in the viewport at `t` (and so
+        whatever they need), or None if there's no viewport. Shapes
+        that move are looked at again for each frame; the bounds of
+        those that don't are worked out just once (until an edit). Don't
+        modify the set returned.
+        """
+        return self._view(t)[0]
+
+    def live(self, t: float = 0.0) -> set[str]:
+        """ uids of the live entities: the sinks (controls and bumpers,
+        which send messages), whatever's in the viewport at `t`, and
+        everything they need (through dependencies, inputs and
+        colliders). Nothing else (e.g. construction geometry) need ever
+        be evaluated while playing. Don't modify the set returned.
+        """
+        return self._view(t)[1]
+
+    def sinks(self) -> set[str]:
+        """ uids of the sinks and everything they need (the live
+        entities, bar the viewport): all that sending messages ever
+        evaluates. Don't modify the set returned.
+        """
+        if self._sink_closure is None:
+            closure = set()
+            for classname in SINK_CLASSES:
+                for e in self._by_class.get(classname, ()):
+                    self._close_over(e, closure)
+            self._sink_closure = closure
+        return self._sink_closure
+
+    def components(self) -> list[list[Entity]]:
+        """ Partition the scene into its connected components (mechanisms
+        sharing no entities, inputs or colliders), each in rank order,
+        which can be evaluated independently
+        """
+        root = {uid: uid for uid in self._registry}
+
+        def find(uid):
+            while root[uid] != uid:
+                root[uid] = root[root[uid]]
+                uid = root[uid]
+            return uid
+
+        for e in self._registry.values():
+            for other in self._links(e):
+                a, b = find(e.uid), find(other.uid)
+                if a != b:
+                    root[a] = b
+
+        components = {}
+        for e in self.sort_by_rank():
+            components.setdefault(find(e.uid), []).append(e)
+        return list(components.values())
+
+    def component_definition(self, component: list[Entity]) -> dict:
+        """ A scene dict (as for `load_from_dict`) of just `component`
+        """
+        return {"entities": [self.save_entity(e) for e in component]}
+
+    def warm(self, t: float = 0.0):
+        """ Get the scene ready to be played from `t` by building its
+        indexes and evaluating everything live once, so any lazy imports,
+        message templates and tempos are dealt with before an engine sees
+        it (and so a broken scene fails here rather than mid-performance)
+        """
+        live = self.live(t)
+        for e in self.sort_by_rank():
+            if e.uid in live:
+                if getattr(e, "tempo", None) is not None:
+                    # (sampled now, not on the engine's time)
+                    e.tempo.prepare(t)
+                e.get_repr(t)
+        for c in self.list_by_class("control") + self.list_by_class("bumper"):
+            c.msg.get_data(t)
+
+    def compile_tick(self, cache_dir: str = ""):
+        """ Generate a tick function specialised to this scene, see
+        `najork.codegen`
+        """
+        from .codegen import compile_tick
+        return compile_tick(self, cache_dir)
 
     def load_from_dict(self, scene_def: dict):
-        """ Build a scene from dict `scene_def` parsed from YAML
-        (order something else, we don't care)
-        x angle
-        x circle
-        x distance
-        x bumper
-        x slider
-        x intersection
-        x line
-        x anchor
-        x polyline
-        x control
-        roller
-        """
-        for rank in scene_def["layers"]:
-            for e in rank["children"]:
-                entity: Entity = None
-
-                if e["entity"] == "anchor":
-                    entity = Anchor(e["id"], rank["rank"], tuple(e["coords"]))
-
-                elif e["entity"] == "line":
-                    p1 = self.get_by_id(e["parents"][0])
-                    p2 = self.get_by_id(e["parents"][1])
-                    entity = Line(e["id"], rank["rank"], [p1, p2])
-
-                    # TODO default_child_velocity
-
-                elif e["entity"] == "polyline":
-                    p1 = self.get_by_id(e["parents"][0])
-                    p2 = self.get_by_id(e["parents"][1])
-                    midpoints = e.get("midpoints", [])
-                    entity = PolyLine(e["id"], rank["rank"], [p1, p2], midpoints)
-
-                    # TODO default_child_velocity
-
-                elif e["entity"] == "circle":
-                    p1 = self.get_by_id(e["centre"])
-                    entity = Circle(e["id"],
-                                    rank["rank"],
-                                    p1,
-                                    e["radius"],
-                                    e["orientation"])
-
-                    # TODO default_child_velocity
-
-                elif e["entity"] == "slider":
-                    par = self.get_by_id(e["parent"])
-                    entity = Slider(e["id"],
-                                    rank["rank"],
-                                    par,
-                                    e.get("position", 0.0),
-                                    e.get("velocity", 0.0),
-                                    e.get("loop", False),
-                                    e.get("inherit_velocity", 0.0))
-                elif e["entity"] == "intersection":
-                    p1 = self.get_by_id(e["parents"][0])
-                    p2 = self.get_by_id(e["parents"][1])
-                    entity = Intersection(e["id"], rank["rank"],
-                                          [p1, p2])
-
-                elif e["entity"] == "distance":
-                    p1 = self.get_by_id(e["parents"][0])
-                    p2 = self.get_by_id(e["parents"][1])
-                    entity = Distance(e["id"], rank["rank"],
-                                      [p1, p2])
-
-                elif e["entity"] == "angle":
-                    p1 = self.get_by_id(e["parents"][0])
-                    p2 = self.get_by_id(e["parents"][1])
-                    entity = Angle(e["id"], rank["rank"],
-                                      [p1, p2])
-
-                elif e["entity"] == "control":
-                    entity = Control(e["id"], rank["rank"],
-                                     e["coords"][0], e["coords"][1],
-                                     e["path"].encode()
-                                     )
-                    for connection, input_id in e.get("connections", {}).items():
-                        entity.add_input(connection, self.get_by_id(input_id))
-                    entity.msg.set_data(e.get("data", []))
-
-                elif e["entity"] == "bumper":
-                    p1 = self.get_by_id(e["parent"])
-                    c1 = self.get_by_id(e["collides"])
-                    inherit_vel: bool = False
-                    vel: float = 0.0
-                    if type(e["velocity"]) == str and e["velocity"] == "inherit":
-                        inherit_vel = True
-                    else:
-                        vel = float(e["velocity"])
-                    entity = Bumper(e["id"], rank["rank"],
-                                     p1,
-                                     e["progression"], vel,
-                                     c1,
-                                     e["path"].encode(),
-                                     e.get("loop", False),
-                                     inherit_vel
-                                     )
-                    for connection, input_id in e.get("connections", {}).items():
-                        entity.add_input(connection, self.get_by_id(input_id))
-                    entity.msg.set_data(e.get("data", []))
+        """ Build a scene from dict `scene_def` parsed from YAML.
 
+        Entities may be listed in any order, either in ranked `layers`
+        or in a flat, unranked `entities` list (ranks are then assigned
+        as one more than the highest ranked parent). Loading happens in
+        two passes:
 
-                else:
-                    raise InputError(
-                        "Unknown entity classname {}".format(e["entity"])
-                    )
+          1. every definition is parsed into a lightweight `EntityDef`,
+             whose references form the dependency graph
+          2. definitions are topologically sorted (depth first, so an
+             already ordered file keeps its order), ranks are validated
+             or assigned and entities instantiated in that order, all
+             in one linear pass
 
-                if entity is not None:
-                    self.add(entity)
+        All problems found are reported together in one `InputError`.
+        """
+        errors = []
+        defs = {}
+        for rank, e in iter_definitions(scene_def):
+            d = self._parse_def(rank, e, errors, defs)
+            if d is not None:
+                defs[d.uid] = d
+
+        # iterative depth first search, building each entity once
+        # everything it refers to is built
+        done = set()
+        for root in defs:
+            if root in done:
+                continue
+            path = [root]
+            on_path = {root}
+            stack = [iter(defs[root].refs)]
+            while stack:
+                for ref in stack[-1]:
+                    if ref in on_path:
+                        cycle = path[path.index(ref):]
+                        errors.append(self._cycle(sorted(cycle)))
+                    elif ref in defs and ref not in done:
+                        path.append(ref)
+                        on_path.add(ref)
+                        stack.append(iter(defs[ref].refs))
+                        break
+                    elif ref not in defs and ref not in self._registry:
+                        errors.append(self._unknown_ref(defs[path[-1]], ref))
+                else:
+                    uid = path.pop()
+                    on_path.discard(uid)
+                    stack.pop()
+                    done.add(uid)
+                    self._build(defs[uid], errors)
+
+        if errors:
+            raise InputError(errors)
+
+    def load_stream(self, definitions):
+        """ Build a scene from an iterable of `(rank, definition)`
+        pairs (see `iter_definitions` and `najork.loader`), instantiating
+        each entity as soon as everything it refers to exists.
+
+        Only definitions waiting on something not yet seen are held
+        on to, so peak memory is roughly that of the finished scene.
+        As for `load_from_dict`, order doesn't matter and every problem
+        is reported at once.
+        """
+        errors = []
+        failed = set()
+        pending = {}
+        """ uid -> [EntityDef, number of refs not yet built] """
+        waiting = defaultdict(list)
+        """ uid not yet built -> uids of pending defs waiting for it """
+
+        def build(d: EntityDef):
+            ready = [d]
+            while ready:
+                d = ready.pop()
+                if not self._build(d, errors):
+                    failed.add(d.uid)
+                    continue
+                for waiter in waiting.pop(d.uid, ()):
+                    pending[waiter][1] -= 1
+                    if pending[waiter][1] == 0:
+                        ready.append(pending.pop(waiter)[0])
+
+        for rank, e in definitions:
+            d = self._parse_def(rank, e, errors, pending, failed)
+            if d is None:
+                continue
+            missing = [ref for ref in set(d.refs)
+                       if ref not in self._registry]
+            if missing:
+                pending[d.uid] = [d, len(missing)]
+                for ref in missing:
+                    waiting[ref].append(d.uid)
+            else:
+                build(d)
+
+        # whatever is left is waiting on something broken, missing or
+        # (if none of those) on itself
+        blocked = set(failed)
+        for ref in list(waiting):
+            if ref not in pending and ref not in failed:
+                for uid in waiting[ref]:
+                    errors.append(self._unknown_ref(pending[uid][0], ref))
+                blocked.add(ref)
+        frontier = list(blocked)
+        while frontier:
+            for uid in waiting.get(frontier.pop(), ()):
+                if uid not in blocked:
+                    blocked.add(uid)
+                    frontier.append(uid)
+        stuck = sorted(uid for uid in pending if uid not in blocked)
+        if stuck:
+            errors.append(self._cycle(stuck))
+        if errors:
+            raise InputError(errors)
+
+    def _parse_def(self, rank: Optional[int], e: dict, errors: list,
+                   *seen) -> Optional['EntityDef']:
+        """ Parse a definition into an `EntityDef`, or record why not.
+        `seen` are containers of ids already taken, besides the registry
+        """
+        classname = e.get("entity")
+        uid = e.get("id")
+        if classname not in LOADERS:
+            errors.append("Unknown entity classname {} (id '{}')".format(
+                classname, uid
+            ))
+            return None
+        if uid is None:
+            errors.append("A {} has no id".format(classname))
+            return None
+        if uid in self._registry or any(uid in ids for ids in seen):
+            errors.append("Duplicate id '{}'".format(uid))
+            return None
+        rank = e.get("rank", rank)
+        return EntityDef(uid, classname, rank, e, *entity_refs(classname, e))
+
+    def _build(self, d: 'EntityDef', errors: list) -> bool:
+        """ Validate (or assign) the rank of `d` against its already
+        built references, then instantiate and register it
+        """
+        if any(ref not in self._registry for ref in d.refs):
+            # depends on something missing or broken, already reported
+            return False
+        # scene is rank 0 and implicitly the parent of everything
+        floor = max([self._registry[ref].rank for ref in d.parents] + [0])
+        if d.rank is None:
+            d = d._replace(rank=max(
+                [self._registry[ref].rank for ref in d.refs] + [floor]
+            ) + 1)
+        elif d.rank <= floor:
+            errors.append(
+                "{} '{}' has rank {} but must be ranked above its "
+                "parents (highest rank {})".format(
+                    d.classname, d.uid, d.rank, floor
+                )
+            )
+            return False
+        try:
+            entity = getattr(self, LOADERS[d.classname])(d)
+        except (KeyError, TypeError, ValueError, ImpossibleGeometry) as ex:
+            errors.append("{} '{}': {}: {}".format(
+                d.classname, d.uid, type(ex).__name__, ex
+            ))
+            return False
+        self.add(entity)
+        return True
+
+    @staticmethod
+    def _unknown_ref(d: 'EntityDef', ref: str) -> str:
+        return "{} '{}' refers to unknown id '{}'".format(
+            d.classname, d.uid, ref
+        )
+
+    @staticmethod
+    def _cycle(uids: list[str]) -> str:
+        return "Dependency cycle between ids {}".format(
+            ", ".join("'{}'".format(uid) for uid in uids)
+        )
+
+    def _load_anchor(self, d: 'EntityDef') -> Entity:
+        return Anchor(d.uid, d.rank, tuple(d.definition["coords"]))
+
+    def _load_line(self, d: 'EntityDef') -> Entity:
+        # TODO default_child_velocity
+        e = d.definition
+        p1 = self.get_by_id(e["parents"][0])
+        p2 = self.get_by_id(e["parents"][1])
+        return Line(d.uid, d.rank, [p1, p2])
+
+    def _load_polyline(self, d: 'EntityDef') -> Entity:
+        # TODO default_child_velocity
+        e = d.definition
+        p1 = self.get_by_id(e["parents"][0])
+        p2 = self.get_by_id(e["parents"][1])
+        midpoints = e.get("midpoints", [])
+        return PolyLine(d.uid, d.rank, [p1, p2], midpoints)
+
+    def _load_circle(self, d: 'EntityDef') -> Entity:
+        # TODO default_child_velocity
+        e = d.definition
+        p1 = self.get_by_id(e["centre"])
+        return Circle(d.uid, d.rank, p1, e["radius"], e["orientation"])
+
+    def _load_slider(self, d: 'EntityDef') -> Entity:
+        e = d.definition
+        par = self.get_by_id(e["parent"])
+        return Slider(d.uid, d.rank, par,
+                      e.get("position", 0.0),
+                      e.get("velocity", 0.0),
+                      e.get("loop", False),
+                      e.get("inherit_velocity", 0.0),
+                      self._load_tempo(e))
+
+    def _load_tempo(self, e: dict) -> Tempo:
+        return Tempo.from_dict(e["tempo"]) if "tempo" in e else None
+
+    def _load_intersection(self, d: 'EntityDef') -> Entity:
+        e = d.definition
+        p1 = self.get_by_id(e["parents"][0])
+        p2 = self.get_by_id(e["parents"][1])
+        return Intersection(d.uid, d.rank, [p1, p2])
+
+    def _load_group(self, d: 'EntityDef') -> Entity:
+        e = d.definition
+        return Group(d.uid, d.rank,
+                     [self.get_by_id(m) for m in e["members"]])
+
+    def _load_distance(self, d: 'EntityDef') -> Entity:
+        e = d.definition
+        p1 = self.get_by_id(e["parents"][0])
+        p2 = self.get_by_id(e["parents"][1])
+        return Distance(d.uid, d.rank, [p1, p2])
+
+    def _load_angle(self, d: 'EntityDef') -> Entity:
+        e = d.definition
+        p1 = self.get_by_id(e["parents"][0])
+        p2 = self.get_by_id(e["parents"][1])
+        return Angle(d.uid, d.rank, [p1, p2])
+
+    def _connect(self, entity: Control, e: dict):
+        for connection, input_id in e.get("connections", {}).items():
+            entity.add_input(connection, self.get_by_id(input_id))
+        entity.msg.set_data(e.get("data", []))
+
+    def _load_control(self, d: 'EntityDef') -> Entity:
+        e = d.definition
+        entity = Control(d.uid, d.rank,
+                         e["coords"][0], e["coords"][1],
+                         e["path"].encode())
+        self._connect(entity, e)
+        return entity
+
+    def _load_bumper(self, d: 'EntityDef') -> Entity:
+        e = d.definition
+        p1 = self.get_by_id(e["parent"])
+        c1 = self.get_by_id(e["collides"])
+        inherit_vel: bool = False
+        vel: float = 0.0
+        if type(e["velocity"]) == str and e["velocity"] == "inherit":
+            inherit_vel = True
+        else:
+            vel = float(e["velocity"])
+        entity = Bumper(d.uid, d.rank,
+                        p1,
+                        e["progression"], vel,
+                        c1,
+                        e["path"].encode(),
+                        e.get("loop", False),
+                        inherit_vel,
+                        self._load_tempo(e))
+        self._connect(entity, e)
+        return entity
+
+    def save_to_dict(self) -> dict:
+        """ The scene as a dict of ranked layers, in the form
+        `load_from_dict` takes
+        """
+        layers = {}
+        for d in self.iter_definitions():
+            layers.setdefault(d.pop("rank"), []).append(d)
+        return {"layers": [{"rank": rank, "children": children}
+                           for rank, children in layers.items()]}
+
+    def iter_definitions(self):
+        """ Yield a definition (including its `rank`) for every entity,
+        in rank order
+        """
+        for entity in self.sort_by_rank():
+            yield self.save_entity(entity)
 
-    def save_to_dict(self) -> str:
-        """ Parse YAML and load it
+    def save_entity(self, entity: Entity) -> dict:
+        """ Definition of a single entity, including its `rank`
         """
+        d = {"entity": entity.classname, "id": entity.uid,
+             "rank": entity.rank}
+        d.update(getattr(self, SAVERS[entity.classname])(entity))
+        return d
+
+    def _save_anchor(self, e: Anchor) -> dict:
+        return {"coords": list(e.get_coords(0.0))}
+
+    def _save_line(self, e: Line) -> dict:
+        return {"parents": [p.uid for p in e._parents]}
+
+    def _save_polyline(self, e: PolyLine) -> dict:
+        return {"parents": [p.uid for p in e._parents],
+                "midpoints": [list(m) for m in e._midpoints]}
+
+    def _save_circle(self, e: Circle) -> dict:
+        return {"centre": e._centre.uid, "radius": e._radius,
+                "orientation": e._orientation}
+
+    def _save_slider(self, e: Slider) -> dict:
+        d = {"parent": e._parent.uid, "position": e._position,
+             "velocity": e.velocity, "loop": e.loop,
+             "inherit_velocity": e.inherit_velocity}
+        d.update(self._save_tempo(e))
+        return d
+
+    def _save_tempo(self, e: Slider) -> dict:
+        return {} if e.tempo is None else {"tempo": e.tempo.to_dict()}
+
+    def _save_intersection(self, e: Intersection) -> dict:
+        return {"parents": [p.uid for p in e._parents]}
+
+    def _save_group(self, e: Group) -> dict:
+        return {"members": [m.uid for m in e.members]}
+
+    _save_distance = _save_intersection
+    _save_angle = _save_intersection
+
+    def _save_connections(self, e: Control) -> dict:
+        return {"path": e.msg.get_path(0.0).decode(),
+                "data": list(e.msg.expressions),
+                "connections": {k: v.uid for k, v in e._inputs.items()}}
+
+    def _save_control(self, e: Control) -> dict:
+        d = {"coords": [e._x, e._y]}
+        d.update(self._save_connections(e))
+        return d
+
+    def _save_bumper(self, e: Bumper) -> dict:
+        d = {"parent": e._parent.uid, "progression": e._position,
+             "velocity": "inherit" if e.inherit_velocity else e.velocity,
+             "collides": e._collision_parent.uid, "loop": e.loop}
+        d.update(self._save_tempo(e))
+        d.update(self._save_connections(e))
+        return d
 
     def create_entity(self, cls, *args, **kwargs):
         """ Factory for new entites which will
@@ -0,0 +1,265 @@
+""" Sliders moving at a varying rate
+
+A slider's velocity is constant, so on its own it moves linearly in
+`t`. Its `Tempo` (if it has one) scales that velocity over time, for an
+accelerando, rubato or swing, and the slider's travel is then the
+integral of its velocity: `velocity * integral(t)`.
+
+Summing the velocity frame by frame would drift, and couldn't seek.
+Instead a tempo is piecewise linear in `t`, between breakpoints
+`(t, rate)`, and the integral up to each breakpoint is tabulated once.
+The integral at any `t` is then a bisection (O(log n)) to find its
+piece plus a quadratic within it, and exactly the same however we got
+to `t`.
+
+A tempo is defined (in a slider's or bumper's `tempo`) either by its
+breakpoints
+
+```
+    tempo: {rates: [[0, 1.0], [30, 2.0]]}
+```
+
+(holding the first rate before the first breakpoint and the last after
+the last), or by an expression in `t`, sampled every frame
+
+```
+    tempo: {expression: "1 + 0.25 * sin(4 * PI * t)", period: 0.5}
+```
+
+Given a `period` (in seconds) it repeats, so only one period is ever
+tabulated. Otherwise an expression is tabulated `CHUNK_FRAMES` at a
+time, keeping just the integral up to the start of each chunk (and the
+last few chunks used), so only seeking beyond anywhere evaluated so far
+costs more than O(log n). Sampling a chunk takes a while, so it's not
+left to the engine's tick: `prepare` samples the chunk at (and after) a
+time up front, e.g. when warming a scene, and reaching a chunk starts
+sampling the next on a background thread.
+"""
+
+from bisect import bisect_right
+from math import floor
+import threading
+
+from .clock import (
+    FRAME_RATE, FRAME_TIME, frame_number, frame_time, nearest_frame
+)
+from .osc import parse_expression
+
+CHUNK_FRAMES = 24 * 60
+""" how much of an expression which doesn't repeat is tabulated at once """
+
+CACHED_CHUNKS = 4
+""" how many such chunks are kept (they can always be sampled again) """
+
+
+class Tempo:
+    """ A rate (multiplying a slider's velocity) varying over time
+    """
+    __slots__ = ("_table", "_period", "_period_frames", "_expression",
+                 "_bases", "_chunks", "_definition", "_lock", "_prefetcher")
+
+    def __init__(self, rates: list = None, expression: str = None,
+                 period: float = None):
+        if (rates is None) == (expression is None):
+            raise ValueError("A tempo needs either rates or an expression")
+        if period is not None and period <= 0.0:
+            raise ValueError("A tempo's period must be positive")
+        self._definition = {"rates": rates, "expression": expression,
+                            "period": period}
+        self._period = period
+        self._period_frames = frame_number(period) if period else None
+        """ the period as a whole number of frames, if it is one """
+        self._expression = None
+        self._bases = [0.0]
+        """ for expressions which don't repeat, the integral up to the
+        start of each chunk tabulated so far """
+        self._chunks = {}
+        """ the most recently sampled chunks' `(rates, integrals)`;
+        replaced whole (under `_lock`) so it can be read without it """
+        self._lock = threading.Lock()
+        """ held while sampling chunks """
+        self._prefetcher = None
+        """ the thread sampling the next chunk, if any """
+        if expression is None:
+            self._table = _table(rates, period)
+            return
+        try:
+            self._expression = parse_expression(expression)
+        except Exception as ex:
+            raise ValueError("Bad tempo expression '{}': {}".format(
+                expression, ex))
+        if set(self._expression.variables()) - {"t"}:
+            raise ValueError("A tempo expression can only use t")
+        self._table = None
+        if period is not None:
+            # sampled every frame, so repeating after whole frames
+            self._period_frames = max(nearest_frame(period), 1)
+            self._period = frame_time(self._period_frames)
+            rates, integrals = self._sample(0, self._period_frames)
+            self._table = (
+                tuple(frame_time(n) for n in range(len(rates))), rates,
+                integrals)
+
+    @classmethod
+    def from_dict(cls, d: dict) -> 'Tempo':
+        return cls(d.get("rates"), d.get("expression"), d.get("period"))
+
+    def to_dict(self) -> dict:
+        return {k: v for k, v in self._definition.items() if v is not None}
+
+    def __getstate__(self) -> dict:
+        # just the definition: the lock, prefetch thread and anything
+        # sampled are rebuilt (or sampled again) as need be
+        return self._definition
+
+    def __setstate__(self, definition: dict):
+        self.__init__(**definition)
+
+    @property
+    def period(self) -> float:
+        """ How often (in seconds) it repeats, or None if it doesn't """
+        return self._period
+
+    def _sample(self, first: int, frames: int) -> tuple[tuple, tuple]:
+        """ `(rates, integrals)` of an expression at each of `frames`
+        frames (and one more) from frame `first`, integrated from there
+        """
+        rates = [float(self._expression.evaluate({"t": frame_time(n)}))
+                 for n in range(first, first + frames + 1)]
+        integrals = [0.0]
+        for k in range(frames):
+            integrals.append(integrals[-1]
+                             + (rates[k] + rates[k + 1]) / 2 / FRAME_RATE)
+        return tuple(rates), tuple(integrals)
+
+    def _chunk(self, c: int) -> tuple[tuple, tuple]:
+        """ Chunk `c` of an expression which doesn't repeat """
+        chunk = self._chunks.get(c)
+        if chunk is None:
+            with self._lock:
+                chunk = self._sampled(c)
+        return chunk
+
+    def _sampled(self, c: int) -> tuple[tuple, tuple]:
+        """ As `_chunk`, with `_lock` held, working out (once) the bases
+        of any before it
+        """
+        chunk = self._chunks.get(c)
+        if chunk is None:
+            # chunk by chunk, only keeping the total of those skipped
+            while len(self._bases) <= c:
+                k = len(self._bases) - 1
+                skipped = self._chunks.get(k)
+                if skipped is None:
+                    skipped = self._sample(k * CHUNK_FRAMES, CHUNK_FRAMES)
+                self._bases.append(self._bases[k] + skipped[1][-1])
+            chunk = self._sample(c * CHUNK_FRAMES, CHUNK_FRAMES)
+            chunks = dict(self._chunks)
+            if len(chunks) >= CACHED_CHUNKS:
+                chunks.pop(next(iter(chunks)))
+            chunks[c] = chunk
+            self._chunks = chunks
+        return chunk
+
+    def _prefetch(self, c: int):
+        """ Start sampling chunk `c` in the background, unless it's
+        already being sampled (or something is)
+        """
+        if self._prefetcher is not None and self._prefetcher.is_alive():
+            return
+        self._prefetcher = threading.Thread(target=self._chunk, args=(c,),
+                                            daemon=True)
+        self._prefetcher.start()
+
+    def prepare(self, t: float):
+        """ Sample the chunk of the expression at `t`, and the next, now
+        rather than when they're first needed
+        """
+        if self._table is None and t >= 0.0:
+            c = int(t * FRAME_RATE // CHUNK_FRAMES)
+            self._chunk(c)
+            self._chunk(c + 1)
+
+    def _wrap(self, t: float) -> tuple[int, float]:
+        """ `(repeats, t within the period)` """
+        if self._period is None or t < 0.0:
+            return (0, t)
+        n = frame_number(t)
+        if n is not None and self._period_frames is not None:
+            k, rest = divmod(n, self._period_frames)
+            return (k, frame_time(rest))
+        k = floor(t / self._period)
+        return (k, t - k * self._period)
+
+    def _locate(self, t: float) -> tuple:
+        """ `(total before, table, k, dt)`: `t` is `dt` into piece `k`
+        of `table`, the integral up to whose start is `total before`
+        """
+        repeats, t = self._wrap(t)
+        if self._table is not None:
+            table = self._table
+            total = repeats * table[2][-1] if repeats else 0.0
+            return (total, table, bisect_right(table[0], t) - 1, t)
+        # an expression which doesn't repeat, a chunk at a time
+        if t < 0.0:
+            return (0.0, (None,) + self._chunk(0), -1, t)
+        frame = t * FRAME_RATE
+        c = int(frame // CHUNK_FRAMES)
+        rates, integrals = self._chunk(c)
+        if c + 1 not in self._chunks:
+            self._prefetch(c + 1)
+        k = min(int(frame) - c * CHUNK_FRAMES, CHUNK_FRAMES - 1)
+        return (self._bases[c], (None, rates, integrals), k,
+                t - frame_time(c * CHUNK_FRAMES + k))
+
+    def rate(self, t: float) -> float:
+        """ The rate at `t` """
+        _, (times, rates, _), k, dt = self._locate(t)
+        if k < 0:
+            return rates[0]
+        if k >= len(rates) - 1:
+            return rates[-1]
+        span = FRAME_TIME if times is None else times[k + 1] - times[k]
+        if times is not None:
+            dt -= times[k]
+        return rates[k] + dt / span * (rates[k + 1] - rates[k])
+
+    def integral(self, t: float) -> float:
+        """ The integral of the rate from 0 to `t` """
+        total, (times, rates, integrals), k, dt = self._locate(t)
+        if k < 0:
+            return total + rates[0] * dt
+        if times is None:
+            span = FRAME_TIME
+        else:
+            dt -= times[k]
+            if k >= len(times) - 1:
+                return total + integrals[-1] + rates[-1] * dt
+            span = times[k + 1] - times[k]
+        slope = (rates[k + 1] - rates[k]) / span
+        return total + integrals[k] + rates[k] * dt + slope * dt * dt / 2
+
+
+def _table(rates: list, period: float) -> tuple[tuple, tuple, tuple]:
+    """ `(times, rates, integrals)` at each breakpoint `rates` """
+    times = [float(t) for t, _ in rates]
+    values = [float(r) for _, r in rates]
+    if not times:
+        raise ValueError("A tempo needs at least one rate")
+    if times[0] < 0.0 or any(b <= a for a, b in zip(times, times[1:])):
+        raise ValueError("A tempo's rates must be in time order, from "
+                         "t = 0")
+    if times[0] > 0.0:
+        times.insert(0, 0.0)
+        values.insert(0, values[0])
+    if period is not None:
+        if times[-1] > period:
+            raise ValueError("A tempo's rates must be within its period")
+        if times[-1] < period:
+            times.append(period)
+            values.append(values[-1])
+    integrals = [0.0]
+    for k in range(len(times) - 1):
+        integrals.append(integrals[-1] + (times[k + 1] - times[k])
+                         * (values[k] + values[k + 1]) / 2)
+    return tuple(times), tuple(values), tuple(integrals)
@@ -0,0 +1,107 @@
+""" Hot-path event tracing
+
+`logging.debug` in the engine's hot paths (every tick, every packet,
+every polyline rebuilt) costs a call, a level check and often a string
+format each time, even with debug off. Tracing instead records fixed
+size events, `(event, subject, monotonic ns)`, into a ring buffer of
+integers allocated when it's switched on, so it can be left in on stage
+and switched on (and dumped) when something looks wrong.
+
+Hot paths guard each record with the module flag, so while tracing is
+off an event costs one attribute lookup:
+
+```
+    from . import trace
+
+    if trace.enabled:
+        trace.record(trace.TICK, frame)
+```
+
+An event's subject is an int: a frame number, a count, or an entity's
+index from `subject(uid)` (see `dump`, which names them again).
+
+Recording takes no lock; as long as the buffer's big enough not to
+wrap during one, a dump taken while the engine is running sees every
+event up to the moment it was taken.
+"""
+
+from array import array
+import time
+
+TICK, SEND, CULLED, TESTED, POLYLINE = range(5)
+EVENTS = ("tick", "send", "culled", "tested", "polyline")
+""" name of each event, for dumps """
+
+DEFAULT_CAPACITY = 1 << 16
+""" events kept, by default """
+
+_FIELDS = 3
+
+enabled = False
+""" are events being recorded? """
+
+_buffer = array("q")
+_capacity = 0
+_count = 0
+""" events recorded since enabled (so the next goes at `_count %
+_capacity`) """
+_subjects: dict[str, int] = {}
+_names: list[str] = []
+
+
+def enable(capacity: int = DEFAULT_CAPACITY):
+    """ Start recording (afresh) into a ring of `capacity` events """
+    global enabled, _buffer, _capacity, _count
+    enabled = False
+    _buffer = array("q", bytes(8 * _FIELDS * capacity))
+    _capacity = capacity
+    _count = 0
+    enabled = True
+
+
+def disable():
+    """ Stop recording, keeping what's been recorded for `dump` """
+    global enabled
+    enabled = False
+
+
+def subject(uid: str) -> int:
+    """ The index standing for entity `uid` in events """
+    n = _subjects.get(uid)
+    if n is None:
+        n = _subjects[uid] = len(_names)
+        _names.append(uid)
+    return n
+
+
+def record(event: int, subject: int = 0):
+    """ Record an event (only call if `enabled`) """
+    global _count
+    n = _count
+    _count = n + 1
+    i = (n % _capacity) * _FIELDS
+    _buffer[i] = event
+    _buffer[i + 1] = subject
+    _buffer[i + 2] = time.monotonic_ns()
+
+
+def events() -> list[tuple[int, int, int]]:
+    """ `(event, subject, monotonic ns)` of each event still in the
+    ring, oldest first
+    """
+    count, buffer = _count, _buffer[:]
+    first = max(count - _capacity, 0)
+    return [tuple(buffer[i:i + _FIELDS])
+            for i in ((n % _capacity) * _FIELDS
+                      for n in range(first, count))]
+
+
+def dump(out):
+    """ Write the events to text stream `out`, one per line: time (in
+    seconds, monotonic), event name and subject (an entity's uid for
+    `SEND` and `POLYLINE`)
+    """
+    for event, n, ns in events():
+        if event in (SEND, POLYLINE) and n < len(_names):
+            n = _names[n]
+        out.write("{:.6f} {} {}\n".format(ns / 1e9, EVENTS[event], n))
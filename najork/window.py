@@ -57,7 +57,9 @@ class NajorkWindow(Gtk.ApplicationWindow):
         # TODO get scene bounds
         da.set_content_width(1920)
         da.set_content_height(1280)
-        render(self.engine.get_scene(), self.engine.pos, ctx)
+        self.engine.get_scene().set_viewport((0, 0, 1920, 1280))
+        render(self.engine.get_scene(), self.engine.pos, ctx,
+               self.engine.get_frame(self.engine.pos))
         #ctx.scale(width, height)
         #ctx.set_source_rgb(0.0, 0.0, 0.0)
         #ctx.set_line_width(0.1)
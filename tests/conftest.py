@@ -7,6 +7,45 @@ from najork.scene import Scene
 from najork.config import DEFAULT_SETTINGS
 
 
+# something of everything: sliders on each kind of shape, a line hung off
+# sliders, an intersection (which falls back), bumpers crossing a line
+# both ways and one colliding with a circle (which falls back)
+MIXED = {"entities": [
+    {"entity": "anchor", "id": "a1", "coords": [0, 0]},
+    {"entity": "anchor", "id": "a2", "coords": [100, 20]},
+    {"entity": "anchor", "id": "a3", "coords": [50, -60]},
+    {"entity": "anchor", "id": "a4", "coords": [40, 80]},
+    {"entity": "line", "id": "l1", "parents": ["a1", "a2"]},
+    {"entity": "line", "id": "l2", "parents": ["a3", "a4"]},
+    {"entity": "circle", "id": "c1", "centre": "a3", "radius": 30,
+     "orientation": 0.1},
+    {"entity": "polyline", "id": "pl1", "parents": ["a4", "a2"],
+     "midpoints": [[0.1, -0.1], [0.2, 0.2], [0.2, 0.2], [0.6, -0.05]]},
+    {"entity": "slider", "id": "s1", "parent": "l1", "velocity": 0.3,
+     "loop": True},
+    {"entity": "slider", "id": "s2", "parent": "c1", "position": 0.2,
+     "velocity": -0.15, "loop": True},
+    {"entity": "slider", "id": "s3", "parent": "pl1", "position": 0.1,
+     "velocity": 0.2},
+    {"entity": "line", "id": "l3", "parents": ["s1", "s2"]},
+    {"entity": "slider", "id": "s4", "parent": "l3", "velocity": 0.4,
+     "loop": True},
+    {"entity": "intersection", "id": "i1", "parents": ["l1", "l2"]},
+    {"entity": "distance", "id": "d1", "parents": ["s4", "s3"]},
+    {"entity": "angle", "id": "g1", "parents": ["l3", "l2"]},
+    {"entity": "bumper", "id": "k1", "parent": "l1", "progression": 0.0,
+     "velocity": 0.5, "loop": True, "collides": "l2", "path": "/k1",
+     "data": ["60", "in_1"], "connections": {"in_1": "d1"}},
+    {"entity": "bumper", "id": "k2", "parent": "l1", "progression": 1.0,
+     "velocity": -0.7, "loop": True, "collides": "l2", "path": "/k2"},
+    {"entity": "bumper", "id": "k3", "parent": "l2", "progression": 0.0,
+     "velocity": 0.25, "loop": True, "collides": "c1", "path": "/k3"},
+    {"entity": "control", "id": "ct1", "coords": [0, 0], "path": "/ct1",
+     "data": ["in_1 / 10", "in_2", "t"],
+     "connections": {"in_1": "d1", "in_2": "g1"}},
+]}
+
+
 @pytest.fixture
 def s():
     """ Default, empty scene
@@ -14,6 +53,16 @@ def s():
     return Scene()
 
 
+@pytest.fixture
+def mixed(s):
+    """ A scene of something of everything (see `MIXED`)
+    """
+    s.load_from_dict(MIXED)
+    # drawing everything, so it's all evaluated
+    s.set_viewport((-1e6, -1e6, 1e6, 1e6))
+    return s
+
+
 @pytest.fixture
 def e(s):
     """ Default engine
@@ -45,7 +94,9 @@ def oscmsg():
                default=True)
 
     yield msg
-    osc.stop()
+    osc.stop_all()
+    osc.terminate_server()
+    osc.join_server()
 
 
 @pytest.fixture
@@ -73,4 +124,6 @@ def osccount():
                default=True)
 
     yield msg
-    osc.stop()
+    osc.stop_all()
+    osc.terminate_server()
+    osc.join_server()
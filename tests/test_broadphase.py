@@ -0,0 +1,130 @@
+import math
+import random
+
+import pytest
+from pytest import approx
+from shapely.geometry import LineString, MultiLineString, Point
+
+from najork.broadphase import BroadPhase, SegmentIndex, overlaps
+from najork.compiled import CompiledScene
+from najork.engine_sched import frame_events, CV_FRAME_TIME
+from najork.entities import Anchor, Bumper, Line, PolyLine
+
+
+def test_overlaps():
+    assert overlaps((0, 0, 1, 1), (0.5, 0.5, 2, 2))
+    # touching counts
+    assert overlaps((0, 0, 1, 1), (1, 0, 2, 1))
+    assert overlaps((0, 0, 1, 1), (0.2, 0.2, 0.3, 0.3))
+    assert not overlaps((0, 0, 1, 1), (1.1, 0, 2, 1))
+    assert not overlaps((0, 0, 1, 1), (0, -2, 1, -0.1))
+
+
+@pytest.mark.parametrize("uid", ["l1", "l2", "l3", "c1", "pl1"])
+def test_bounds(mixed, uid):
+    e = mixed.get_by_id(uid)
+    for t in (0.0, 1.3):
+        (mx, my), (Mx, My) = e.get_bounds(t)
+        assert (mx, my, Mx, My) == approx(e.get_impl(t).bounds)
+
+
+def test_culling_is_exact(mixed):
+    broad = BroadPhase()
+    culled = 0
+    for n in range(24 * 8):
+        t = n * CV_FRAME_TIME
+        for b in mixed.list_by_class("bumper"):
+            assert (broad.test_collision(b, t, t + CV_FRAME_TIME)
+                    == b.test_collision(t, t + CV_FRAME_TIME))
+        assert broad.tested + broad.culled == 3
+        culled += broad.culled
+    # the bumpers spend most of their time away from their colliders
+    assert culled > 24 * 8
+
+
+def test_frame_events_counts(mixed):
+    broad = BroadPhase()
+    list(frame_events(mixed, 0.5, 0.5 + CV_FRAME_TIME, broad))
+    assert broad.tested + broad.culled == 3
+
+
+def test_compiled_counts(mixed):
+    c = CompiledScene(mixed)
+    for n in range(24 * 4):
+        t = n * CV_FRAME_TIME
+        list(c.frame_events(t, t + CV_FRAME_TIME))
+        assert c.broad_phase.tested + c.broad_phase.culled == 3
+
+
+def stave(n=300, seed=1):
+    """ A long wiggly hand-drawn line, in PolyLine's unit coords """
+    rnd = random.Random(seed)
+    return [[(i + 1) / (n + 1),
+             0.05 * math.sin(i / 5) + rnd.uniform(-0.01, 0.01)]
+            for i in range(n)]
+
+
+@pytest.mark.parametrize("closed", [False, True])
+def test_segment_runs(closed):
+    coords = [(x * 2.0, 20 * math.sin(x / 7)) for x in range(200)]
+    if closed:
+        coords.append(coords[0])
+    line = LineString(coords)
+    index = SegmentIndex(coords)
+    rnd = random.Random(2)
+    for _ in range(500):
+        x, y = rnd.uniform(-10, 410), rnd.uniform(-30, 30)
+        start = (x, y)
+        end = (x + rnd.uniform(-5, 5), y + rnd.uniform(-30, 30))
+        traj = LineString((start, end))
+        runs = index.runs((min(x, end[0]), min(y, end[1]),
+                           max(x, end[0]), max(y, end[1])))
+        if not runs:
+            assert not line.intersects(traj)
+            continue
+        local = MultiLineString(runs)
+        assert traj.crosses(local) == traj.crosses(line)
+        assert local.contains(Point(start)) == line.contains(Point(start))
+    # a vertex, a segment's interior, and one end
+    for p in (coords[50], (101.0, 20 * math.sin(50.5 / 7)), coords[0]):
+        runs = index.runs((*p, *p))
+        assert (MultiLineString(runs).contains(Point(p))
+                == line.contains(Point(p)))
+
+
+def test_static_polyline(s):
+    p1 = s.create_entity(Anchor, (0.0, 0.0))
+    p2 = s.create_entity(Anchor, (1000.0, 0.0))
+    pl = s.create_entity(PolyLine, (p1, p2), stave())
+    impl = pl.get_impl(0.0)
+    assert pl.get_impl(5.0) is impl
+    # a small box only sees a few segments
+    local = pl.collider(0.0, (500.0, -100.0, 502.0, 100.0))
+    assert len(local.coords) < 6
+    assert pl.collider(0.0, (500.0, 100.0, 502.0, 110.0)) is None
+    # moving an anchor rebuilds it
+    p2.set_coords((0.0, 1000.0))
+    assert pl.get_impl(0.0) is not impl
+    assert pl.get_bounds(0.0)[1][1] == approx(1000.0)
+
+
+def test_stave_collisions(s):
+    p1 = s.create_entity(Anchor, (0.0, 0.0))
+    p2 = s.create_entity(Anchor, (1000.0, 0.0))
+    staff = s.create_entity(PolyLine, (p1, p2), stave())
+    for n in range(8):
+        top = s.create_entity(Anchor, (60.0 + 120 * n, -120.0))
+        bottom = s.create_entity(Anchor, (60.0 + 120 * n, 120.0))
+        track = s.create_entity(Line, (top, bottom))
+        s.create_entity(Bumper, track, 0.1 * n, 0.3, staff, b"/b",
+                        loop=True, inherit_velocity=False)
+    hits = 0
+    for n in range(24 * 8):
+        t, t_next = n * CV_FRAME_TIME, (n + 1) * CV_FRAME_TIME
+        for b in s.list_by_class("bumper"):
+            start, end = b.get_coords(t), b.get_coords(t_next)
+            expected = b._collides(staff.build_impl(t), t, t_next,
+                                   start, end)
+            assert b.test_collision(t, t_next) == expected
+            hits += expected
+    assert hits >= 8
@@ -0,0 +1,88 @@
+from fractions import Fraction
+
+import pytest
+
+from najork.clock import (
+    FRAME_RATE, FRAME_TIME, after, frame_number, frame_time, turns
+)
+from najork.compiled import CompiledScene
+from najork.config import DEFAULT_SETTINGS
+from najork.engine_sched import Engine
+from najork.entities import (
+    Anchor, Line, Circle, Slider, Distance, Control
+)
+
+WEEK = 7 * 24 * 60 * 60
+
+
+def test_frames():
+    for n in (0, 1, 23, 24, 1000003, WEEK * FRAME_RATE + 5):
+        assert frame_number(frame_time(n)) == n
+        assert frame_number(n * FRAME_TIME) == n
+        assert after(frame_time(n)) == frame_time(n + 1)
+        assert after(frame_time(n), 10) == frame_time(n + 10)
+    assert frame_number(0.01) is None
+    assert after(0.01) == 0.01 + FRAME_TIME
+
+
+@pytest.mark.parametrize("velocity", [0.3, -0.7, 1 / 3, 2.5])
+def test_turns_exact(velocity):
+    n = 4 * WEEK * FRAME_RATE + 17
+    t = frame_time(n)
+    whole, phase = turns(0.25, velocity, t)
+    v = Fraction(velocity).limit_denominator(1000)
+    exact = Fraction(1, 4) + v * n / FRAME_RATE
+    assert whole == exact // 1
+    assert phase == pytest.approx(float(exact % 1), abs=1e-15)
+    if v.denominator != 1:
+        # where plain floats have drifted
+        assert ((0.25 + velocity * t) % 1.0
+                != pytest.approx(float(exact % 1), abs=1e-12))
+
+
+def test_turns_inexact():
+    # not a simple fraction, or not on a frame: as before
+    assert turns(0.25, 0.123456789123, 2.0) == divmod(
+        0.25 + 0.123456789123 * 2.0, 1)
+    assert turns(0.25, 0.3, 0.01) == divmod(0.25 + 0.3 * 0.01, 1)
+
+
+def test_engine_clock(s):
+    eng = Engine(s, DEFAULT_SETTINGS)
+    try:
+        eng.pos = WEEK
+        assert eng.frame == WEEK * FRAME_RATE
+        for _ in range(FRAME_RATE):
+            eng.tick()
+        # no drift
+        assert eng.pos == WEEK + 1.0
+        # seeks snap to frames
+        eng.pos = 1.01
+        assert eng.frame == FRAME_RATE
+    finally:
+        eng.shutdown()
+
+
+def test_compiled_agrees(s):
+    p1 = s.create_entity(Anchor, (0.0, 0.0))
+    p2 = s.create_entity(Anchor, (100.0, 50.0))
+    l1 = s.create_entity(Line, (p1, p2))
+    c1 = s.create_entity(Circle, p1, 20.0, 0.1)
+    sliders = [s.create_entity(Slider, l1, 0.1, 0.3, True, False),
+               s.create_entity(Slider, c1, 0.6, -0.7, True, False),
+               s.create_entity(Slider, l1, 0.2, 0.123456789123, True, False)]
+    # sending a distance to each, so they're all evaluated
+    ctl = s.create_entity(Control, 0.0, 0.0, b"/ctl")
+    for n, sl in enumerate(sliders):
+        ctl.add_input(f"in_{n}", s.create_entity(Distance, (p1, sl)))
+    tick = s.compile_tick(cache_dir=None)
+    compiled = CompiledScene(s)
+    for n in (5, WEEK * FRAME_RATE + 5):
+        t = frame_time(n)
+        coords = tick(t, after(t))[0]
+        frame = compiled.evaluate(t)
+        for sl in sliders:
+            assert coords[tick.points[sl.uid]] == pytest.approx(
+                sl.get_coords(t), abs=1e-9)
+            assert frame.coords(sl.uid) == pytest.approx(
+                sl.get_coords(t), abs=1e-9)
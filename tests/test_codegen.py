@@ -0,0 +1,80 @@
+import math
+
+from pytest import approx
+
+from najork.codegen import compile_tick
+from najork.engine_sched import frame_events, CV_FRAME_TIME
+from najork.loader import load_scene_file
+
+
+def test_matches_entities(mixed):
+    tick = mixed.compile_tick(cache_dir=None)
+    for n in range(24 * 8):
+        t = n * CV_FRAME_TIME
+        coords, values, collisions = tick(t, t + CV_FRAME_TIME)
+        for uid, i in tick.points.items():
+            assert coords[i] == approx(mixed.get_by_id(uid).get_coords(t),
+                                       abs=1e-6), uid
+        for uid, i in tick.measurements.items():
+            assert values[i] == approx(mixed.get_by_id(uid).get_value(t),
+                                       abs=1e-9), uid
+        expected = list(frame_events(mixed, t, t + CV_FRAME_TIME))
+        actual = list(tick.frame_events(t, t + CV_FRAME_TIME))
+        assert [e[:2] for e in actual] == [e[:2] for e in expected]
+        for a, e in zip(actual, expected):
+            assert a[2] == approx(e[2])
+
+
+def test_inlined(mixed):
+    tick = mixed.compile_tick(cache_dir=None)
+    # only the bumper colliding with a circle calls back into an entity
+    assert tick.source.count("_e[") == 1
+    assert "test_collision" in tick.source
+    assert "get_coords" not in tick.source
+
+
+def test_empty_scene(s):
+    tick = s.compile_tick(cache_dir=None)
+    assert tick(0.0, CV_FRAME_TIME) == ((), (), ())
+
+
+def test_cached(mixed, tmp_path):
+    first = compile_tick(mixed, cache_dir=str(tmp_path))
+    assert len(list(tmp_path.iterdir())) == 1
+    second = compile_tick(mixed, cache_dir=str(tmp_path))
+    assert second.source == first.source
+    assert second(1.0, 1.1) == first(1.0, 1.1)
+
+
+def test_traceback_shows_source(mixed):
+    tick = mixed.compile_tick(cache_dir=None)
+    import linecache
+    filename = tick._fn.__code__.co_filename
+    assert linecache.getline(filename, 1).startswith("def tick(t, t_next)")
+
+
+def test_big_scene():
+    s = load_scene_file("tests/input/big_1.yml", cache_dir=None)
+    tick = s.compile_tick(cache_dir=None)
+    for t in (0.0, 2.5, 10.0):
+        coords, _, _ = tick(t, t + CV_FRAME_TIME)
+        for uid, i in tick.points.items():
+            assert math.dist(coords[i], s.get_by_id(uid).get_coords(t)) < 1e-6
+
+
+def test_uids_stay_in_comments(s, capsys):
+    sneaky = "a\n    print('INJECTED')"
+    s.load_from_dict({"entities": [
+        {"entity": "anchor", "id": sneaky, "coords": [0, 0]},
+        {"entity": "anchor", "id": "b\r\n_e = None", "coords": [3, 4]},
+        {"entity": "distance", "id": "d1",
+         "parents": [sneaky, "b\r\n_e = None"]},
+        {"entity": "control", "id": "ct1", "coords": [0, 0], "path": "/ct1",
+         "data": ["in_1"], "connections": {"in_1": "d1"}},
+    ]})
+    tick = s.compile_tick(cache_dir=None)
+    _, values, _ = tick(0.0, CV_FRAME_TIME)
+    assert values[tick.measurements["d1"]] == approx(5.0)
+    assert "INJECTED" not in capsys.readouterr().out
+    assert all(line.lstrip().startswith("#") for line in tick.source
+               .splitlines() if "INJECTED" in line or "_e = None" in line)
@@ -0,0 +1,129 @@
+import time
+
+import pytest
+
+from najork.clock import frame_number
+from najork.collision import CollisionState
+from najork.config import DEFAULT_SETTINGS
+from najork.engine_sched import Engine, CV_FRAME_TIME
+from najork.entities import Anchor, Line, Bumper
+from najork.offline import evaluate, evaluate_parallel
+
+
+IS_CONTROL = "c1".__eq__
+
+
+def frames(hits):
+    """ Synthetic history: bumper `b1` hits on frames in `hits`, and
+    control `c1` sends every frame
+    """
+    def history(t):
+        events = [("c1", b"/c", [])]
+        if round(t / CV_FRAME_TIME) in hits:
+            events.append(("b1", b"/b", []))
+        return events
+    return history
+
+
+def fired(state, history, first, last):
+    return [n for n in range(first, last + 1)
+            for uid, _, _ in state.filter(n * CV_FRAME_TIME,
+                                           history(n * CV_FRAME_TIME),
+                                           history)
+            if uid == "b1"]
+
+
+def test_edge_triggered():
+    history = frames({3, 4, 5, 8, 9, 12})
+    state = CollisionState(IS_CONTROL, 1, CV_FRAME_TIME)
+    assert fired(state, history, 0, 15) == [3, 8, 12]
+
+
+def test_rearm_hysteresis():
+    history = frames({3, 4, 5, 8, 9, 12})
+    assert fired(CollisionState(IS_CONTROL, 2, CV_FRAME_TIME),
+                 history, 0, 15) == [3, 8, 12]
+    assert fired(CollisionState(IS_CONTROL, 3, CV_FRAME_TIME),
+                 history, 0, 15) == [3]
+    assert fired(CollisionState(IS_CONTROL, 0, CV_FRAME_TIME),
+                 history, 0, 15) == [3, 4, 5, 8, 9, 12]
+
+
+def test_controls_untouched():
+    state = CollisionState(IS_CONTROL, 1, CV_FRAME_TIME)
+    history = frames(set())
+    for n in range(5):
+        t = n * CV_FRAME_TIME
+        assert state.filter(t, history(t), history) == [("c1", b"/c", [])]
+
+
+def test_seek_rebuilds():
+    history = frames({3, 4, 5, 8, 9, 12})
+    state = CollisionState(IS_CONTROL, 1, CV_FRAME_TIME)
+    assert fired(state, history, 0, 3) == [3]
+    # jump into the middle of a contact, and then back to before it
+    assert fired(state, history, 9, 10) == []
+    assert fired(state, history, 2, 4) == [3]
+
+
+@pytest.fixture
+def resting(s):
+    """ A bumper sat still right on a line """
+    p1 = s.create_entity(Anchor, (0.0, 0.0))
+    p2 = s.create_entity(Anchor, (1.0, 0.0))
+    l1 = s.create_entity(Line, (p1, p2))
+    p3 = s.create_entity(Anchor, (0.5, 1.0))
+    p4 = s.create_entity(Anchor, (0.5, -1.0))
+    l2 = s.create_entity(Line, (p3, p4))
+    s.create_entity(Bumper, l1, 0.5, 0.0, l2, b"/rest",
+                    loop=False, inherit_velocity=False)
+    return s
+
+
+def test_resting_bumper(resting):
+    assert len(list(evaluate(resting, 0.0, 2.0, rearm_frames=0))) == 48
+    # already touching just before we start, so never fires
+    assert list(evaluate(resting, 0.0, 2.0)) == []
+
+
+def test_resting_bumper_engine(resting, osccount):
+    eng = Engine(resting, DEFAULT_SETTINGS)
+    try:
+        eng.start()
+        time.sleep(0.5)
+        eng.pause()
+        assert osccount["count"] == 0
+    finally:
+        eng.shutdown()
+
+
+def test_parallel_matches_serial(resting):
+    # plus one that loops round crossing the same line
+    l1, l2 = resting.list_by_class("line")
+    resting.create_entity(Bumper, l1, 0.0, 0.9, l2, b"/cross",
+                          loop=True, inherit_velocity=False)
+    serial = list(evaluate(resting, 0.0, 10.0))
+    assert len(serial) == 9
+    assert all(e.path == b"/cross" for e in serial)
+    parallel = list(evaluate_parallel(resting.save_to_dict(), 0.0, 10.0,
+                                      jobs=2, shard_frames=7))
+    assert parallel == serial
+
+
+def test_parallel_contact_across_shards(s):
+    # a bumper sliding along a line, in contact from frame 73 to 143,
+    # so through several shard boundaries
+    p1 = s.create_entity(Anchor, (0.0, 0.0))
+    p2 = s.create_entity(Anchor, (1.0, 0.0))
+    l1 = s.create_entity(Line, (p1, p2))
+    p3 = s.create_entity(Anchor, (0.3, 0.0))
+    p4 = s.create_entity(Anchor, (0.6, 0.0))
+    l2 = s.create_entity(Line, (p3, p4))
+    s.create_entity(Bumper, l1, 0.0, 0.1, l2, b"/slide",
+                    loop=True, inherit_velocity=False)
+    serial = list(evaluate(s, 0.0, 12.0))
+    assert [frame_number(e.t) for e in serial] == [73]
+    for shard_frames in (25, 74):
+        parallel = list(evaluate_parallel(s.save_to_dict(), 0.0, 12.0,
+                                          jobs=2, shard_frames=shard_frames))
+        assert parallel == serial
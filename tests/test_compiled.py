@@ -0,0 +1,77 @@
+import math
+
+import pytest
+from pytest import approx
+
+from najork.compiled import CompiledScene
+from najork.engine_sched import frame_events, CV_FRAME_TIME
+from najork.entities import Intersection
+from najork.loader import load_scene_file
+
+
+@pytest.mark.parametrize("t", [0.0, 0.3, 1.7, 4.99, 12.34])
+def test_matches_entities(mixed, t):
+    c = CompiledScene(mixed)
+    frame = c.evaluate(t)
+    for uid in c.points:
+        assert frame.coords(uid) == approx(
+            mixed.get_by_id(uid).get_coords(t), abs=1e-6
+        ), uid
+    for uid in c.measurements:
+        assert frame.value(uid) == approx(
+            mixed.get_by_id(uid).get_value(t), abs=1e-9
+        ), uid
+
+
+def test_fallbacks(mixed):
+    c = CompiledScene(mixed)
+    assert [e.uid for r in c._ranks for _, e, _ in r.fallback] == ["i1"]
+    assert [b.uid for _, b in c._bumper_fallback] == ["k3"]
+
+
+def test_frame_events_match(mixed):
+    c = CompiledScene(mixed)
+    bumps = 0
+    for n in range(24 * 8):
+        t = n * CV_FRAME_TIME
+        expected = list(frame_events(mixed, t, t + CV_FRAME_TIME))
+        actual = list(c.frame_events(t, t + CV_FRAME_TIME))
+        assert [e[:2] for e in actual] == [e[:2] for e in expected]
+        for a, e in zip(actual, expected):
+            assert a[2] == approx(e[2])
+        bumps += len(actual) - 1
+    # k1 and k2 each cross l2 a few times, k3 passes through c1
+    assert bumps > 8
+
+
+def test_big_scene(s):
+    s = load_scene_file("tests/input/big_1.yml", cache_dir=None)
+    # drawing everything, so it's all evaluated
+    s.set_viewport((-1e6, -1e6, 1e6, 1e6))
+    c = CompiledScene(s)
+    for t in (0.0, 2.5, 10.0):
+        frame = c.evaluate(t)
+        for uid in c.points:
+            assert math.dist(frame.coords(uid),
+                             s.get_by_id(uid).get_coords(t)) < 1e-6
+
+
+def test_only_live(s):
+    from test_scene import LIVE
+    s.load_from_dict(LIVE)
+    # construction geometry nothing needs, where l1 crosses l2
+    i1 = s.create_entity(Intersection, (s.get_by_id("l1"),
+                                        s.get_by_id("l2")))
+    c = CompiledScene(s)
+    frame = c.evaluate(1.0)
+    assert "s1" in frame and i1.uid not in frame
+    # moving the viewport over it needs no recompiling
+    s.set_viewport((40, -10, 60, 10))
+    frame = c.evaluate(1.0)
+    assert frame.coords(i1.uid) == approx((50.0, 0.0))
+    s.set_viewport(None)
+    assert i1.uid not in c.evaluate(1.0)
+    # events alone need nothing but the sinks, wherever the viewport is
+    s.set_viewport((450, 450, 600, 600))
+    tick = s.compile_tick(cache_dir=None)
+    assert "s2" not in tick.points and "d2" not in tick.measurements
@@ -0,0 +1,105 @@
+import pytest
+from pytest import approx
+
+from najork.compiled import CompiledScene
+from najork.cse import shared
+from najork.engine_sched import frame_events, CV_FRAME_TIME
+
+# a motif repeated: the second copy built again from scratch (even its
+# anchors), bar the circle's radius and one slider's velocity
+REPEATED = {"entities": [
+    {"entity": "anchor", "id": "a1", "coords": [0, 0]},
+    {"entity": "anchor", "id": "a2", "coords": [100, 20]},
+    {"entity": "anchor", "id": "b1", "coords": [0, 0]},
+    {"entity": "anchor", "id": "b2", "coords": [100, 20]},
+    {"entity": "anchor", "id": "a3", "coords": [50, -60]},
+    {"entity": "anchor", "id": "a4", "coords": [40, 80]},
+    {"entity": "line", "id": "l1", "parents": ["a1", "a2"]},
+    {"entity": "line", "id": "l2", "parents": ["b1", "b2"]},
+    {"entity": "line", "id": "l3", "parents": ["a3", "a4"]},
+    {"entity": "circle", "id": "c1", "centre": "a1", "radius": 30,
+     "orientation": 0.1},
+    {"entity": "circle", "id": "c2", "centre": "b1", "radius": 30,
+     "orientation": 0.1},
+    {"entity": "circle", "id": "c3", "centre": "a1", "radius": 40,
+     "orientation": 0.1},
+    {"entity": "slider", "id": "s1", "parent": "l1", "velocity": 0.3,
+     "loop": True},
+    {"entity": "slider", "id": "s2", "parent": "l2", "velocity": 0.3,
+     "loop": True},
+    {"entity": "slider", "id": "s3", "parent": "l1", "velocity": 0.35,
+     "loop": True},
+    {"entity": "slider", "id": "s4", "parent": "c1", "velocity": -0.15,
+     "loop": True},
+    {"entity": "slider", "id": "s5", "parent": "c2", "velocity": -0.15,
+     "loop": True},
+    {"entity": "slider", "id": "s6", "parent": "c3", "velocity": -0.15,
+     "loop": True},
+    {"entity": "distance", "id": "d1", "parents": ["s1", "s4"]},
+    {"entity": "distance", "id": "d2", "parents": ["s2", "s5"]},
+    {"entity": "intersection", "id": "i1", "parents": ["l1", "l3"]},
+    {"entity": "intersection", "id": "i2", "parents": ["l2", "l3"]},
+    {"entity": "bumper", "id": "k1", "parent": "l1", "progression": 0.0,
+     "velocity": 0.3, "loop": True, "collides": "l3", "path": "/k1",
+     "data": ["in_1"], "connections": {"in_1": "d2"}},
+    {"entity": "bumper", "id": "k2", "parent": "l2", "progression": 0.0,
+     "velocity": 0.3, "loop": True, "collides": "l3", "path": "/k2"},
+    {"entity": "control", "id": "ct1", "coords": [0, 0], "path": "/ct1",
+     "data": ["in_1", "in_2"], "connections": {"in_1": "d1", "in_2": "d2"}},
+]}
+
+COPIES = {"b1": "a1", "b2": "a2", "l2": "l1", "c2": "c1", "s2": "s1",
+          "s5": "s4", "d2": "d1", "i2": "i1", "k1": "s1", "k2": "s1"}
+
+
+@pytest.fixture
+def repeated(s):
+    s.load_from_dict(REPEATED)
+    s.set_viewport((-1e6, -1e6, 1e6, 1e6))
+    return s
+
+
+def test_shared(repeated):
+    rep = shared(repeated.sort_by_rank())
+    assert {uid: r for uid, r in rep.items() if uid != r} == COPIES
+
+
+def test_compiled(repeated):
+    c = CompiledScene(repeated)
+    for copy, original in COPIES.items():
+        if original in c.points:
+            assert c.points[copy] == c.points[original]
+    assert c.measurements["d2"] == c.measurements["d1"]
+    assert len(c.positions(0.0)) == len(set(c.points.values()))
+    # k2 just copies k1's collisions
+    assert c._bumper_copies.tolist() == [[c.bumpers["k2"], c.bumpers["k1"]]]
+    for t in (0.0, 0.7, 3.3):
+        frame = c.evaluate(t)
+        for uid in c.points:
+            assert frame.coords(uid) == approx(
+                repeated.get_by_id(uid).get_coords(t), abs=1e-6), uid
+        for uid in c.measurements:
+            assert frame.value(uid) == approx(
+                repeated.get_by_id(uid).get_value(t), abs=1e-9), uid
+
+
+def test_generated(repeated):
+    tick = repeated.compile_tick(cache_dir=None)
+    assert "# 's2' " not in tick.source and "# 'd2' " not in tick.source
+    assert "c1 = c0" in tick.source
+    hits = 0
+    for n in range(24 * 4):
+        t = n * CV_FRAME_TIME
+        coords, values, _ = tick(t, t + CV_FRAME_TIME)
+        assert len(coords) == len(set(tick.points.values()))
+        for uid, i in tick.points.items():
+            assert coords[i] == approx(
+                repeated.get_by_id(uid).get_coords(t), abs=1e-6), uid
+        for uid, i in tick.measurements.items():
+            assert values[i] == approx(
+                repeated.get_by_id(uid).get_value(t), abs=1e-9), uid
+        expected = list(frame_events(repeated, t, t + CV_FRAME_TIME))
+        actual = list(tick.frame_events(t, t + CV_FRAME_TIME))
+        assert [e[:2] for e in actual] == [e[:2] for e in expected]
+        hits += len(actual) - 1
+    assert hits > 0
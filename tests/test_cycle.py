@@ -0,0 +1,114 @@
+import copy
+import math
+import time
+
+from fractions import Fraction
+
+import pytest
+from pytest import approx
+
+from najork.config import DEFAULT_SETTINGS
+from najork.cycle import CycleCache, period, cycle_frames
+from najork.engine_sched import Engine, frame_events, CV_FRAME_TIME
+from najork.entities import Anchor, Line, Slider, Control
+from najork.scene import Scene
+
+from conftest import MIXED
+
+
+def looping(scene_def):
+    """ `scene_def` with every slider looping and no data using `t` """
+    scene_def = copy.deepcopy(scene_def)
+    for e in scene_def["entities"]:
+        if e["entity"] in ("slider", "bumper"):
+            e["loop"] = True
+        if "data" in e:
+            e["data"] = [d for d in e["data"] if d != "t"]
+    return scene_def
+
+
+@pytest.fixture
+def periodic(s):
+    s.load_from_dict(looping(MIXED))
+    return s
+
+
+def add_slider(s, velocity, loop=True):
+    a1 = s.create_entity(Anchor, (0, 0))
+    a2 = s.create_entity(Anchor, (10, 0))
+    line = s.create_entity(Line, (a1, a2))
+    return s.create_entity(Slider, line, 0.0, velocity, loop, False)
+
+
+def test_period(s):
+    assert period(s) == 0
+    assert cycle_frames(s) == 1
+    add_slider(s, 0.25)
+    add_slider(s, -0.1)
+    assert period(s) == 20
+    add_slider(s, 1 / 3)
+    assert period(s) == 60
+    assert cycle_frames(s) == 60 * 24
+    add_slider(s, 0.0, loop=False)
+    assert period(s) == 60
+
+
+def test_period_frames(s):
+    # 0.3 loops every 10/3s, which is 80 frames
+    add_slider(s, 0.3)
+    assert period(s) == Fraction(10, 3)
+    assert cycle_frames(s) == 80
+    # 0.7 loops every 10/7s, which is no whole number of frames
+    add_slider(s, 0.7)
+    assert period(s) == 10
+    assert cycle_frames(s) == 240
+
+
+def test_aperiodic(s):
+    add_slider(s, math.pi / 10)
+    assert period(s) is None
+    # clamps, and data using `t`, both make MIXED aperiodic
+    s2 = Scene()
+    s2.load_from_dict(MIXED)
+    assert period(s2) is None
+
+
+def test_replay_matches(periodic):
+    frames = cycle_frames(periodic)
+    assert frames == 20 * 24
+    cache = CycleCache(periodic, frames)
+    bumps = 0
+    for n in range(2 * frames + 10):
+        t = n * CV_FRAME_TIME
+        expected = list(frame_events(periodic, t, t + CV_FRAME_TIME))
+        actual = list(cache.frame_events(t, t + CV_FRAME_TIME))
+        assert [e[:2] for e in actual] == [e[:2] for e in expected], t
+        for a, e in zip(actual, expected):
+            assert a[2] == approx(e[2])
+        bumps += len(actual) - 1
+    assert cache.replayed == frames + 10
+    assert bumps > 0
+
+
+def test_off_grid(periodic):
+    cache = CycleCache(periodic, cycle_frames(periodic))
+    t = 0.01
+    assert list(cache.frame_events(t, t + CV_FRAME_TIME))
+    assert cache._cycle == [None] * cache.frames
+
+
+def test_engine_cache_cycle(s, osccount):
+    # round the loop every half second
+    add_slider(s, 2.0)
+    s.create_entity(Control, 0.0, 0.0, b"/ctl")
+    eng = Engine(s, DEFAULT_SETTINGS, cache_cycle=True)
+    try:
+        assert eng._program.frames == 12
+        eng.start()
+        time.sleep(1.0)
+        eng.pause()
+        assert eng._program.replayed > 6
+        assert osccount["path"] == b"/ctl"
+        assert osccount["count"] == approx(24, abs=3)
+    finally:
+        eng.shutdown()
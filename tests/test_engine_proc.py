@@ -0,0 +1,112 @@
+import time
+
+import pytest
+from pytest import approx
+
+from najork.clock import after
+from najork.config import DEFAULT_SETTINGS
+from najork.engine_proc import EngineProcess, FrameRing
+from najork.entities import Control
+from najork.scene import Scene
+
+
+def wait_for(condition, timeout=10.0):
+    """ Give the engine process a chance to catch up """
+    end = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < end, "timed out"
+        time.sleep(0.02)
+
+
+@pytest.fixture
+def ep(mixed):
+    eng = EngineProcess(mixed, DEFAULT_SETTINGS)
+    yield eng
+    eng.shutdown()
+
+
+def test_frame_ring():
+    ring = FrameRing(["a", "b"], ["k"])
+    assert ring.latest() is None
+    for seq in range(20):
+        ring.write(seq, seq / 10, [(seq, 1.0), (2.0, -seq)], [seq % 2])
+    frame = ring.latest()
+    assert frame.t == approx(1.9)
+    assert frame.coords("a") == (19.0, 1.0)
+    assert frame.coords("b") == (2.0, -19.0)
+    assert frame.collides("k")
+    # a frame held past close is fine, and so is dropping it after
+    ring.close(unlink=True)
+    assert frame.coords("a") == (19.0, 1.0)
+    del frame
+
+
+def test_published(mixed, ep):
+    wait_for(lambda: ep.get_frame() is not None)
+    assert ep.get_scene() is mixed
+    assert not ep.running
+    frame = ep.get_frame()
+    assert frame.t == 0.0
+    for uid in ("a1", "s1", "s2", "s3", "s4", "i1", "k1"):
+        assert frame.coords(uid) == approx(
+            mixed.get_by_id(uid).get_coords(0.0), abs=1e-6
+        ), uid
+
+
+def test_transport(mixed, ep):
+    ep.start()
+    wait_for(lambda: ep.pos > 0.3)
+    assert ep.running
+    frame = ep.get_frame()
+    assert frame.coords("s4") == approx(
+        mixed.get_by_id("s4").get_coords(frame.t), abs=1e-6
+    )
+    ep.pause()
+    wait_for(lambda: not ep.running)
+    ep.rewind()
+    wait_for(lambda: ep.pos == 0.0)
+    wait_for(lambda: ep.get_frame().t == 0.0)
+    ep.pos = 2.0
+    wait_for(lambda: ep.get_frame().t == 2.0)
+    assert ep.get_frame().coords("s1") == approx(
+        mixed.get_by_id("s1").get_coords(2.0), abs=1e-6
+    )
+
+
+def test_published_collisions(mixed, ep):
+    # taken from the events the engine sent while running, else worked
+    # out afresh, but the same either way
+    ep.start()
+    end = time.monotonic() + 10.0
+    t = None
+    while t is None or t < 1.0:
+        assert time.monotonic() < end, "timed out"
+        frame = ep.get_frame()
+        if frame is not None and frame.t != t:
+            t = frame.t
+            for b in mixed.list_by_class("bumper"):
+                assert frame.collides(b.uid) == b.test_collision(
+                    t, after(t)), (b.uid, t)
+        time.sleep(0.01)
+    ep.pause()
+
+
+def test_swap_scene(mixed, ep, oscmsg):
+    wait_for(lambda: ep.get_frame() is not None)
+    s2 = Scene()
+    s2.create_entity(Control, 0.0, 0.0, b"/new")
+    ep.swap_scene(s2)
+    # still drawing the old scene until the engine's playing the new one
+    wait_for(lambda: ep.get_scene() is s2)
+    ep.start()
+    wait_for(lambda: oscmsg.get("path") == b"/new")
+
+
+def test_swap_scene_failure(mixed, ep):
+    wait_for(lambda: ep.get_frame() is not None)
+    bad = Scene()
+    bad.save_to_dict = lambda: {"entities": [{"entity": "nonsense"}]}
+    ep.swap_scene(bad)
+    wait_for(lambda: ep.get_scene() is not None and not ep._pending)
+    assert ep.get_scene() is mixed
+    assert ep.get_frame() is not None
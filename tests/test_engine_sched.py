@@ -14,3 +14,91 @@ def test_engine_timing(e):
     t = e.pos
     # we want tick clock to match real elapsed time
     assert t == pytest.approx(RUNTIME, abs=1E-6)
+
+
+def test_engine_swap_scene(s, e, oscmsg):
+    from najork.entities import Control
+    s.create_entity(Control, 0.0, 0.0, b"/old")
+    e.start()
+    time.sleep(0.2)
+    assert oscmsg["path"] == b"/old"
+
+    s2 = Scene()
+    s2.create_entity(Control, 0.0, 0.0, b"/new")
+    e.swap_scene(s2)
+    time.sleep(0.2)
+    e.pause()
+    assert e.get_scene() is s2
+    assert oscmsg["path"] == b"/new"
+    # playhead carried on through the swap
+    assert e.pos == pytest.approx(0.4, abs=2 * CV_FRAME_TIME)
+
+
+def test_engine_load_scene_async(s, e):
+    ready = []
+
+    def build():
+        s2 = Scene()
+        s2.load_from_dict({"layers": [{"rank": 1, "children": [
+            {"entity": "anchor", "id": "p0", "coords": [0, 0]}
+        ]}]})
+        return s2
+
+    e.load_scene_async(build, ready.append).join()
+    assert ready[0] is e.get_scene()
+    assert ready[0].get_by_id("p0").get_coords(0.0) == (0.0, 0.0)
+
+
+def test_engine_load_scene_async_failure(s, e):
+    def build():
+        raise ValueError("bad scene")
+
+    e.load_scene_async(build).join()
+    assert e.get_scene() is s
+
+
+def test_engine_compiled(s, oscmsg):
+    from najork.entities import Anchor, Distance, Control
+    p1 = s.create_entity(Anchor, (0.0, 0.0))
+    p2 = s.create_entity(Anchor, (3.0, 4.0))
+    d = s.create_entity(Distance, (p1, p2))
+    c = s.create_entity(Control, 0.0, 0.0, b"/dist")
+    c.add_input("in_1", d)
+    c.msg.set_data(["in_1"])
+
+    e = Engine(s, DEFAULT_SETTINGS, compiled=True)
+    try:
+        assert e.get_frame(0.0).value(d.uid) == pytest.approx(5.0)
+        e.start()
+        time.sleep(0.2)
+        e.pause()
+        assert oscmsg["path"] == b"/dist"
+        assert oscmsg["values"] == (pytest.approx(5.0),)
+
+        # swapping in a scene recompiles it
+        p2.set_coords((6.0, 8.0))
+        e.swap_scene(s)
+        assert e.get_frame(0.0).value(d.uid) == pytest.approx(10.0)
+    finally:
+        e.shutdown()
+
+
+def test_engine_generated(s, oscmsg):
+    from najork.entities import Anchor, Distance, Control
+    p1 = s.create_entity(Anchor, (0.0, 0.0))
+    p2 = s.create_entity(Anchor, (3.0, 4.0))
+    d = s.create_entity(Distance, (p1, p2))
+    c = s.create_entity(Control, 0.0, 0.0, b"/dist")
+    c.add_input("in_1", d)
+    c.msg.set_data(["in_1"])
+
+    e = Engine(s, DEFAULT_SETTINGS, generated=True)
+    try:
+        assert "def tick" in e._program.source
+        e.start()
+        time.sleep(0.2)
+        e.pause()
+        assert oscmsg["path"] == b"/dist"
+        assert oscmsg["values"] == (pytest.approx(5.0),)
+    finally:
+        e.shutdown()
@@ -1,12 +1,16 @@
 # import pytest
 from pytest import approx
 import logging
+from math import cos, sin, dist, pi
+
+from shapely.geometry import LineString
 
 from najork.entities import (
     Anchor, Line, PolyLine, Slider, Circle, Intersection, Distance,
-    Angle, Control, Bumper
+    Angle, Control, Bumper, CIRCLE_SAG
 )
 from najork.engine_sched import Engine, CV_FRAME_TIME
+from najork.loader import load_scene_file
 
 def test_anchor():
     p = Anchor("p1",1,(0.0, 0.0))
@@ -214,6 +218,16 @@ def test_angle():
     # 1/4 == 90deg
     assert a1.get_value(0.0) == approx(1.0/4.0)
 
+def test_angle_mixed_parents():
+    # the loader hands lines a list of parents, create_entity a tuple
+    p1 = Anchor("p1", 1, (0.0, 0.0))
+    p2 = Anchor("p2", 1, (0.0, 1.0))
+    p3 = Anchor("p3", 1, (1.0, 0.0))
+    l1 = Line("l1", 2, [p1, p2])
+    l2 = Line("l2", 2, (p1, p3))
+    assert Angle("a1", 3, (l2, l1)).get_value(0.0) == approx(0.25)
+    assert Angle("a2", 3, (l1, l2)).get_value(0.0) == approx(0.75)
+
 def test_control_simple():
     p1 = Anchor("p1", 1, (0.0, 0.0))
     p2 = Anchor("p2", 1, (1.0, 0.0))
@@ -260,6 +274,24 @@ def test_control_simple_2():
     assert c1.msg.get_data(0.0) == approx([2.0, 0.0])  # ||_
     assert c1.msg.get_data(1.0) == approx([2 * sqrt(2.0), 1.0/8.0])  # |\_
 
+def test_shared_points():
+    p1 = Anchor("p1", 1, (0.0, 0.0))
+    p2 = Anchor("p2", 1, (1.0, 0.0))
+    l1 = Line("l1", 2, (p1, p2))
+    p3 = Anchor("p3", 2, (0.0, 1.0))
+    s1 = Slider("s3", 3, l1, 0.0, 1.0, loop=False, inherit_velocity=False)
+    l2 = Line("l2", 3, (p3, p1))
+    l3 = Line("l3", 4, (p3, s1))
+    m1 = Distance("d1", 4, (p3, s1))
+    a1 = Angle("a1", 5, (l2, l3))
+    points = {}
+    assert m1.get_value(0.5, points) == approx(m1.get_value(0.5))
+    assert points == {"p3": (0.0, 1.0), "s3": approx((0.5, 0.0))}
+    # (so the slider's position is reused)
+    points["s3"] = (1.0, 0.0)
+    assert a1.get_value(0.5, points) == approx(1.0/8.0)
+    assert a1.get_bounds(0.5) == ((0.0, 0.0), approx((0.5, 1.0)))
+
 def test_control_compound():
     p1 = Anchor("p1", 1, (0.0, 0.0))
     p2 = Anchor("p2", 1, (1.0, 0.0))
@@ -319,3 +351,58 @@ def test_bumper_concrete_point_moves_surface_static():
     assert b1.test_collision(1.0, 1.0 + CV_FRAME_TIME) is False
 
 
+
+
+def test_entities_are_slotted():
+    """ Big scenes rely on entities (and their messages) having no
+    per-instance `__dict__`
+    """
+    s = load_scene_file("tests/input/big_1.yml", cache_dir=None)
+    s.add(Bumper("k", 10, s.get_by_id("l1"), 0.5, 0.1, s.get_by_id("l2"),
+                 b"/note", True, False))
+    assert len(s._registry) > 20
+    for e in s._registry.values():
+        assert not hasattr(e, "__dict__"), e.classname
+        if hasattr(e, "msg"):
+            assert not hasattr(e.msg, "__dict__")
+
+def test_intersection_order():
+    # crossing a circle twice, so take the first along the first shape
+    p1 = Anchor("p1",1,(-2.0, 0.0))
+    p2 = Anchor("p2",1,(2.0, 0.0))
+    p3 = Anchor("p3",1,(0.0, 0.0))
+    l1 = Line("l1", 2, (p1, p2))
+    c1 = Circle("c1", 2, p3, 1.0, 0.0)
+    assert Intersection("i1", 3, (l1, c1)).get_coords(0.0) == approx((-1.0, 0.0))
+    c2 = Circle("c2", 2, p3, 1.0, 0.25)
+    assert Intersection("i2", 3, (c2, l1)).get_coords(0.0) == approx((-1.0, 0.0))
+    p4 = Anchor("p4",1,(1.0, 0.0))
+    c3 = Circle("c3", 2, p4, 1.0, 0.0)
+    assert Intersection("i3", 3, (c1, c3)).get_coords(0.0) == approx(
+        (0.5, -0.866), abs=1e-3)
+
+def test_intersection_near_polygon():
+    # the true circle's crossed, rather than the polygon sliders follow,
+    # which is at most CIRCLE_SAG of the radius away (across it)
+    p0 = Anchor("p0", 1, (3.0, -2.0))
+    c1 = Circle("c1", 2, p0, 50.0, 0.0)
+    worst = 0.0
+    for k in range(90):
+        a = 2 * pi * k / 90 + 0.01
+        far = Anchor("far", 1, (3.0 + 80 * cos(a), -2.0 + 80 * sin(a)))
+        exact = Intersection("i1", 3, (Line("l1", 2, (p0, far)), c1))
+        polygon = LineString((p0.get_coords(0.0), far.get_coords(0.0))
+                             ).intersection(c1.get_impl(0.0))
+        gap = dist(exact.get_coords(0.0), polygon.coords[0])
+        assert gap <= 50.0 * CIRCLE_SAG + 1e-9
+        worst = max(worst, gap)
+    assert worst > 50.0 * CIRCLE_SAG / 2
+
+def test_circle_no_intersection():
+    p1 = Anchor("p1",1,(0.0, 0.0))
+    p2 = Anchor("p2",1,(5.0, 0.0))
+    c1 = Circle("c1", 2, p1, 1.0, 0.5)
+    c2 = Circle("c2", 2, p2, 1.0, 0.0)
+    # the zero of the first circle
+    assert Intersection("i1", 3, (c1, c2)).get_coords(0.0) == approx(
+        (-1.0, 0.0))
@@ -0,0 +1,135 @@
+import random
+
+import pytest
+
+from najork.broadphase import GridIndex, overlaps
+from najork.compiled import CompiledScene
+from najork.engine_sched import frame_events, CV_FRAME_TIME
+from najork.offline import evaluate
+from najork.parallel import ParallelScene
+from najork.scene import Scene, InputError
+
+STRINGS = 40
+
+
+def harp(separate=False):
+    """ A slider sweeping over and over across a harp's strings, hitting
+    them as a group (or with a bumper per string)
+    """
+    entities = [
+        {"entity": "anchor", "id": "left", "coords": [0, 0]},
+        {"entity": "anchor", "id": "right", "coords": [410, 0]},
+        {"entity": "line", "id": "track", "parents": ["left", "right"]},
+    ]
+    for n in range(STRINGS):
+        entities += [
+            {"entity": "anchor", "id": "top%i" % n,
+             "coords": [25 + 9 * n, -50]},
+            {"entity": "anchor", "id": "bottom%i" % n,
+             "coords": [25 + 9 * n, 50]},
+            {"entity": "line", "id": "string%i" % n,
+             "parents": ["top%i" % n, "bottom%i" % n]},
+        ]
+    bumper = {"entity": "bumper", "parent": "track", "progression": 0.0,
+              "velocity": 0.5, "loop": True, "path": "/pluck"}
+    if separate:
+        entities += [dict(bumper, id="pluck%i" % n, collides="string%i" % n,
+                          data=[str(60 + n)])
+                     for n in range(STRINGS)]
+    else:
+        entities += [
+            {"entity": "group", "id": "strings",
+             "members": ["string%i" % n for n in range(STRINGS)]},
+            dict(bumper, id="pluck", collides="strings",
+                 data=["60 + hit_index", "hit"]),
+        ]
+    return {"entities": entities}
+
+
+@pytest.fixture
+def strings(s):
+    s.load_from_dict(harp())
+    return s
+
+
+def test_grid_index():
+    rnd = random.Random(1)
+    boxes = []
+    for _ in range(200):
+        x, y = rnd.uniform(0, 1000), rnd.uniform(0, 1000)
+        boxes.append(((x, y), (x + rnd.uniform(0, 50),
+                               y + rnd.uniform(0, 300))))
+    index = GridIndex(boxes)
+    assert index.bounds[0] == (min(b[0][0] for b in boxes),
+                               min(b[0][1] for b in boxes))
+    for _ in range(100):
+        x, y = rnd.uniform(-100, 1100), rnd.uniform(-100, 1100)
+        query = (x, y, x + rnd.uniform(0, 100), y + rnd.uniform(0, 100))
+        assert index.query(query) == [
+            i for i, ((mx, my), (Mx, My)) in enumerate(boxes)
+            if overlaps((mx, my, Mx, My), query)
+        ]
+
+
+def test_load_save(strings):
+    group = strings.get_by_id("strings")
+    assert len(group.members) == STRINGS
+    assert strings.get_by_id("pluck").rank > group.rank
+    s2 = Scene()
+    s2.load_from_dict(strings.save_to_dict())
+    assert ([m.uid for m in s2.get_by_id("strings").members]
+            == [m.uid for m in group.members])
+
+
+def test_bad_group(s):
+    with pytest.raises(InputError):
+        s.load_from_dict({"entities": [
+            {"entity": "anchor", "id": "a1", "coords": [0, 0]},
+            {"entity": "group", "id": "g1", "members": ["a1"]},
+        ]})
+
+
+def test_hits(strings):
+    events = list(evaluate(strings, 0.0, 2.0))
+    # one sweep right across (and round again), plucking every string
+    assert [e.uid for e in events][:STRINGS] == [
+        "pluck/string%i" % n for n in range(STRINGS)
+    ]
+    assert [e.data for e in events][:3] == [
+        [60, b"string0"], [61, b"string1"], [62, b"string2"]
+    ]
+
+
+def test_same_as_separate(strings):
+    separate = Scene()
+    separate.load_from_dict(harp(separate=True))
+    grouped = [(e.t, e.data[0]) for e in evaluate(strings, 0.0, 4.0)]
+    assert grouped == [(e.t, e.data[0])
+                       for e in evaluate(separate, 0.0, 4.0)]
+    assert len(grouped) == 2 * STRINGS
+
+
+def compare(program, scene, frames=24 * 3):
+    hits = 0
+    for n in range(frames):
+        t = n * CV_FRAME_TIME
+        expected = list(frame_events(scene, t, t + CV_FRAME_TIME))
+        assert list(program.frame_events(t, t + CV_FRAME_TIME)) == expected
+        hits += len(expected)
+    assert hits >= STRINGS
+
+
+def test_compiled(strings):
+    compare(CompiledScene(strings), strings)
+
+
+def test_generated(strings):
+    compare(strings.compile_tick(cache_dir=None), strings)
+
+
+def test_parallel(strings):
+    p = ParallelScene(strings, 2)
+    try:
+        compare(p, strings)
+    finally:
+        p.close()
@@ -0,0 +1,44 @@
+import subprocess
+import sys
+
+import pytest
+from pytest import approx
+
+from najork.engine_sched import CV_FRAME_TIME
+from najork.headless import main, STARTUP_BUDGET
+
+
+HEAVY = ("gi", "cairo", "shapely.geometry", "jinja2", "py_expression_eval")
+
+PROBE = """
+import time
+started = time.monotonic()
+import najork.headless
+elapsed = time.monotonic() - started
+from najork.lazy import is_loaded
+print(elapsed)
+print(",".join(m for m in {heavy!r} if is_loaded(m)))
+"""
+
+
+def test_headless_import_is_light():
+    out = subprocess.run(
+        [sys.executable, "-c", PROBE.format(heavy=HEAVY)],
+        check=True, capture_output=True, text=True
+    ).stdout.splitlines()
+    assert float(out[0]) < STARTUP_BUDGET
+    assert out[1] == ""
+
+
+def test_headless_run(osccount, tmp_path, monkeypatch):
+    monkeypatch.setenv("NAJORK_CACHE_DIR", str(tmp_path))
+    # big_1 has one control, which fires every frame
+    assert main(["tests/input/big_1.yml", "--start", "1.0",
+                 "--end", "1.5"]) == 0
+    assert osccount["count"] == approx(0.5 / CV_FRAME_TIME, abs=1)
+
+
+@pytest.mark.parametrize("jobs", ["0", "-2", "two"])
+def test_bad_jobs(jobs):
+    with pytest.raises(SystemExit):
+        main(["tests/input/big_1.yml", "--jobs", jobs])
@@ -0,0 +1,149 @@
+import json
+import os
+
+import pytest
+from pytest import approx
+
+from najork.journal import Journal
+from najork.loader import load_scene_file
+from najork.scene import InputError
+
+
+@pytest.fixture
+def journal(tmp_path):
+    s = load_scene_file("tests/input/big_1.yml", cache_dir=None)
+    j = Journal(s, str(tmp_path / "scene.jsonl"))
+    j.save_snapshot()
+    yield j
+    j.close()
+
+
+def defs(scene):
+    return list(scene.iter_definitions())
+
+
+def test_save_to_dict_round_trip():
+    from najork.scene import Scene
+    s = load_scene_file("tests/input/big_1.yml", cache_dir=None)
+    d = s.save_to_dict()
+    s2 = Scene()
+    s2.load_from_dict(d)
+    assert s2.save_to_dict() == d
+    assert (s2.get_by_id("ctrl2").msg.get_data(1.0)
+            == approx(s.get_by_id("ctrl2").msg.get_data(1.0)))
+
+
+def test_snapshot_is_a_scene(journal):
+    s = load_scene_file(journal._path)
+    assert defs(s) == defs(journal.scene)
+
+
+def test_edits_are_journalled(journal):
+    size = len(open(journal._path).read())
+    journal.create({"entity": "slider", "id": "s9", "parent": "l1",
+                    "velocity": 0.5})
+    journal.move("p3", (650, 700))
+    journal.set_velocity("s9", 0.25)
+    journal.create({"entity": "anchor", "id": "p9", "coords": [1, 2]})
+    journal.delete("p9")
+    # snapshot untouched, journal has one line per edit
+    assert len(open(journal._path).read()) == size
+    assert len(open(journal._path + ".journal").readlines()) == 5
+
+    recovered = Journal.recover(journal._path)
+    assert defs(recovered.scene) == defs(journal.scene)
+    assert recovered.scene.get_by_id("s9").velocity == 0.25
+    assert recovered.scene.get_by_id("p3").get_coords(0.0) == (650, 700)
+    recovered.close()
+
+
+def test_bad_edits_are_not_journalled(journal):
+    with pytest.raises(InputError):
+        journal.delete("p0")  # circles depend on it
+    with pytest.raises(InputError):
+        journal.move("l1", (0, 0))
+    assert open(journal._path + ".journal").read() == ""
+
+
+def test_compaction(journal):
+    journal.compact_every = 3
+    for x in range(7):
+        journal.move("p0", (x, 0))
+    journal.wait()
+    # the snapshot has caught up with at least the first compaction
+    header = json.loads(open(journal._path).readline())
+    assert header["najork"]["seq"] >= 3
+    lines = open(journal._path + ".journal").readlines()
+    assert all(json.loads(op)["seq"] > header["najork"]["seq"]
+               for op in lines)
+
+    recovered = Journal.recover(journal._path)
+    assert recovered.scene.get_by_id("p0").get_coords(0.0) == (6, 0)
+    recovered.close()
+
+
+def test_compaction_before_snapshot(tmp_path):
+    from najork.scene import Scene
+    path = str(tmp_path / "scene.jsonl")
+    j = Journal(Scene(), path, compact_every=2)
+    j.create({"entity": "anchor", "id": "p0", "coords": [0, 0]})
+    j.move("p0", (3, 4))
+    j.wait()
+    assert not os.path.exists(path + ".journal.old")
+    header = json.loads(open(path).readline())
+    assert header["najork"]["seq"] == 2
+    j.close()
+    recovered = Journal.recover(path)
+    assert recovered.scene.get_by_id("p0").get_coords(0.0) == (3, 4)
+    recovered.close()
+
+
+def test_recover_without_snapshot(tmp_path):
+    path = str(tmp_path / "scene.jsonl")
+    with open(path + ".journal", "w") as out:
+        out.write(json.dumps({"op": "create", "seq": 1, "definition": {
+            "entity": "anchor", "id": "p0", "coords": [1, 2]}}) + "\n")
+    recovered = Journal.recover(path)
+    assert recovered.scene.get_by_id("p0").get_coords(0.0) == (1, 2)
+    recovered.close()
+
+
+def test_compaction_leaves_scene_alone(journal, monkeypatch):
+    # the snapshot's rebuilt from disk, not from the scene being edited
+    def busy():
+        raise AssertionError("read the live scene")
+
+    journal.move("p0", (5, 5))
+    monkeypatch.setattr(journal.scene, "iter_definitions", busy)
+    journal.compact()
+    journal.wait()
+    header = json.loads(open(journal._path).readline())
+    assert header["najork"]["seq"] == 1
+    assert open(journal._path + ".journal").read() == ""
+    recovered = Journal.recover(journal._path)
+    assert recovered.scene.get_by_id("p0").get_coords(0.0) == (5, 5)
+    recovered.close()
+
+
+def test_recover_mid_compaction(journal):
+    # as if we crashed with the journal set aside but no new snapshot
+    journal.move("p0", (1, 1))
+    journal._out.close()
+    journal._set_aside()
+    journal._out = open(journal._path + ".journal", "w")
+    journal.move("p0", (2, 2))
+    journal.set_velocity("p10", 0.5)
+    recovered = Journal.recover(journal._path)
+    assert recovered.scene.get_by_id("p0").get_coords(0.0) == (2, 2)
+    assert defs(recovered.scene) == defs(journal.scene)
+    recovered.close()
+
+
+def test_recover_torn_journal(journal):
+    journal.move("p0", (1, 1))
+    journal.close()
+    with open(journal._path + ".journal", "a") as out:
+        out.write('{"op": "move", "id": "p0", "coo')
+    recovered = Journal.recover(journal._path)
+    assert recovered.scene.get_by_id("p0").get_coords(0.0) == (1, 1)
+    recovered.close()
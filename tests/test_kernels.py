@@ -0,0 +1,123 @@
+import math
+import random
+
+import pytest
+from pytest import approx
+from shapely.geometry import LineString, Point
+
+from najork import kernels
+
+# fine enough for Shapely's circles to be near exact
+RES = 2048
+
+
+def flat(points):
+    return [v for p in sorted(points) for v in p]
+
+
+def shapely_crossings(a, b):
+    """ as flat coords (since `approx` doesn't nest) """
+    if not a.crosses(b):
+        return []
+    imp = a.intersection(b)
+    return flat((p.x, p.y) for p in getattr(imp, "geoms", [imp]))
+
+
+def random_point(rnd):
+    return (rnd.uniform(-10, 10), rnd.uniform(-10, 10))
+
+
+def test_segment_segment():
+    rnd = random.Random(1)
+    crossed = 0
+    for _ in range(500):
+        a, b, c, d = (random_point(rnd) for _ in range(4))
+        found = kernels.segment_segment(a, b, c, d)
+        assert flat(found) == approx(
+            shapely_crossings(LineString((a, b)), LineString((c, d))))
+        crossed += len(found)
+    assert crossed > 50
+
+
+def test_segment_segment_touching():
+    # T junctions, shared ends and overlaps don't cross
+    assert kernels.segment_segment((0, 0), (2, 0), (1, 0), (1, 1)) == []
+    assert kernels.segment_segment((0, 0), (2, 0), (2, 0), (3, 1)) == []
+    assert kernels.segment_segment((0, 0), (2, 0), (1, 0), (3, 0)) == []
+
+
+def test_segment_circle():
+    rnd = random.Random(2)
+    crossed = 0
+    for _ in range(500):
+        a, b, centre = (random_point(rnd) for _ in range(3))
+        radius = rnd.uniform(0.5, 8)
+        found = kernels.segment_circle(a, b, centre, radius)
+        ring = Point(centre).buffer(radius, resolution=RES).exterior
+        assert flat(found) == approx(
+            shapely_crossings(LineString((a, b)), ring), abs=1e-3)
+        if len(found) == 2:
+            # ordered from the segment's start
+            assert (Point(a).distance(Point(found[0]))
+                    < Point(a).distance(Point(found[1])))
+        crossed += len(found)
+    assert crossed > 100
+
+
+def test_segment_circle_tangent():
+    assert kernels.segment_circle((-2, 1), (2, 1), (0, 0), 1.0) == []
+    assert kernels.segment_circle((0, 0), (0, 0), (0, 0), 1.0) == []
+    # ending on the circle only touches it
+    assert kernels.segment_circle((0, 0), (1, 0), (0, 0), 1.0) == []
+
+
+def test_circle_circle():
+    rnd = random.Random(3)
+    crossed = 0
+    for _ in range(300):
+        c1, c2 = random_point(rnd), random_point(rnd)
+        r1, r2 = rnd.uniform(0.5, 8), rnd.uniform(0.5, 8)
+        found = kernels.circle_circle(c1, r1, 0.0, c2, r2)
+        assert flat(found) == approx(shapely_crossings(
+            Point(c1).buffer(r1, resolution=RES).exterior,
+            Point(c2).buffer(r2, resolution=RES).exterior), abs=1e-3)
+        crossed += len(found)
+    assert crossed > 100
+    assert kernels.circle_circle((0, 0), 1.0, 0.0, (0, 0), 1.0) == []
+    assert kernels.circle_circle((0, 0), 1.0, 0.0, (2, 0), 1.0) == []
+
+
+@pytest.mark.parametrize("orientation, first", [
+    (0.0, (0.5, -0.866)), (0.5, (0.5, 0.866)),
+])
+def test_circle_order(orientation, first):
+    # clockwise from the circle's zero, as sliders go round
+    found = kernels.circle_circle((0, 0), 1.0, orientation, (1, 0), 1.0)
+    assert found[0] == approx(first, abs=1e-3)
+    found = kernels.circle_segment((0, 0), 1.0, orientation,
+                                   (0.5, 2), (0.5, -2))
+    assert found[0] == approx(first, abs=1e-3)
+
+
+def test_circle_position():
+    ring = Point(3, 4).buffer(2, resolution=32).exterior
+    for f in (0.0, 0.1, 0.3, 0.55, 0.8):
+        p = ring.interpolate(f, normalized=True)
+        assert (kernels.circle_position((3, 4), 0.0, (p.x, p.y))
+                == approx(f, abs=1e-5))
+
+
+def test_measurements():
+    rnd = random.Random(4)
+    for _ in range(100):
+        a0, a1, b0, b1 = (random_point(rnd) for _ in range(4))
+        assert kernels.distance(a0, b0) == approx(
+            Point(a0).distance(Point(b0)))
+        # i.e. turning `a` by the angle gives `b`'s direction
+        turn = kernels.angle(a0, a1, b0, b1) * 2 * math.pi
+        ax, ay = a1[0] - a0[0], a1[1] - a0[1]
+        bx, by = b1[0] - b0[0], b1[1] - b0[1]
+        rx = ax * math.cos(turn) - ay * math.sin(turn)
+        ry = ax * math.sin(turn) + ay * math.cos(turn)
+        assert rx * by - ry * bx == approx(0.0, abs=1e-9)
+        assert rx * bx + ry * by > 0.0
@@ -0,0 +1,155 @@
+import json
+import os
+
+import pytest
+from pytest import approx
+
+from najork import loader
+from najork.loader import load_scene, load_scene_file, cache_key
+from najork.scene import Scene
+
+
+def test_parse_yaml():
+    import yaml
+    if yaml.__with_libyaml__:
+        assert loader.SafeLoader is yaml.CSafeLoader
+    with open("tests/input/simple_2.yml") as inp:
+        d = loader.parse_yaml(inp.read())
+    assert d["layers"][0]["children"][0]["id"] == "p0"
+
+
+def test_load_scene_uncached():
+    with open("tests/input/simple_2.yml") as inp:
+        s = load_scene(inp.read(), cache_dir=None)
+    assert s.get_by_id("s1").get_coords(1.0) == approx((200, 100))
+
+
+def test_load_scene_cached(tmp_path, monkeypatch):
+    s1 = load_scene_file("tests/input/big_1.yml", cache_dir=str(tmp_path))
+    assert len(os.listdir(tmp_path)) == 1
+
+    def no_parsing(content):
+        raise AssertionError("should have come from the cache")
+
+    monkeypatch.setattr(loader, "parse_yaml", no_parsing)
+    s2 = load_scene_file("tests/input/big_1.yml", cache_dir=str(tmp_path))
+    assert isinstance(s2, Scene)
+    assert s2 is not s1
+    assert (s2.get_by_id("ctrl2").msg.get_data(1.0)
+            == approx(s1.get_by_id("ctrl2").msg.get_data(1.0)))
+
+
+def test_load_scene_corrupt_cache(tmp_path):
+    with open("tests/input/simple_2.yml", "rb") as inp:
+        content = inp.read()
+    with open(tmp_path / (cache_key(content) + ".jsonl"), "wb") as out:
+        out.write(b"not json")
+    s = load_scene(content, cache_dir=str(tmp_path))
+    assert s.get_by_id("s1").get_coords(0.0) == approx((100, 100))
+    # and it's been replaced with a good one
+    assert isinstance(load_scene(content, cache_dir=str(tmp_path)), Scene)
+
+
+def test_load_scene_cached_tempo(tmp_path, monkeypatch):
+    content = b"""
+entities:
+  - {entity: anchor, id: p0, coords: [0, 0]}
+  - {entity: anchor, id: p1, coords: [100, 0]}
+  - {entity: line, id: l1, parents: [p0, p1]}
+  - {entity: slider, id: s1, parent: l1, velocity: 0.1,
+     tempo: {rates: [[0, 1.0], [5, 2.0]]}}
+"""
+    s1 = load_scene(content, cache_dir=str(tmp_path))
+    monkeypatch.setattr(loader, "parse_yaml", None)
+    s2 = load_scene(content, cache_dir=str(tmp_path))
+    assert s2 is not s1
+    assert (s2.get_by_id("s1").get_coords(7.0)
+            == approx(s1.get_by_id("s1").get_coords(7.0)))
+    # the cache only ever holds plain definitions
+    with open(tmp_path / (cache_key(content) + ".jsonl")) as inp:
+        assert [json.loads(line)["id"] for line in inp] == [
+            "p0", "p1", "l1", "s1"]
+
+
+def test_cache_key_follows_source(monkeypatch):
+    content = b"entities: []"
+    key = cache_key(content)
+    assert cache_key(content) == key
+    # e.g. after upgrading, with entities defined differently
+    monkeypatch.setattr(loader, "_source_hash", lambda: b"edited")
+    assert cache_key(content) != key
+
+
+def uids(s):
+    return [e.uid for e in s.sort_by_rank()]
+
+
+def test_stream_yaml_matches_dict():
+    from najork.loader import stream_scene_file
+    s1 = stream_scene_file("tests/input/big_1.yml")
+    s2 = load_scene_file("tests/input/big_1.yml", cache_dir=None)
+    assert uids(s1) == uids(s2)
+    assert (s1.get_by_id("ctrl2").msg.get_data(1.3)
+            == approx(s2.get_by_id("ctrl2").msg.get_data(1.3)))
+
+
+def test_stream_yaml_children_before_rank(tmp_path):
+    from najork.loader import stream_scene_file
+    f = tmp_path / "scene.yml"
+    f.write_text("""
+extra: [1, 2, 3]
+layers:
+  - children:
+      - {entity: line, id: l1, parents: [p0, p1]}
+    rank: 2
+  - rank: 1
+    children:
+      - &p0 {entity: anchor, id: p0, coords: [100, 100]}
+      - {entity: anchor, id: p1, coords: [200, 100]}
+""")
+    s = stream_scene_file(str(f))
+    assert s.get_by_id("l1").rank == 2
+    assert s.get_by_id("l1").calc_position_xy(0.0, 0.5) == approx((150, 100))
+
+
+def test_stream_jsonl(tmp_path):
+    import json
+    from najork.loader import read_scene_def
+    f = tmp_path / "scene.jsonl"
+    f.write_text("\n".join(json.dumps(e) for e in [
+        {"entity": "slider", "id": "s1", "parent": "l1", "velocity": 1.0},
+        {"entity": "line", "id": "l1", "parents": ["p0", "p1"], "rank": 5},
+        {"entity": "anchor", "id": "p0", "coords": [100, 100]},
+        {"entity": "anchor", "id": "p1", "coords": [200, 100]},
+    ]) + "\n\n")
+    s = load_scene_file(str(f))
+    assert s.get_by_id("l1").rank == 5
+    assert s.get_by_id("s1").rank == 6
+    assert s.get_by_id("s1").get_coords(0.5) == approx((150, 100))
+    assert len(read_scene_def(str(f))["entities"]) == 4
+
+
+def test_stream_memory_bounded(tmp_path):
+    """ Streaming shouldn't need the whole document in memory on top
+    of the scene
+    """
+    import tracemalloc
+    from najork.loader import stream_scene_file
+    f = tmp_path / "scene.yml"
+    with open(f, "w") as out:
+        out.write("layers:\n  - rank: 1\n    children:\n")
+        for i in range(2000):
+            out.write("      - {entity: anchor, id: p%i, coords: [%i, 0]}\n"
+                      % (i, i))
+
+    def peak(load):
+        tracemalloc.start()
+        s = load(str(f))
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        assert len(s.list_by_class("anchor")) == 2000
+        return peak
+
+    assert peak(stream_scene_file) < peak(
+        lambda fn: load_scene_file(fn, cache_dir=None)
+    )
@@ -0,0 +1,122 @@
+import json
+import struct
+
+import pytest
+from pytest import approx
+
+from najork.engine_sched import CV_FRAME_TIME
+from najork.entities import Anchor, Line, Bumper, Control
+from najork.offline import (
+    evaluate, evaluate_parallel, frame_count, bounce, guess_format, main
+)
+
+
+@pytest.fixture
+def bump_scene(s):
+    p1 = s.create_entity(Anchor, (0.0, 0.0))
+    p2 = s.create_entity(Anchor, (1.0, 0.0))
+    l1 = s.create_entity(Line, (p1, p2))
+
+    p3 = s.create_entity(Anchor, (0.5, 1.0))
+    p4 = s.create_entity(Anchor, (0.5, -1.0))
+    l2 = s.create_entity(Line, (p3, p4))
+
+    b1 = s.create_entity(
+        Bumper,
+        l1, 0.0, 1.0,
+        l2, b"/bump",
+        loop=False, inherit_velocity=False
+    )
+    b1.msg.set_data(["60", "t * 100"])
+    return s
+
+
+def test_evaluate_bumps(bump_scene):
+    events = list(evaluate(bump_scene, 0.0, 1.0))
+    assert len(events) == 1
+    assert events[0].path == b"/bump"
+    assert events[0].t == approx(0.5)
+    assert events[0].data == approx([60, 50])
+
+
+def test_evaluate_frames(s):
+    s.create_entity(Control, 0.0, 0.0, b"/bums")
+    events = list(evaluate(s, 2.0, 3.0))
+    # same frame count as the realtime engine would tick
+    assert len(events) == 24
+    assert events[0].t == approx(2.0 + CV_FRAME_TIME)
+    assert events[-1].t == approx(3.0)
+
+
+def test_guess_format():
+    assert guess_format("out.mid") == "midi"
+    assert guess_format("out.osc") == "osc"
+    assert guess_format("out.jsonl") == "jsonl"
+
+
+def test_bounce_jsonl(bump_scene, tmp_path):
+    out = str(tmp_path / "out.jsonl")
+    assert bounce(bump_scene, 0.0, 2.0, out) == 1
+    with open(out) as inp:
+        lines = [json.loads(line) for line in inp]
+    assert lines[0]["path"] == "/bump"
+    assert lines[0]["t"] == approx(0.5)
+
+
+def test_bounce_osc(bump_scene, tmp_path):
+    from oscpy.parser import read_packet
+    out = str(tmp_path / "out.osc")
+    assert bounce(bump_scene, 0.0, 2.0, out) == 1
+    with open(out, "rb") as inp:
+        raw = inp.read()
+    size, = struct.unpack(">i", raw[:4])
+    assert len(raw) == size + 4
+    messages = list(read_packet(raw[4:]))
+    assert messages[0][0] == b"/bump"
+
+
+def test_bounce_midi(bump_scene, tmp_path):
+    import mido
+    out = str(tmp_path / "out.mid")
+    assert bounce(bump_scene, 0.0, 2.0, out) == 1
+    mid = mido.MidiFile(out)
+    notes = [m for m in mid.tracks[0] if m.type == "note_on"]
+    assert notes[0].note == 60
+    assert notes[0].velocity == 50
+
+
+def test_frame_count():
+    assert frame_count(0.0, 1.0) == 24
+    assert frame_count(2.0, 3.0) == 24
+    assert frame_count(0.0, CV_FRAME_TIME / 2) == 0
+    assert frame_count(1.0, 0.0) == 0
+
+
+def test_evaluate_parallel_matches_serial():
+    import yaml
+    from najork.scene import Scene
+    with open("tests/input/big_1.yml") as inp:
+        scene_def = yaml.load(inp.read(), Loader=yaml.Loader)
+    s = Scene()
+    s.load_from_dict(scene_def)
+    serial = list(evaluate(s, 0.5, 10.0))
+    parallel = list(evaluate_parallel(scene_def, 0.5, 10.0,
+                                      jobs=2, shard_frames=25))
+    assert parallel == serial
+
+
+@pytest.mark.parametrize("jobs", ["0", "-2", "two"])
+def test_bad_jobs(jobs, tmp_path):
+    with pytest.raises(SystemExit):
+        main(["tests/input/big_1.yml", "-o", str(tmp_path / "out.jsonl"),
+              "--end", "1", "--jobs", jobs])
+
+
+def test_jobs_needs_a_count(tmp_path):
+    out = tmp_path / "out.jsonl"
+    # rather than taking the scene for the count
+    with pytest.raises(SystemExit):
+        main(["-j", "tests/input/big_1.yml", "-o", str(out), "--end", "0.5"])
+    assert main(["-j", "2", "tests/input/big_1.yml", "-o", str(out),
+                 "--end", "0.5"]) == 0
+    assert len(out.read_text().splitlines()) == frame_count(0.0, 0.5)
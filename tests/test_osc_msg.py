@@ -1,4 +1,7 @@
-from najork.osc import ConcreteMessage, TemplatedMessage
+import math
+import threading
+
+from najork.osc import ConcreteMessage, TemplatedMessage, parse_expression
 import pytest
 from pytest import approx
 import asyncio
@@ -53,3 +56,32 @@ def test_engine_static_messages(s, e, osccount):
     # we loosen the test slighly to +- 1 frame
     assert osccount["count"] == approx(1.0/CV_FRAME_TIME, abs=1)
 
+
+
+def test_messages_share_paths_and_expressions():
+    bindings = lambda t: {"in_1": t}
+    a = TemplatedMessage(bytes(b"/note"), ["in_1 * 2"], bindings)
+    b = TemplatedMessage(b"/no" + b"te", ["in_1 * 2"], bindings)
+    assert a.get_path(0.0) is b.get_path(0.0)
+    assert a._data_parsed["in_1 * 2"] is b._data_parsed["in_1 * 2"]
+    assert a.get_data(2.0) == b.get_data(2.0) == [approx(4.0)]
+
+
+def test_parse_across_threads():
+    # each thread parses with its own parser, so none trips another up
+    expressions = ["in_1 * {} + sin(in_2 / {})".format(n, n + 1)
+                   for n in range(300)]
+    results = {}
+
+    def parse(k):
+        results[k] = [parse_expression(e).evaluate({"in_1": 2, "in_2": 3})
+                      for e in expressions[k::4]]
+
+    threads = [threading.Thread(target=parse, args=(k,)) for k in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    for k in range(4):
+        assert results[k] == [approx(2 * n + math.sin(3 / (n + 1)))
+                              for n in range(k, 300, 4)]
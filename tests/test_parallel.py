@@ -0,0 +1,119 @@
+import time
+
+import pytest
+from pytest import approx
+
+from najork.config import DEFAULT_SETTINGS
+from najork.engine_sched import Engine, frame_events, CV_FRAME_TIME
+from najork.parallel import ParallelScene, deal
+
+from conftest import MIXED
+
+
+def copy_of(definitions: list[dict], prefix: str) -> list[dict]:
+    """ Another, unconnected, copy of a mechanism """
+    def ref(v):
+        if isinstance(v, list):
+            return [prefix + p for p in v]
+        return prefix + v
+
+    copies = []
+    for d in definitions:
+        d = dict(d, id=prefix + d["id"])
+        for k in ("parents", "parent", "centre", "collides"):
+            if k in d:
+                d[k] = ref(d[k])
+        if "connections" in d:
+            d["connections"] = {k: prefix + v
+                                for k, v in d["connections"].items()}
+        copies.append(d)
+    return copies
+
+
+@pytest.fixture
+def mechanisms(s):
+    s.load_from_dict({"entities": MIXED["entities"]
+                      + copy_of(MIXED["entities"], "x")
+                      + copy_of(MIXED["entities"], "y")})
+    return s
+
+
+def test_components(mechanisms):
+    components = mechanisms.components()
+    assert len(components) == 3
+    assert sorted(e.uid for e in components[1]) == sorted(
+        "x" + d["id"] for d in MIXED["entities"]
+    )
+    # each in rank order
+    for c in components:
+        assert [e.rank for e in c] == sorted(e.rank for e in c)
+
+
+def test_components_linked_by_inputs_and_colliders(s):
+    s.load_from_dict({"entities": [
+        {"entity": "anchor", "id": "a1", "coords": [0, 0]},
+        {"entity": "anchor", "id": "a2", "coords": [1, 0]},
+        {"entity": "anchor", "id": "a3", "coords": [0, 1]},
+        {"entity": "anchor", "id": "a4", "coords": [1, 1]},
+        {"entity": "line", "id": "l1", "parents": ["a1", "a2"]},
+        {"entity": "line", "id": "l2", "parents": ["a3", "a4"]},
+        {"entity": "bumper", "id": "k1", "parent": "l1", "progression": 0,
+         "velocity": 1, "collides": "l2", "path": "/k"},
+        {"entity": "anchor", "id": "a5", "coords": [5, 5]},
+        {"entity": "anchor", "id": "a6", "coords": [6, 6]},
+        {"entity": "distance", "id": "d1", "parents": ["a5", "a6"]},
+        {"entity": "control", "id": "c1", "coords": [0, 0], "path": "/c",
+         "connections": {"in_1": "d1"}},
+    ]})
+    assert sorted(sorted(e.uid for e in c) for c in s.components()) == [
+        ["a1", "a2", "a3", "a4", "k1", "l1", "l2"],
+        ["a5", "a6", "c1", "d1"],
+    ]
+
+
+def test_deal():
+    groups = deal([[1] * 5, [2] * 1, [3] * 3, [4] * 2], 2)
+    assert sorted(len(g) for g in groups) == [5, 6]
+    assert len(deal([[1], [2]], 8)) == 2
+
+
+def test_frame_events_match(mechanisms):
+    p = ParallelScene(mechanisms, 2)
+    try:
+        assert p.jobs == 2
+        for n in range(24 * 4):
+            t = n * CV_FRAME_TIME
+            assert (list(p.frame_events(t, t + CV_FRAME_TIME))
+                    == list(frame_events(mechanisms, t, t + CV_FRAME_TIME)))
+    finally:
+        p.close()
+
+
+def test_engine_jobs(mechanisms, oscmsg):
+    e = Engine(mechanisms, DEFAULT_SETTINGS, jobs=2)
+    try:
+        e.start()
+        time.sleep(0.2)
+        e.pause()
+        assert oscmsg["path"] in (b"/ct1", b"/k1", b"/k2", b"/k3")
+    finally:
+        e.shutdown()
+
+
+def test_engine_worker_dies(mechanisms, oscmsg, caplog):
+    e = Engine(mechanisms, DEFAULT_SETTINGS, jobs=2)
+    try:
+        process, _ = e._program._workers[0]
+        process.terminate()
+        process.join()
+        e.start()
+        time.sleep(0.2)
+        assert e.running and e._program is None
+        assert "Evaluating the scene failed" in caplog.text
+        # carrying on in process
+        oscmsg["path"] = None
+        time.sleep(0.2)
+        e.pause()
+        assert oscmsg["path"] in (b"/ct1", b"/k1", b"/k2", b"/k3")
+    finally:
+        e.shutdown()
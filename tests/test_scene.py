@@ -7,6 +7,8 @@ from najork.entities import (
     Angle
 )
 
+from najork.clock import FRAME_RATE, frame_time
+from najork.journal import apply_op
 from najork.scene import Scene
 
 import pytest
@@ -76,3 +78,169 @@ def test_load_from_yaml_2(s, y2):
 
 def test_load_from_yaml_big_1(s, yb1):
     s.load_from_dict(yb1)
+
+
+def test_class_and_rank_index(s, y2):
+    s.load_from_dict(y2)
+    assert [e.uid for e in s.list_by_class("anchor")] == ["p0", "p1"]
+    assert [e.uid for e in s.sort_by_rank()][-1] == "s1"
+    # re-registering an id replaces it in the indexes too
+    s.add(Anchor("p1", 1, (0.0, 0.0)))
+    assert len(s.list_by_class("anchor")) == 2
+    s.warm(0.0)
+
+
+def test_load_out_of_order(s, y2):
+    # reverse both the layers and their children
+    layers = [{"rank": layer["rank"],
+               "children": list(reversed(layer["children"]))}
+              for layer in reversed(y2["layers"])]
+    s.load_from_dict({"layers": layers})
+    assert s.get_by_id("s1").get_coords(1.0) == approx((200, 100))
+
+
+def test_load_unranked(s):
+    s.load_from_dict({"entities": [
+        {"entity": "slider", "id": "s1", "parent": "l1", "velocity": 1.0},
+        {"entity": "line", "id": "l1", "parents": ["p0", "p1"]},
+        {"entity": "anchor", "id": "p0", "coords": [100, 100]},
+        {"entity": "anchor", "id": "p1", "coords": [200, 100]},
+    ]})
+    assert s.get_by_id("p0").rank == 1
+    assert s.get_by_id("l1").rank == 2
+    assert s.get_by_id("s1").rank == 3
+    assert [e.uid for e in s.list_by_class("anchor")] == ["p0", "p1"]
+
+
+@pytest.mark.parametrize("streamed", [False, True])
+def test_load_reports_all_errors(s, streamed):
+    from najork.scene import InputError
+    from najork.scene import iter_definitions
+    load = s.load_from_dict
+    if streamed:
+        load = lambda d: s.load_stream(iter_definitions(d))
+    with pytest.raises(InputError) as ex:
+        load({"layers": [
+            {"rank": 1, "children": [
+                {"entity": "anchor", "id": "p0", "coords": [0, 0]},
+                {"entity": "anchor", "id": "p0", "coords": [1, 1]},
+                {"entity": "anchor", "id": "p5", "coords": [1, 1]},
+                {"entity": "roller", "id": "r1"},
+                {"entity": "line", "id": "l0", "parents": ["p0", "p5"]},
+                {"entity": "line", "id": "l1", "parents": ["p0", "p9"]},
+            ]},
+            {"rank": 2, "children": [
+                {"entity": "line", "id": "l2", "parents": ["l3", "p0"]},
+                {"entity": "line", "id": "l3", "parents": ["l2", "p0"]},
+            ]},
+        ]})
+    errors = ex.value.errors
+    assert len(errors) == 5
+    assert "Duplicate id 'p0'" in errors
+    assert any("roller" in e for e in errors)
+    assert any("unknown id 'p9'" in e for e in errors)
+    assert any("rank 1" in e and "'l0'" in e for e in errors)
+    assert any("cycle" in e and "'l2', 'l3'" in e for e in errors)
+
+
+def test_load_reports_bad_geometry(s):
+    from najork.scene import InputError
+    with pytest.raises(InputError) as ex:
+        s.load_from_dict({"entities": [
+            {"entity": "anchor", "id": "p0", "coords": [0, 0]},
+            {"entity": "circle", "id": "c1", "centre": "p0",
+             "radius": -1, "orientation": 0},
+            {"entity": "slider", "id": "s1", "parent": "c1"},
+        ]})
+    assert len(ex.value.errors) == 1
+    assert "ImpossibleGeometry" in ex.value.errors[0]
+
+
+LIVE = {"entities": [
+    {"entity": "anchor", "id": "p0", "coords": [0, 0]},
+    {"entity": "anchor", "id": "p1", "coords": [100, 0]},
+    {"entity": "anchor", "id": "p2", "coords": [50, -50]},
+    {"entity": "anchor", "id": "p3", "coords": [50, 50]},
+    {"entity": "anchor", "id": "p4", "coords": [500, 500]},
+    {"entity": "line", "id": "l1", "parents": ["p0", "p1"]},
+    {"entity": "line", "id": "l2", "parents": ["p2", "p3"]},
+    {"entity": "slider", "id": "s1", "parent": "l1", "velocity": 0.1},
+    {"entity": "distance", "id": "d1", "parents": ["s1", "p3"]},
+    # construction geometry
+    {"entity": "circle", "id": "c1", "centre": "p4", "radius": 10,
+     "orientation": 0},
+    {"entity": "slider", "id": "s2", "parent": "c1", "velocity": 0.1},
+    {"entity": "distance", "id": "d2", "parents": ["s2", "p0"]},
+    {"entity": "bumper", "id": "k1", "parent": "l1", "progression": 0.0,
+     "velocity": 0.5, "collides": "l2", "path": "/k1"},
+    {"entity": "control", "id": "ct1", "coords": [0, 0], "path": "/ct1",
+     "data": ["in_1"], "connections": {"in_1": "d1"}},
+]}
+
+
+def test_live(s):
+    s.load_from_dict(LIVE)
+    assert s.live() == {"p0", "p1", "p2", "p3", "l1", "l2", "s1", "d1",
+                        "k1", "ct1"}
+    assert s.visible() is None
+    # kept up to date as the scene changes
+    s.add_input("ct1", "in_2", "d2")
+    assert {"d2", "s2", "c1", "p4"} <= s.live()
+    s.remove("ct1")
+    assert "d2" not in s.live()
+    s.create_entity(Slider, s.get_by_id("c1"), 0.0, 0.1, False, False)
+    assert "c1" not in s.live()
+
+
+def test_viewport(s):
+    s.load_from_dict(LIVE)
+    s.set_viewport((450, 450, 600, 600))
+    # a slider counts as wherever its parent is
+    assert s.visible() == {"p4", "c1", "s2"}
+    assert {"p4", "c1", "s2", "k1"} <= s.live()
+    assert "d2" not in s.live()
+    anchor = s.create_entity(Anchor, (480.0, 480.0))
+    far = s.create_entity(Anchor, (0.0, 480.0))
+    assert anchor.uid in s.visible() and far.uid not in s.visible()
+    s.set_viewport(None)
+    assert s.visible() is None and "c1" not in s.live()
+
+
+def test_viewport_moves(s):
+    p1 = s.create_entity(Anchor, (0.0, 0.0))
+    p2 = s.create_entity(Anchor, (1000.0, 0.0))
+    l1 = s.create_entity(Line, (p1, p2))
+    s1 = s.create_entity(Slider, l1, 0.0, 0.1, False, False)
+    c1 = s.create_entity(Circle, s1, 10.0, 0.0)
+    far = s.create_entity(Anchor, (0.0, 500.0))
+    s.set_viewport((850, -50, 1000, 50))
+    # the circle's carried into view by its centre
+    assert c1.uid not in s.visible(0.0)
+    assert c1.uid in s.visible(frame_time(9 * FRAME_RATE))
+    assert c1.uid not in s.visible(0.0)
+    # and edits made in place (e.g. from the journal) are seen
+    assert far.uid not in s.visible(0.0)
+    apply_op(s, {"op": "move", "id": far.uid, "coords": [900.0, 0.0]})
+    assert far.uid in s.visible(0.0)
+
+
+def test_static_bounds_cached(s, monkeypatch):
+    s.load_from_dict(LIVE)
+    bounded = []
+    get_bounds = Circle.get_bounds
+
+    def counted(self, t):
+        bounded.append(self.uid)
+        return get_bounds(self, t)
+    monkeypatch.setattr(Circle, "get_bounds", counted)
+    s.set_viewport((450, 450, 600, 600))
+    for n in range(5):
+        assert "s2" in s.live(frame_time(n))
+    # c1 never moves, so is only looked at once, wherever the viewport
+    s.set_viewport((0, 0, 10, 10))
+    assert "s2" not in s.live(frame_time(5))
+    assert bounded == ["c1"]
+    # until it's edited
+    apply_op(s, {"op": "move", "id": "p4", "coords": [5.0, 5.0]})
+    assert "s2" in s.live(frame_time(5))
+    assert bounded == ["c1"] * 2
@@ -0,0 +1,195 @@
+import pickle
+import threading
+
+import pytest
+from pytest import approx
+
+from najork import tempo
+from najork.clock import FRAME_RATE, after, frame_time
+from najork.compiled import CompiledScene
+from najork.cycle import period
+from najork.entities import (
+    Anchor, Line, Circle, Slider, Bumper, Distance, Control
+)
+from najork.scene import InputError
+from najork.tempo import Tempo
+
+WEEK = 7 * 24 * 60 * 60
+
+
+def test_rates():
+    accelerando = Tempo(rates=[[0, 1.0], [10, 2.0]])
+    assert accelerando.rate(5.0) == approx(1.5)
+    assert accelerando.integral(5.0) == approx(6.25)
+    assert accelerando.integral(10.0) == approx(15.0)
+    # holding the last rate after the last breakpoint
+    assert accelerando.rate(20.0) == 2.0
+    assert accelerando.integral(20.0) == approx(35.0)
+    # and the first before the first
+    late = Tempo(rates=[[2, 0.5], [4, 1.0]])
+    assert late.integral(2.0) == approx(1.0)
+    assert late.integral(-1.0) == approx(-0.5)
+
+
+def test_periodic_rates():
+    swing = Tempo(rates=[[0, 1.0], [0.5, 2.0]], period=1.0)
+    assert swing.integral(1.0) == approx(1.75)
+    assert swing.integral(2.75) == approx(2 * 1.75 + 1.25)
+    # exactly the same in every repeat, however far on
+    n = WEEK * FRAME_RATE
+    assert (swing.integral(frame_time(n + 6)) - swing.integral(frame_time(n))
+            == approx(swing.integral(frame_time(6))))
+    assert swing.integral(frame_time(n)) == WEEK * 1.75
+
+
+def test_expression():
+    ramp = Tempo(expression="1 + t / 10")
+    # piecewise linear through a straight line, so exact
+    assert ramp.rate(5.0) == approx(1.5)
+    assert ramp.integral(5.0) == approx(6.25)
+    # several chunks on, and back again
+    far = tempo.CHUNK_FRAMES / FRAME_RATE * 10.5
+    assert ramp.integral(far) == approx(far + far * far / 20)
+    assert ramp.integral(1.0) == approx(1.05)
+    assert len(ramp._chunks) <= tempo.CACHED_CHUNKS
+
+
+def test_prepared():
+    ramp = Tempo(expression="1 + t / 10")
+    chunk = tempo.CHUNK_FRAMES / FRAME_RATE
+    ramp.prepare(2.5 * chunk)
+    assert set(ramp._chunks) >= {2, 3}
+    # reaching a chunk samples the next in the background
+    ramp.integral(3.5 * chunk)
+    ramp._prefetcher.join()
+    assert 4 in ramp._chunks
+
+
+def test_threads():
+    # sampled from several threads at once, and all agree
+    ramp = Tempo(expression="1 + t / 10")
+    chunk = tempo.CHUNK_FRAMES / FRAME_RATE
+    times = [chunk * k * 0.7 for k in range(12)]
+    results = {}
+
+    def integrate(n):
+        results[n] = [ramp.integral(t) for t in times[n % 3:] + times]
+
+    threads = [threading.Thread(target=integrate, args=(n,))
+               for n in range(6)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    for n, values in results.items():
+        assert values == [approx(t + t * t / 20) for t in times[n % 3:]
+                          + times]
+
+
+def test_periodic_expression():
+    wobble = Tempo(expression="1 + 0.5 * sin(2 * PI * t)", period=1.0)
+    assert wobble.integral(1.0) == approx(1.0)
+    assert wobble.integral(1000.25) == approx(1000 + wobble.integral(0.25))
+    assert wobble.integral(0.25) == approx(0.25 + 0.25 / 3.14159, abs=1e-3)
+
+
+def test_seek():
+    # the same, however we got there
+    for definition in ({"expression": "2 + cos(t)"},
+                       {"rates": [[0, 1], [3, 0.5], [7, 3]], "period": 9}):
+        sequential, sought = (Tempo.from_dict(definition) for _ in range(2))
+        frames = 3 * tempo.CHUNK_FRAMES + 7
+        for n in range(frames):
+            sequential.integral(frame_time(n))
+        t = frame_time(frames)
+        assert sought.integral(t) == sequential.integral(t)
+        assert sought.to_dict() == definition
+
+
+def test_far_seek(monkeypatch):
+    # thousands of chunks on, without running out of stack
+    monkeypatch.setattr(tempo, "CHUNK_FRAMES", 2)
+    ramp = Tempo(expression="1 + t / 10")
+    far = 5000 * 2 / FRAME_RATE + 0.01
+    assert ramp.integral(far) == approx(far + far * far / 20)
+    assert len(ramp._chunks) <= tempo.CACHED_CHUNKS
+
+
+def test_pickle():
+    ramp = Tempo(expression="1 + t / 10")
+    ramp.integral(tempo.CHUNK_FRAMES / FRAME_RATE * 1.5)
+    ramp._prefetcher.join()
+    copy = pickle.loads(pickle.dumps(ramp))
+    assert copy.to_dict() == ramp.to_dict()
+    assert copy.integral(5.0) == approx(6.25)
+
+
+@pytest.mark.parametrize("definition", [
+    {}, {"rates": [], "expression": "t"}, {"rates": []},
+    {"rates": [[1, 1], [0, 2]]}, {"rates": [[0, 1], [2, 1]], "period": 1},
+    {"expression": "1 + x"}, {"expression": "1 +"},
+    {"expression": "t", "period": 0},
+])
+def test_bad_tempo(definition):
+    with pytest.raises(ValueError):
+        Tempo.from_dict(definition)
+
+
+def test_load(s):
+    entities = [
+        {"entity": "anchor", "id": "p0", "coords": [0, 0]},
+        {"entity": "anchor", "id": "p1", "coords": [100, 0]},
+        {"entity": "line", "id": "l1", "parents": ["p0", "p1"]},
+        {"entity": "slider", "id": "s1", "parent": "l1", "velocity": 0.1,
+         "tempo": {"rates": [[0, 1.0], [10, 2.0]]}},
+    ]
+    s.load_from_dict({"entities": entities})
+    sl = s.get_by_id("s1")
+    assert sl.get_coords(5.0) == approx((62.5, 0.0))
+    assert sl.get_coords(20.0) == approx((100.0, 0.0))
+    assert s.save_entity(sl)["tempo"] == entities[-1]["tempo"]
+    assert period(s) is None
+    entities[-1]["tempo"] = {"expression": "speed"}
+    with pytest.raises(InputError):
+        s.load_from_dict({"entities": entities})
+
+
+def test_compiled_agrees(s):
+    p1 = s.create_entity(Anchor, (0.0, 0.0))
+    p2 = s.create_entity(Anchor, (100.0, 50.0))
+    p3 = s.create_entity(Anchor, (50.0, -10.0))
+    p4 = s.create_entity(Anchor, (50.0, 100.0))
+    l1 = s.create_entity(Line, (p1, p2))
+    l2 = s.create_entity(Line, (p3, p4))
+    c1 = s.create_entity(Circle, p1, 20.0, 0.1)
+    swing = Tempo(rates=[[0, 1.0], [0.5, 3.0]], period=1.0)
+    sliders = [
+        s.create_entity(Slider, l1, 0.1, 0.3, True, False, swing),
+        s.create_entity(Slider, c1, 0.6, -0.7, True, False,
+                        Tempo(expression="1 + t / 100", period=10)),
+        s.create_entity(Slider, l1, 0.2, 0.01, False, False, swing),
+        s.create_entity(Bumper, l1, 0.0, 0.45, l2, b"/hit", True, False,
+                        swing),
+    ]
+    # sending a distance to each, so they're all evaluated
+    ctl = s.create_entity(Control, 0.0, 0.0, b"/ctl")
+    for n, sl in enumerate(sliders[:-1]):
+        ctl.add_input(f"in_{n}", s.create_entity(Distance, (p1, sl)))
+    tick = s.compile_tick(cache_dir=None)
+    compiled = CompiledScene(s)
+    hits = []
+    for n in list(range(0, 200)) + [WEEK * FRAME_RATE + 5]:
+        t = frame_time(n)
+        coords, _, collisions = tick(t, after(t))
+        frame = compiled.evaluate(t)
+        for sl in sliders:
+            assert coords[tick.points[sl.uid]] == approx(
+                sl.get_coords(t), abs=1e-9)
+            assert frame.coords(sl.uid) == approx(
+                sl.get_coords(t), abs=1e-9)
+        hit = sliders[-1].test_collision(t, after(t))
+        assert collisions[tick.bumpers[sliders[-1].uid]] == hit
+        assert compiled._collisions(frame, after(t))[
+            compiled.bumpers[sliders[-1].uid]] == hit
+        hits.append(hit)
+    assert any(hits)
@@ -0,0 +1,55 @@
+import io
+
+import pytest
+
+from najork import trace
+from najork.headless import main
+
+
+@pytest.fixture
+def tracing():
+    trace.enable(8)
+    yield
+    trace.disable()
+
+
+def test_ring(tracing):
+    for n in range(5):
+        trace.record(trace.TICK, n)
+    assert [e[:2] for e in trace.events()] == [(trace.TICK, n)
+                                               for n in range(5)]
+    # only the latest `capacity` are kept, oldest first
+    for n in range(5, 20):
+        trace.record(trace.TICK, n)
+    events = trace.events()
+    assert [e[1] for e in events] == list(range(12, 20))
+    assert [e[2] for e in events] == sorted(e[2] for e in events)
+
+
+def test_dump(tracing):
+    trace.record(trace.SEND, trace.subject("k1"))
+    trace.record(trace.CULLED, 3)
+    trace.disable()
+    # (nothing's recorded once disabled)
+    trace.enable(8)
+    trace.record(trace.SEND, trace.subject("k2"))
+    trace.record(trace.SEND, trace.subject("k1"))
+    trace.record(trace.CULLED, 3)
+    out = io.StringIO()
+    trace.dump(out)
+    lines = [line.split()[1:] for line in out.getvalue().splitlines()]
+    assert lines == [["send", "k2"], ["send", "k1"], ["culled", "3"]]
+
+
+def test_headless_trace(osccount, tmp_path, monkeypatch):
+    monkeypatch.setenv("NAJORK_CACHE_DIR", str(tmp_path))
+    out = tmp_path / "trace.txt"
+    assert main(["tests/input/big_1.yml", "--end", "0.5",
+                 "--trace", str(out)]) == 0
+    assert not trace.enabled
+    events = [line.split()[1:] for line in out.read_text().splitlines()]
+    ticks = [int(n) for e, n in events if e == "tick"]
+    assert ticks == list(range(1, len(ticks) + 1))
+    assert len(ticks) >= 12
+    # big_1 has one control, which fires every frame
+    assert ["send", "ctrl2"] in events